@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Measure the speed and memory use of plist2json on a synthetic corpus.
+
+Every file of the corpus (see ``corpus.py``) is run through ``read_plist``
+and through ``main()``, each measurement in a fresh process whose peak RSS
+is reported.  Start-up time is measured by converting a tiny binary plist
+with ``python -m pkg``, along with the time ``python -X importtime``
+reports for the imports it adds to those of the bare interpreter, and the
+modules imported.  Results are written as JSON, which ``--compare`` can set
+against the results of another version, failing if start-up has slowed
+down more than ``--max-startup`` allows.  Start-up is compared in units of
+the bare interpreter's start-up time, and without ``--compare`` against
+``startup-baseline.json``, the start-up of release 0.2.2::
+
+    python benchmarks/bench.py --output new.json --compare old.json
+    python benchmarks/bench.py --startup-only --max-startup 1.0
+
+Throughput is given in MB/s of plist input (1 MB = 10**6 bytes) and in
+objects/s, counting every object of the converted output.
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import plistlib
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import corpus
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+OPERATIONS = ('read_plist', 'main')
+
+DEFAULT_REPEAT = 3
+
+# Start-up measures compared between versions, with their labels.  They are
+# in units of the bare interpreter's start-up time, so that results from
+# different machines compare.
+STARTUP_MEASURES = (('relative_seconds', 'startup'),
+                    ('relative_import_seconds', 'startup imports'))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Start-up of the last release before the streaming decoders (0.2.2), which
+# --max-startup compares with unless --compare names other results.
+STARTUP_BASELINE = os.path.join(ROOT, 'benchmarks', 'startup-baseline.json')
+
+
+def peak_rss():
+    """Return the peak resident set size of this process in bytes, or None."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def generate_corpus(directory, size, shapes=None, formats=None):
+    """Generate the corpus in *directory* with ``corpus.py``.
+
+    The corpus is built in a process of its own: the peak RSS of a process
+    is inherited by the processes it starts, so building it here would
+    inflate the peak RSS measured for every operation.
+    """
+    argv = [sys.executable, corpus.__file__, directory, '--size', str(size)]
+    for shape in shapes or ():
+        argv += ['--shape', shape]
+    for fmt in formats or ():
+        argv += ['--format', fmt]
+    subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+
+
+def run_operation(operation, file_path):
+    """Time an operation on *file_path* in this process and return the result."""
+    from pkg.__main__ import main, read_plist
+
+    if operation == 'read_plist':
+        start = time.perf_counter()
+        read_plist(file_path)
+        seconds = time.perf_counter() - start
+    else:
+        with open(os.devnull, 'wb') as devnull:
+            stdout = io.TextIOWrapper(devnull, encoding='utf-8')
+            with patch('sys.argv', ['plist2json', file_path]), \
+                    patch('sys.stdout', new=stdout):
+                start = time.perf_counter()
+                status = main()
+                stdout.flush()
+                seconds = time.perf_counter() - start
+        if status:
+            raise RuntimeError(f"main() failed on {file_path}")
+    return {"seconds": seconds, "peak_rss": peak_rss()}
+
+
+def child_env(root):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [root, env.get('PYTHONPATH')]))
+    return env
+
+
+def measure(operation, file_path, root, repeat):
+    """Return the best time and peak RSS of *repeat* runs in fresh processes."""
+    runs = []
+    for _ in range(repeat):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', operation,
+             file_path],
+            env=child_env(root), stdout=subprocess.PIPE, check=True)
+        runs.append(json.loads(child.stdout))
+    rss = [run["peak_rss"] for run in runs if run["peak_rss"] is not None]
+    return min(run["seconds"] for run in runs), max(rss) if rss else None
+
+
+def import_times(argv, env, root):
+    """Run ``python -X importtime`` with *argv* and parse its report.
+
+    Returns the total import time in seconds, counting each top-level
+    import once with everything it imported, and the set of modules.
+    """
+    child = subprocess.run([sys.executable, '-X', 'importtime'] + argv,
+                           env=env, cwd=root, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                           universal_newlines=True)
+    total = 0
+    modules = set()
+    for line in child.stderr.splitlines():
+        fields = line.split('|')
+        if not line.startswith('import time:') or len(fields) != 3:
+            continue
+        try:
+            cumulative = int(fields[1])
+        except ValueError:  # the column headers
+            continue
+        name = fields[2][1:]
+        if not name.startswith(' '):
+            total += cumulative
+        modules.add(name.strip())
+    return total / 1e6, modules
+
+
+def measure_startup(directory, root, repeat):
+    """Return the start-up costs of a tiny conversion.
+
+    These are the best wall times of the interpreter alone and of the
+    conversion, and the best import time the conversion adds to that of
+    the bare interpreter, with the modules it imports.  The times of the
+    conversion are also given relative to the interpreter's.
+    """
+    tiny = os.path.join(directory, 'startup.plist')
+    with open(tiny, 'wb') as f:
+        plistlib.dump({"key": "value"}, f, fmt=plistlib.FMT_BINARY)
+    env = child_env(root)
+    times = {}
+    imports = {}
+    for name, argv in (('interpreter_seconds', ['-c', 'pass']),
+                       ('seconds', ['-m', 'pkg', tiny])):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + argv, env=env, cwd=root,
+                           check=True, stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        times[name] = best
+        imports[name] = min((import_times(argv, env, root)
+                             for _ in range(repeat)), key=lambda t: t[0])
+    times["import_seconds"] = max(
+        0.0, imports['seconds'][0] - imports['interpreter_seconds'][0])
+    times["relative_seconds"] = times['seconds'] / times['interpreter_seconds']
+    times["relative_import_seconds"] = (times['import_seconds']
+                                        / times['interpreter_seconds'])
+    times["modules"] = sorted(imports['seconds'][1]
+                              - imports['interpreter_seconds'][1])
+    return times
+
+
+def package_version(root):
+    child = subprocess.run(
+        [sys.executable, '-c', 'import pkg; print(pkg.__version__)'],
+        env=child_env(root), stdout=subprocess.PIPE, universal_newlines=True)
+    return child.stdout.strip() or None
+
+
+def run(directory, manifest, root, repeat, operations=OPERATIONS):
+    """Benchmark every corpus file and return the results document."""
+    results = []
+    for name, entry in manifest.items():
+        for operation in operations:
+            seconds, rss = measure(operation, os.path.join(directory, name),
+                                   root, repeat)
+            results.append(dict(
+                entry, name=name, operation=operation, seconds=seconds,
+                mb_per_s=entry["size"] / seconds / 1e6,
+                objects_per_s=entry["objects"] / seconds, peak_rss=rss))
+            print(f"{name:32} {operation:10} {seconds:8.3f} s "
+                  f"{results[-1]['mb_per_s']:8.2f} MB/s "
+                  f"{results[-1]['objects_per_s']:12.0f} objects/s"
+                  + (f" {rss / 2 ** 20:8.1f} MiB" if rss else ''),
+                  file=sys.stderr)
+    startup = measure_startup(directory, root, repeat)
+    print(f"startup {startup['seconds']:.3f} s "
+          f"(interpreter {startup['interpreter_seconds']:.3f} s, "
+          f"imports {startup['import_seconds']:.3f} s, "
+          f"{len(startup['modules'])} modules)",
+          file=sys.stderr)
+    return {
+        "version": package_version(root),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "repeat": repeat,
+        "startup": startup,
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """Print the time and memory of *report* relative to *baseline*."""
+    old = {(r["name"], r["operation"]): r for r in baseline["results"]}
+    print(f"compared with version {baseline.get('version')} "
+          f"(ratios new/old, lower is better):", file=sys.stderr)
+    for result in report["results"]:
+        before = old.get((result["name"], result["operation"]))
+        if before is None:
+            continue
+        line = (f"{result['name']:32} {result['operation']:10} "
+                f"time {result['seconds'] / before['seconds']:6.2f}")
+        if result["peak_rss"] and before["peak_rss"]:
+            line += f"  rss {result['peak_rss'] / before['peak_rss']:6.2f}"
+        print(line, file=sys.stderr)
+    for key, label in STARTUP_MEASURES:
+        ratio = startup_ratio(report, baseline, key)
+        if ratio is not None:
+            print(f"{label:43} time {ratio:6.2f}", file=sys.stderr)
+    added = sorted(set(report['startup'].get('modules', ()))
+                   - set(baseline['startup'].get('modules', ())))
+    if added and 'modules' in baseline['startup']:
+        print(f"startup imports added: {' '.join(added)}", file=sys.stderr)
+
+
+def startup_ratio(report, baseline, key):
+    """Return the ratio new/old of a start-up measure, or None if unknown."""
+    old = baseline['startup'].get(key)
+    new = report['startup'].get(key)
+    if not old or new is None:
+        return None
+    return new / old
+
+
+def check_startup(report, baseline, max_ratio):
+    """Return the start-up measures of *report* over *max_ratio* times *baseline*."""
+    return [label for key, label in STARTUP_MEASURES
+            if (startup_ratio(report, baseline, key) or 0) > max_ratio]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark plist2json')
+    parser.add_argument('--corpus', metavar='DIR',
+                        help='Corpus directory, generated if it has no manifest '
+                             '(default: a temporary directory)')
+    parser.add_argument('--size', type=int, default=corpus.DEFAULT_SIZE, metavar='BYTES',
+                        help=f'Approximate size of generated files (default: {corpus.DEFAULT_SIZE})')
+    parser.add_argument('--shape', action='append', choices=sorted(corpus.SHAPES),
+                        dest='shapes', help='Shape to generate (repeatable; default: all)')
+    parser.add_argument('--format', action='append', choices=sorted(corpus.FORMATS),
+                        dest='formats', help='Format to generate (repeatable; default: all)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f'Runs per measurement, the best is kept (default: {DEFAULT_REPEAT})')
+    parser.add_argument('--root', default=ROOT, metavar='DIR',
+                        help='Source tree of the plist2json version to measure '
+                             '(default: this checkout)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='Write the JSON results to FILE (default: stdout)')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='Compare with the JSON results of an earlier run')
+    parser.add_argument('--max-startup', type=float, metavar='RATIO',
+                        help='Fail if the start-up or import time exceeds RATIO '
+                             'times that of the --compare run (default: the '
+                             'checked-in 0.2.2 baseline)')
+    parser.add_argument('--startup-only', action='store_true',
+                        help='Only measure start-up, without a corpus')
+    parser.add_argument('--child', nargs=2, metavar=('OPERATION', 'FILE'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.max_startup is not None and not args.compare:
+        args.compare = STARTUP_BASELINE
+
+    if args.child:
+        print(json.dumps(run_operation(*args.child)))
+        return 0
+
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.corpus or scratch
+        manifest_path = os.path.join(directory, 'manifest.json')
+        if args.startup_only:
+            manifest = {}
+        else:
+            if not os.path.exists(manifest_path):
+                generate_corpus(directory, args.size, args.shapes, args.formats)
+            with open(manifest_path) as f:
+                manifest = {
+                    name: entry for name, entry in json.load(f).items()
+                    if entry["shape"] in (args.shapes or corpus.SHAPES)
+                    and entry["format"] in (args.formats or corpus.FORMATS)}
+        report = run(directory, manifest, os.path.abspath(args.root),
+                     args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        compare(report, baseline)
+        if args.max_startup is not None:
+            slower = check_startup(report, baseline, args.max_startup)
+            if slower:
+                print(f"Error: {', '.join(slower)} over {args.max_startup} "
+                      f"times the earlier run", file=sys.stderr)
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
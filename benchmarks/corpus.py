@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Generate a synthetic corpus of plists for benchmarking.
+
+Each shape stresses a different part of the decoders:
+
+- ``wide_dict``: one dictionary with many keys of mixed scalar values
+- ``deep_nesting``: chains of dictionaries and arrays nested 100 deep
+- ``data_blobs``: an array of large binary ``data`` objects
+- ``dates``: an array of many dates
+- ``shared_objects``: an array of small dictionaries all referencing a
+  few shared containers, which binary plists store once and XML plists
+  repeat
+- ``records``: an array of many small dictionaries with the same keys, as
+  in logs and inventories, eight times the target size so that binary
+  plists are larger than ``FAST_PATH_SIZE`` with the default size and are
+  streamed
+
+Every shape is written in binary and XML format, scaled so that each file
+is close to a target size, together with a ``manifest.json`` describing the
+files.  The content is deterministic for a given size.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import plistlib
+import random
+import sys
+
+FORMATS = {'binary': plistlib.FMT_BINARY, 'xml': plistlib.FMT_XML}
+
+DEFAULT_SIZE = 1024 * 1024
+
+NESTING_DEPTH = 100
+
+# Shapes generated at a multiple of the target size.
+SIZE_FACTORS = {'records': 8}
+
+
+def wide_dict(n, rng):
+    values = (lambda i: f"value {i}", lambda i: i * 7919,
+              lambda i: i / 7, lambda i: i % 2 == 0)
+    return {f"key{i:08d}": values[i % len(values)](i) for i in range(n)}
+
+
+def deep_nesting(n, rng):
+    chains = []
+    for i in range(max(1, n // NESTING_DEPTH)):
+        obj = {"leaf": i}
+        for depth in range(NESTING_DEPTH):
+            obj = {"level": depth, "child": obj} if depth % 2 else [depth, obj]
+        chains.append(obj)
+    return chains
+
+
+def data_blobs(n, rng):
+    size = 64 * 1024
+    return [bytes(rng.getrandbits(8) for _ in range(256)) * (size // 256)
+            for _ in range(max(1, n // 1000))]
+
+
+def dates(n, rng):
+    start = datetime.datetime(2001, 1, 1)
+    return [start + datetime.timedelta(seconds=rng.randrange(10 ** 9))
+            for _ in range(n)]
+
+
+def shared_objects(n, rng):
+    shared = [{"name": f"shared {i}", "values": [i, i + 1, i + 2]}
+              for i in range(10)]
+    return [{"id": i, "ref": shared[i % len(shared)]} for i in range(n)]
+
+
+def records(n, rng):
+    return [{"id": i, "name": f"user {i}", "email": f"user{i}@example.com",
+             "score": rng.random() * 100, "active": i % 3 == 0,
+             "tags": [f"tag {i % 7}", f"tag {i % 11}"]}
+            for i in range(max(1, n // 10))]
+
+
+SHAPES = {
+    'wide_dict': wide_dict,
+    'deep_nesting': deep_nesting,
+    'data_blobs': data_blobs,
+    'dates': dates,
+    'shared_objects': shared_objects,
+    'records': records,
+}
+
+
+def count_objects(obj):
+    """Return the number of objects in the converted output of *obj*.
+
+    Shared objects count once per reference, and dictionary keys count as
+    objects, as they are in the encoded plist.
+    """
+    count = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        count += 1
+        if isinstance(obj, dict):
+            count += len(obj)
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return count
+
+
+def build(shape, fmt, size):
+    """Return ``(plist bytes, object count)`` for *shape* of about *size* bytes."""
+    def encode(n):
+        obj = SHAPES[shape](n, random.Random(n))
+        return plistlib.dumps(obj, fmt=FORMATS[fmt], sort_keys=False), obj
+
+    # Binary plists store equal scalars once and widen their references as
+    # they grow, so the size is only piecewise linear in n: interpolate
+    # between the closest sizes found below and above the target.
+    low, high = (0, 0), None
+    n = 1000
+    for _ in range(8):
+        data, obj = encode(n)
+        if abs(len(data) - size) <= size * 0.05:
+            break
+        if len(data) < size:
+            low = (n, len(data))
+        else:
+            high = (n, len(data))
+        if high is None:
+            step = n * size / len(data)
+        else:
+            step = low[0] + (high[0] - low[0]) * (size - low[1]) / (high[1] - low[1])
+        if max(1, round(step)) == n:
+            break
+        n = max(1, round(step))
+    return data, count_objects(obj)
+
+
+def generate(directory, size=DEFAULT_SIZE, shapes=None, formats=None):
+    """Write the corpus to *directory* and return its manifest."""
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for shape in shapes or SHAPES:
+        for fmt in formats or FORMATS:
+            data, objects = build(shape, fmt, size * SIZE_FACTORS.get(shape, 1))
+            name = f'{shape}.{fmt}.plist'
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.write(data)
+            manifest[name] = {"shape": shape, "format": fmt,
+                              "size": len(data), "objects": objects}
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a plist benchmark corpus')
+    parser.add_argument('directory', help='Output directory')
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE, metavar='BYTES',
+                        help=f'Approximate size of each file (default: {DEFAULT_SIZE})')
+    parser.add_argument('--shape', action='append', choices=sorted(SHAPES),
+                        dest='shapes', help='Shape to generate (repeatable; default: all)')
+    parser.add_argument('--format', action='append', choices=sorted(FORMATS),
+                        dest='formats', help='Format to generate (repeatable; default: all)')
+    args = parser.parse_args()
+    manifest = generate(args.directory, args.size, args.shapes, args.formats)
+    for name, entry in manifest.items():
+        print(f"{name}: {entry['size']} bytes, {entry['objects']} objects",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
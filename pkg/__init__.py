@@ -2,6 +2,13 @@
 
 __version__ = "0.2.2"
 
-from pkg.__main__ import main
-
 __all__ = ["main"]
+
+
+def __getattr__(name):
+    # The command line and its argument parser are only imported when used,
+    # so that importing the library does not pay for them.
+    if name == "main":
+        from pkg.__main__ import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
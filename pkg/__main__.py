@@ -1,55 +1,1440 @@
 #!/usr/bin/env python3
 
-import argparse
+import codecs
+import contextlib
+import functools
+import io
 import json
-import plistlib
+import mmap
+import os
+import stat
 import sys
 
+if not __package__:
+    # Executed as a script (python pkg/__main__.py): make the package
+    # importable so the absolute imports below resolve.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pkg.batch import (default_jobs, file_signature, output_path, parallel_map,
+                       read_skip_record, up_to_date, walk_tree,
+                       write_skip_record)
+from pkg.blobs import DEFAULT_THRESHOLD, DataEncoder
+from pkg.bplist import MAGIC, BinaryPlist
+from pkg.cache import DEFAULT_MAX_SIZE, ConversionCache
+from pkg.events import (VALUE, iter_object_events, key_pruner, parse_path,
+                        parse_pattern, path_pruner, select_path)
+from pkg.fileutil import atomic_open
+from pkg.stream import FRAMINGS, iter_documents
+from pkg.watch import DEFAULT_DEBOUNCE, Watcher
+from pkg.writer import BUFFER_SIZE, write_json
+from pkg import compress
+
+# Modules only needed on some paths, such as argparse, fnmatch, plistlib and the XML
+# parser (pkg.xmlplist and pkg.keyed), are imported where they are used:
+# the library API never parses arguments, and binary input needs no expat.
+
 
 def serialize_default(obj):
     """Handle non-serializable objects in JSON output."""
     return f"<<non-serializable: {type(obj).__name__}>>"
 
 
+HEADER_SIZE = 32
+
+# Formats returned by sniff_format().
+FMT_BINARY = 'binary'
+FMT_XML = 'xml'
+
+# Binary plists up to this size are decoded whole and written with
+# json.dumps, which is faster than streaming them when it can encode in C,
+# that is without indentation; larger ones are streamed so that memory use
+# does not grow with their size.
+FAST_PATH_SIZE = 4 * 1024 * 1024
+
+
 def read_plist(file_path=None):
-    """Read plist from file or stdin."""
+    """Read plist from file or stdin.
+
+    Input compressed with gzip, bzip2 or xz is decompressed first (see
+    :mod:`pkg.compress`).
+    """
     if file_path:
         with open(file_path, 'rb') as f:
-            return plistlib.load(f)
+            return load_plist(f)
+    stream = sys.stdin.buffer
+    buf = map_stream(stream)
+    if buf is None:
+        import plistlib
+
+        return plistlib.loads(read_all(compress.decompressing(stream)))
+    with buf:
+        return load_plist(buf)
+
+
+def load_plist(fp):
+    """Decode the plist in a seekable binary stream, decompressing it if needed."""
+    import plistlib
+
+    reader = compress.decompressing(fp)
+    if reader is fp:
+        return plistlib.load(fp)
+    # Binary plists are read from the end, which decompressing readers
+    # cannot seek to.
+    return plistlib.loads(read_all(reader))
+
+
+def map_stream(stream):
+    """Memory-map a binary stream backed by a regular file.
+
+    Returns None if the stream is not a regular file, is empty, or has
+    already been partially consumed.
+    """
+    try:
+        fd = stream.fileno()
+        st = os.fstat(fd)
+        if (not stat.S_ISREG(st.st_mode) or not st.st_size
+                or stream.tell() != 0):
+            return None
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def read_all(stream):
+    """Read a binary stream to EOF into a single, in-place grown buffer."""
+    buf = bytearray(io.DEFAULT_BUFFER_SIZE)
+    size = 0
+    while True:
+        if size == len(buf):
+            buf.extend(bytes(size))
+        with memoryview(buf) as view:
+            count = stream.readinto(view[size:])
+        if not count:
+            break
+        size += count
+    del buf[size:]
+    return buf
+
+
+def sniff_format(header):
+    """Return the format a plist header indicates, or None.
+
+    The format is :data:`FMT_BINARY` or :data:`FMT_XML`.
+    """
+    if header.startswith(MAGIC):
+        return FMT_BINARY
+    from pkg import xmlplist
+
+    if xmlplist.is_xml_plist(header):
+        return FMT_XML
+    return None
+
+
+def detect_format(file_path):
+    """Return the format of a plist file, or None if unknown.
+
+    The format of a compressed file is the name of its compression (see
+    :mod:`pkg.compress`).
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            return sniff_format(header) or compress.sniff(header)
+    except OSError:
+        # Let the regular reader report the error.
+        return None
+
+
+def iter_plist_events(file_path=None, path=(), stats=None, unarchive=False,
+                      keys=None):
+    """Yield the event stream for a plist file or stdin.
+
+    Binary plist files are memory-mapped and decoded on demand, and XML
+    plist files are parsed incrementally, so memory use scales with nesting
+    depth rather than file size.  Compressed files are decompressed as
+    they are read (see :func:`iter_pipe_events`).  Other inputs are loaded
+    with plistlib.
+
+    Only the object at key *path* is described (null if there is none).
+    Binary plists are navigated through their offset table, decoding just
+    the containers and keys along the path, and XML parsing skips the
+    subtrees off the path and stops once the object has been read.
+
+    With *unarchive*, keyed archives are resolved and shared objects
+    encoded once (see :func:`iter_binary_events`).  *keys*, if given, is
+    an ``(includes, excludes)`` pair of key-path globs applied within the
+    object (see :func:`~pkg.events.key_pruner`): the subtrees they leave
+    out are skipped while decoding.  Input is counted in *stats*, if given.
+    """
+    if not file_path:
+        yield from iter_stream_events(sys.stdin.buffer, path, stats, unarchive,
+                                      keys)
+        return
+    fmt = detect_format(file_path)
+    if fmt is FMT_BINARY:
+        with BinaryPlist.open(file_path) as plist:
+            if stats is not None:
+                stats.bytes_in += len(plist._buf)
+            yield from iter_binary_events(plist, path, unarchive, keys)
+    elif fmt is FMT_XML:
+        with open(file_path, 'rb') as f:
+            yield from iter_xml_events(
+                f if stats is None else stats.reader(f), path, unarchive, keys)
+    elif fmt is not None:
+        with open(file_path, 'rb') as f:
+            yield from iter_pipe_events(
+                f if stats is None else stats.reader(f), path, unarchive, keys)
     else:
-        return plistlib.loads(sys.stdin.read().encode("utf-8"))
+        if stats is not None:
+            stats.bytes_in += os.path.getsize(file_path)
+        yield from iter_object_path_events(read_plist(file_path), path,
+                                           unarchive, keys)
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Convert plist to JSON')
+def iter_object_path_events(obj, path=(), unarchive=False, keys=None):
+    """Yield the event stream for the object at *path* in a decoded plist.
+
+    With *unarchive*, a keyed archive is resolved (see :mod:`pkg.keyed`)
+    and *path* and *keys* apply to the resolved objects.
+    """
+    iter_events = iter_object_events
+    if unarchive:
+        from pkg import keyed
+
+        if keyed.is_keyed_archive(obj):
+            iter_events = keyed.iter_events
+    skip = None if keys is None else key_pruner(*keys)
+    if not path:
+        return iter_events(obj, prune=skip)
+    return select_path(iter_events(obj, prune=path_pruner(path, skip)), path)
+
+
+def iter_binary_events(plist, path=(), unarchive=False, keys=None):
+    """Yield the event stream for the object at *path* in a BinaryPlist.
+
+    With *unarchive*, a keyed archive is decoded whole and resolved, and
+    containers referenced from several places in any other plist are
+    shared objects, decoded and encoded once.  The objects that *keys*
+    leave out are never read.
+    """
+    if unarchive:
+        from pkg import keyed
+
+        if keyed.is_keyed_binary(plist):
+            yield from iter_object_path_events(plist.load(), path, unarchive,
+                                               keys)
+            return
+    ref = plist.find(path)
+    if ref is None:
+        yield VALUE, None
+    elif keys is not None:
+        yield from plist.iter_events(ref, prune=key_pruner(*keys))
+    elif unarchive:
+        yield from plist.iter_events(ref, plist.shared_refs())
+    else:
+        yield from plist.iter_events(ref)
+
+
+def iter_xml_events(fp, path=(), unarchive=False, keys=None):
+    """Yield the event stream for the object at *path* in an XML plist.
+
+    With *unarchive*, the plist is decoded whole, to resolve keyed archives.
+    The objects that *keys* leave out are skipped without being decoded.
+    """
+    if unarchive:
+        import plistlib
+
+        return iter_object_path_events(plistlib.load(fp), path, unarchive, keys)
+    from pkg import xmlplist
+
+    skip = None if keys is None else key_pruner(*keys)
+    if not path:
+        return xmlplist.iter_events(fp, prune=skip)
+    return select_path(
+        xmlplist.iter_events(fp, prune=path_pruner(path, skip)), path)
+
+
+def iter_buffer_events(buf, path=(), unarchive=False, keys=None):
+    """Yield the event stream for a plist held in a bytes-like buffer.
+
+    A compressed buffer is decompressed as it is read.
+    """
+    header = bytes(buf[:HEADER_SIZE])
+    fmt = sniff_format(header)
+    compression = compress.sniff(header)
+    if fmt is FMT_BINARY:
+        yield from iter_binary_events(BinaryPlist(buf), path, unarchive, keys)
+    elif fmt is FMT_XML:
+        yield from iter_xml_events(
+            buf if isinstance(buf, mmap.mmap) else io.BytesIO(buf), path,
+            unarchive, keys)
+    elif compression is not None:
+        reader = compress.open_reader(
+            buf if isinstance(buf, mmap.mmap) else io.BytesIO(buf), compression)
+        yield from iter_pipe_events(reader, path, unarchive, keys)
+    else:
+        import plistlib
+
+        obj = (plistlib.load(buf) if isinstance(buf, mmap.mmap)
+               else plistlib.loads(buf))
+        yield from iter_object_path_events(obj, path, unarchive, keys)
+
+
+def read_stdin(stats=None):
+    """Return all of stdin in a buffer: memory-mapped if it is a regular file."""
+    stream = sys.stdin.buffer
+    if stats is not None:
+        stream = stats.reader(stream)
+    buf = map_stream(stream)
+    if buf is None:
+        return read_all(stream)
+    if stats is not None:
+        stats.bytes_in += len(buf)
+    return buf
+
+
+def iter_stream_events(stream, path=(), stats=None, unarchive=False,
+                       keys=None):
+    """Yield the event stream for a plist read from a binary stream.
+
+    Regular files are memory-mapped, and other streams read as by
+    :func:`iter_pipe_events`.  Input is counted in *stats*, if given, and
+    *unarchive* and *keys* apply as for :func:`iter_plist_events`.
+    """
+    if stats is not None:
+        stream = stats.reader(stream)
+    buf = map_stream(stream)
+    if buf is not None:
+        if stats is not None:
+            stats.bytes_in += len(buf)
+        with buf:
+            yield from iter_buffer_events(buf, path, unarchive, keys)
+        return
+    yield from iter_pipe_events(stream, path, unarchive, keys)
+
+
+def iter_pipe_events(stream, path=(), unarchive=False, keys=None):
+    """Yield the event stream for a plist read sequentially from a stream.
+
+    The format is sniffed from the buffered header.  Compressed input is
+    decompressed as it is read, XML is parsed as it arrives, and anything
+    else is read into a single buffer first, since binary plists keep their
+    offset table at the end.
+    """
+    peek = getattr(stream, 'peek', None)
+    header = peek(HEADER_SIZE)[:HEADER_SIZE] if peek else b''
+    compression = compress.sniff(header)
+    if compression is not None:
+        stream = compress.open_reader(stream, compression)
+        header = stream.peek(HEADER_SIZE)[:HEADER_SIZE]
+    if sniff_format(header) is FMT_XML:
+        yield from iter_xml_events(stream, path, unarchive, keys)
+    else:
+        yield from iter_buffer_events(read_all(stream), path, unarchive, keys)
+
+
+def write_events(events, out, indent=None, buffer_size=BUFFER_SIZE,
+                 stats=None, data=None, ndjson=False, counted=False):
+    """Write the JSON for an event stream to *out*, recording *stats* if given.
+
+    Data objects are written by the :class:`~pkg.blobs.DataEncoder` *data*,
+    if given, and otherwise as placeholders by :func:`serialize_default`.
+    With *ndjson*, each item of the root container is written as a line of
+    its own (see :func:`~pkg.writer.iterencode`) and *indent* is ignored.
+    If *counted*, *out* already records what is written to it in *stats*
+    (see :meth:`~pkg.stats.Stats.writer`).
+    """
+    encode_bytes = None
+    if stats is not None:
+        events = stats.parsing(events)
+    if data is not None:
+        events = data.externalize(events)
+        encode_bytes = data.encode
+    if stats is None:
+        write_json(events, out, indent=indent, default=serialize_default,
+                   buffer_size=buffer_size, encode_bytes=encode_bytes,
+                   lines=ndjson)
+        return
+    stats.enter('serialize')
+    try:
+        write_json(events, out if counted else stats.writer(out), indent=indent,
+                   default=stats.counting(serialize_default),
+                   buffer_size=buffer_size, encode_bytes=encode_bytes,
+                   lines=ndjson)
+    finally:
+        stats.leave()
+
+
+def write_small_plist(file_path, out, path=()):
+    """Write the compact JSON for a small binary plist file with json.dumps.
+
+    The object at key *path* is decoded whole (see
+    :meth:`~pkg.bplist.BinaryPlist.decode`).  Returns False, having written
+    nothing, if the file is not a binary plist of at most
+    :data:`FAST_PATH_SIZE` bytes or nests too deeply for :mod:`json`.
+    """
+    try:
+        if os.path.getsize(file_path) > FAST_PATH_SIZE:
+            return False
+    except OSError:
+        return False
+    if detect_format(file_path) is not FMT_BINARY:
+        return False
+    with BinaryPlist.open(file_path) as plist:
+        ref = plist.find(path)
+        obj = None if ref is None else plist.decode(ref)
+    try:
+        text = json.dumps(obj, default=serialize_default, ensure_ascii=False)
+    except RecursionError:
+        return False
+    out.write(text if isinstance(out, io.TextIOBase) else text.encode('utf-8'))
+    return True
+
+
+def write_plist_json(file_path, out, indent=None, buffer_size=BUFFER_SIZE,
+                     cache=None, path=(), stats=None, data=None,
+                     ndjson=False, unarchive=False, keys=None):
+    """Write the JSON for a plist file (or stdin) to binary stream *out*.
+
+    Only the object at key *path* is written.  Small binary plist files
+    are written by :func:`write_small_plist` unless *indent* or an option
+    that needs the event stream (*stats*, *data*, *ndjson*, *unarchive* or
+    *keys*) is given; everything else is streamed.  If a
+    :class:`ConversionCache` is given, files are converted through it;
+    stdin always bypasses the cache.  Returns True on a cache hit.  The
+    conversion is recorded in the :class:`~pkg.stats.Stats` object *stats*,
+    if given, data objects and *ndjson* are handled as by
+    :func:`write_events`, and *unarchive* and *keys* as by
+    :func:`iter_plist_events`.
+    """
+    if stats is not None:
+        out = stats.writer(out)
+
+    def produce(stream):
+        if (indent is None and stats is None and data is None and not ndjson
+                and not unarchive and keys is None and file_path
+                and write_small_plist(file_path, stream, path)):
+            return
+        # *stream* is *out*, or on a cache miss writes to it as well, so its
+        # output is counted already.
+        write_events(iter_plist_events(file_path, path, stats, unarchive, keys),
+                     stream,
+                     indent=indent, buffer_size=buffer_size, stats=stats,
+                     data=data, ndjson=ndjson, counted=True)
+
+    if cache is None or not file_path:
+        produce(out)
+        return False
+    options = 'ndjson' if ndjson else f'indent={indent!r}'
+    if path:
+        options += f' path={path!r}'
+    if data is not None:
+        options += ' ' + data.options()
+    if unarchive:
+        options += ' unarchive'
+    if keys is not None:
+        options += f' keys={keys!r}'
+    if stats is None:
+        return cache.write(file_path, out, produce, options=options)
+    stats.enter('cache')
+    try:
+        hit = cache.write(file_path, out, produce, options=options)
+    finally:
+        stats.leave()
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+    return hit
+
+
+def write_plist_lines(file_path, out, paths=((),), indent=None,
+                      buffer_size=BUFFER_SIZE, cache=None, buf=None,
+                      stats=None, data=None, ndjson=False, unarchive=False,
+                      keys=None):
+    """Write the object at each key path of a plist as one line of JSON.
+
+    The plist is read from the bytes-like *buf* if given, and otherwise
+    from *file_path* (or stdin, which is only read once).  With *ndjson*,
+    the items of each object are written as lines instead.
+    """
+    if stats is not None:
+        out = stats.writer(out)
+    if buf is None and not file_path and len(paths) > 1:
+        buf = read_stdin(stats)
+        try:
+            write_plist_lines(file_path, out, paths, indent, buffer_size,
+                              cache, buf, stats, data, ndjson, unarchive, keys)
+        finally:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+        return
+    for path in paths:
+        if buf is None:
+            write_plist_json(file_path, out, indent=indent,
+                             buffer_size=buffer_size, cache=cache, path=path,
+                             stats=stats, data=data, ndjson=ndjson,
+                             unarchive=unarchive, keys=keys)
+        else:
+            write_events(iter_buffer_events(buf, path, unarchive, keys), out,
+                         indent=indent,
+                         buffer_size=buffer_size, stats=stats, data=data,
+                         ndjson=ndjson)
+        if not ndjson:
+            out.write(b'\n')
+
+
+def convert_request(header, body=None, cache=None):
+    """Perform a conversion requested from the server (see :mod:`pkg.server`).
+
+    *header* may hold the input ``path`` (otherwise the plist is *body*),
+    ``indent``, a list of key ``paths``, the ``data`` encoding (the
+    arguments of :class:`~pkg.blobs.DataEncoder`), the ``ndjson`` and
+    ``unarchive`` flags, the key-path globs to ``include`` and
+    ``exclude``, the ``buffer_size`` and the ``cache`` to use instead of
+    *cache* (the arguments of :class:`ConversionCache`).
+    Returns ``(output, None)`` or ``(None, message)``.
+    """
+    file_path = header.get('path')
+    paths = [tuple(path) for path in header.get('paths') or [()]]
+    keys = None
+    if header.get('include') or header.get('exclude'):
+        keys = tuple(tuple(tuple(pattern) for pattern in header.get(name) or ())
+                     for name in ('include', 'exclude'))
+    out = io.BytesIO()
+    try:
+        data = header.get('data')
+        if header.get('cache') is not None:
+            cache = ConversionCache(**header['cache'])
+        write_plist_lines(file_path, out, paths, indent=header.get('indent'),
+                          buffer_size=header.get('buffer_size') or BUFFER_SIZE,
+                          cache=cache, buf=None if file_path else body,
+                          data=None if data is None else DataEncoder(**data),
+                          ndjson=bool(header.get('ndjson')),
+                          unarchive=bool(header.get('unarchive')), keys=keys)
+        return out.getvalue(), None
+    except Exception as e:
+        return None, describe_error(e, file_path)
+
+
+def convert(file_path=None, indent=None, cache=None, path=(), stats=None,
+            data=None, unarchive=False, keys=None):
+    """Convert a plist file (or stdin) to JSON and return it as UTF-8 bytes."""
+    out = io.BytesIO()
+    write_plist_json(file_path, out, indent=indent, cache=cache, path=path,
+                     stats=stats, data=data, unarchive=unarchive, keys=keys)
+    return out.getvalue()
+
+
+def convert_bytes(content, indent=None, path=(), stats=None, data=None,
+                  unarchive=False, keys=None):
+    """Convert a plist held in a bytes-like object to JSON as UTF-8 bytes."""
+    out = io.BytesIO()
+    write_events(iter_buffer_events(content, path, unarchive, keys), out,
+                 indent=indent,
+                 stats=stats, data=data)
+    return out.getvalue()
+
+
+def new_stats():
+    """Return a new :class:`~pkg.stats.Stats` object."""
+    from pkg.stats import Stats
+
+    return Stats()
+
+
+def describe_error(exc, file_path=None):
+    """Return the user-facing message for a conversion error."""
+    if isinstance(exc, FileNotFoundError):
+        return f"File '{file_path}' not found"
+    import plistlib
+
+    if isinstance(exc, plistlib.InvalidFileException):
+        return f"Invalid plist format - {exc}"
+    return str(exc)
+
+
+def convert_file(file_path, cache=None, path=(), stats=False, data=None,
+                 unarchive=False, keys=None):
+    """Convert one file in batch mode.
+
+    Returns ``(file_path, json_bytes, None, file_stats)`` on success and
+    ``(file_path, None, message, file_stats)`` on failure, so that a bad
+    file is reported without aborting the batch.  *file_stats* holds the
+    statistics of the conversion (see :meth:`~pkg.stats.Stats.as_dict`)
+    if *stats* is true, and is None otherwise.
+    """
+    recorder = new_stats() if stats else None
+    if recorder is not None:
+        recorder.start()
+    try:
+        result = file_path, convert(file_path, cache=cache, path=path,
+                                    stats=recorder, data=data,
+                                    unarchive=unarchive, keys=keys), None
+    except Exception as e:
+        result = file_path, None, describe_error(e, file_path)
+    if recorder is None:
+        return result + (None,)
+    recorder.stop()
+    return result + (recorder.as_dict(),)
+
+
+def iter_paths(files, files_from=None):
+    """Yield input paths from the command line, then from *files_from*."""
+    yield from files
+    if files_from is None:
+        return
+    if files_from == '-':
+        lines = sys.stdin
+    else:
+        lines = open(files_from, encoding=sys.getfilesystemencoding(),
+                     errors='surrogateescape')
+    with lines:
+        for line in lines:
+            path = line.rstrip('\r\n')
+            if path:
+                yield path
+
+
+def ndjson_record(source, data=None, error=None, key='path'):
+    """Return one NDJSON line tagging converted JSON (or an error) with its source."""
+    record = b'{"' + key.encode('ascii') + b'": ' + json.dumps(source).encode('ascii')
+    if error is None:
+        return record + b', "data": ' + data + b'}\n'
+    return record + b', "error": ' + json.dumps(error).encode('ascii') + b'}\n'
+
+
+def report_stats(stats, path=None):
+    """Print statistics to stderr as one line of JSON, tagged with *path*."""
+    report = {} if path is None else {"path": path}
+    report.update(stats if isinstance(stats, dict) else stats.as_dict())
+    print(json.dumps(report), file=sys.stderr)
+
+
+def run_batch(paths, jobs=None, ordered=True, cache=None, key_path=(),
+              stats=None, data=None, unarchive=False, keys=None):
+    """Convert many files in parallel, writing one NDJSON line per file.
+
+    If a :class:`~pkg.stats.Stats` object is given, the statistics of each
+    file are reported and added to it.
+    """
+    out = stdout_stream()
+    status = 0
+    worker = functools.partial(convert_file, cache=cache, path=key_path,
+                               stats=stats is not None, data=data,
+                               unarchive=unarchive, keys=keys)
+    for path, data, error, file_stats in parallel_map(
+            worker, paths, jobs=jobs, ordered=ordered):
+        if error is not None:
+            print(f"Error: {error}", file=sys.stderr)
+            status = 1
+        if file_stats is not None:
+            report_stats(file_stats, path)
+            stats.add(file_stats)
+        out.write(ndjson_record(path, data, error))
+    out.flush()
+    return status
+
+
+def is_plist_header(header):
+    """Return True if the first KiB of a file identifies it as a plist."""
+    fmt = sniff_format(header)
+    return fmt is FMT_BINARY or (
+        fmt is FMT_XML and b'<plist' in header)
+
+
+def is_plist_name(name):
+    """Return True if *name* ends with ``.plist``, possibly compressed."""
+    name = name.lower()
+    for suffix in compress.INPUT_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name.endswith('.plist')
+
+
+def looks_like_plist(file_path):
+    """Return True if a file found while walking a tree should be converted.
+
+    Files named ``*.plist``, possibly followed by the suffix of a compressed
+    file, always are, so that broken ones get reported; other files only if
+    their header, once decompressed, identifies them as a plist.
+    """
+    if is_plist_name(file_path):
+        return True
+    with open(file_path, 'rb') as f:
+        reader = compress.decompressing(f)
+        if reader is f:
+            return is_plist_header(f.read(1024))
+        try:
+            return is_plist_header(reader.read(1024))
+        except Exception:
+            # Not compressed data after all.
+            return False
+
+
+def convert_to_file(paths, indent=None, cache=None, key_path=(), stats=False,
+                    data=None, ndjson=False, unarchive=False, keys=None,
+                    compression=None):
+    """Convert one plist of a tree to its JSON file, written atomically.
+
+    *paths* is an ``(input, output)`` pair.  The JSON is compressed with
+    *compression*, if given (see :mod:`pkg.compress`).  Returns ``(input, converted,
+    error, file_stats)``, where *converted* is False for files that are not
+    plists and *file_stats* is as for :func:`convert_file`.
+    """
+    src, dst = paths
+    recorder = new_stats() if stats else None
+    try:
+        if not looks_like_plist(src):
+            return src, False, None, None
+        if recorder is not None:
+            recorder.start()
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with atomic_open(dst) as f, compress.compressed(f, compression) as out:
+            write_plist_lines(src, out, [key_path], indent=indent,
+                              cache=cache, stats=recorder, data=data,
+                              ndjson=ndjson, unarchive=unarchive, keys=keys)
+        result = src, True, None
+    except Exception as e:
+        result = src, False, describe_error(e, src)
+    if recorder is None or not recorder.files:
+        return result + (None,)
+    recorder.stop()
+    return result + (recorder.as_dict(),)
+
+
+def output_suffix(compression=None):
+    """Return the suffix of JSON files written with *compression*."""
+    if compression is None:
+        return '.json'
+    return '.json' + compress.OUTPUT_SUFFIXES[compression]
+
+
+def run_tree(src_dir, out_dir, indent=None, jobs=None, cache=None,
+             key_path=(), stats=None, data=None, ndjson=False,
+             unarchive=False, keys=None, compression=None):
+    """Convert every plist under *src_dir* into a mirrored tree of JSON files.
+
+    With *compression*, the files are compressed and named with its suffix.
+    Statistics are reported as by :func:`run_batch`.  The files found not to
+    be plists are recorded in *out_dir* (see :data:`~pkg.batch.SKIP_RECORD`)
+    and not read again by later runs while they stay unchanged.
+    """
+    if not os.path.isdir(src_dir):
+        print(f"Error: Directory '{src_dir}' not found", file=sys.stderr)
+        return 1
+    status = 0
+
+    def report(error):
+        nonlocal status
+        print(f"Error: {error}", file=sys.stderr)
+        status = 1
+
+    previous = read_skip_record(out_dir)
+    skipped = {}
+    # Path relative to src_dir and signature of each file being converted,
+    # taken before it is read.
+    signatures = {}
+
+    def unknown(tasks):
+        for src, dst in tasks:
+            relative = os.path.relpath(src, src_dir)
+            try:
+                signature = file_signature(os.stat(src))
+            except OSError as e:
+                report(e)
+                continue
+            if previous.get(relative) == signature:
+                skipped[relative] = signature
+                continue
+            signatures[src] = relative, signature
+            yield src, dst
+
+    tasks = walk_tree(src_dir, out_dir, onerror=report,
+                      suffix=output_suffix(compression))
+    worker = functools.partial(convert_to_file, indent=indent, cache=cache,
+                               key_path=key_path, stats=stats is not None,
+                               data=data, ndjson=ndjson, unarchive=unarchive,
+                               keys=keys, compression=compression)
+    for src, converted, error, file_stats in parallel_map(
+            worker, unknown(tasks), jobs=jobs, ordered=False):
+        relative, signature = signatures.pop(src)
+        if not converted and error is None:
+            skipped[relative] = signature
+        if error is not None:
+            report(f"{src}: {error}")
+        if file_stats is not None:
+            report_stats(file_stats, src)
+            stats.add(file_stats)
+    if skipped != previous:
+        try:
+            write_skip_record(out_dir, skipped)
+        except OSError as e:
+            report(e)
+    return status
+
+
+def run_watch(inputs, out_dir, indent=None, jobs=None, cache=None,
+              key_path=(), stats=None, data=None, ndjson=False,
+              unarchive=False, keys=None, debounce=DEFAULT_DEBOUNCE,
+              compression=None):
+    """Keep the JSON conversions of plist files and trees current until interrupted.
+
+    *inputs* are plist files, converted to JSON files directly under
+    *out_dir*, and directories, mirrored below it as by :func:`run_tree`.
+    Outputs that are older than their input are converted first; then
+    every file that changes (see :class:`~pkg.watch.Watcher`) is converted
+    again, and the output of every file that is removed is deleted.  Each
+    change is logged to stderr, and statistics are reported as by
+    :func:`run_batch`.  *compression* applies as for :func:`run_tree`.
+    """
+    roots = [path for path in inputs if os.path.isdir(path)]
+    suffix = output_suffix(compression)
+
+    def destination(path):
+        for root in roots:
+            if path.startswith(os.path.join(root, '')):
+                return output_path(out_dir, os.path.relpath(path, root), suffix)
+        return output_path(out_dir, os.path.basename(path), suffix)
+
+    def stale(task):
+        try:
+            return not up_to_date(task[1], os.stat(task[0]).st_mtime_ns)
+        except OSError:
+            return True
+
+    worker = functools.partial(convert_to_file, indent=indent, cache=cache,
+                               key_path=key_path, stats=stats is not None,
+                               data=data, ndjson=ndjson, unarchive=unarchive,
+                               keys=keys, compression=compression)
+    first = True
+    try:
+        with Watcher(inputs, skip=out_dir, debounce=debounce) as watcher:
+            for changed, removed in watcher.changes():
+                for path in removed:
+                    output = destination(path)
+                    try:
+                        os.remove(output)
+                        print(f"Removed {output}", file=sys.stderr)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        print(f"Error: {e}", file=sys.stderr)
+                tasks = {path: destination(path) for path in changed}
+                if first:
+                    tasks = dict(filter(stale, tasks.items()))
+                    first = False
+                for src, converted, error, file_stats in parallel_map(
+                        worker, tasks.items(),
+                        jobs=min(jobs or default_jobs(), len(tasks) or 1),
+                        ordered=False):
+                    if error is not None:
+                        print(f"Error: {src}: {error}", file=sys.stderr)
+                    elif converted:
+                        print(f"Converted {src} -> {tasks[src]}", file=sys.stderr)
+                    if file_stats is not None:
+                        report_stats(file_stats, src)
+                        stats.add(file_stats)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def select_member(patterns, name, header):
+    """Return True if an archive member should be converted.
+
+    With *patterns*, members whose name matches one of these shell-style
+    patterns are; otherwise those named ``*.plist``, possibly followed by
+    the suffix of a compressed file, or whose header identifies them as a
+    plist.
+    """
+    if patterns:
+        import fnmatch
+
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+    return is_plist_name(name) or is_plist_header(header)
+
+
+def convert_member(member, path=(), stats=False, data=None, unarchive=False,
+                   keys=None):
+    """Convert one plist read from an archive.
+
+    *member* is a ``(name, content)`` pair.  Returns ``(name, json_bytes,
+    error, file_stats)`` like :func:`convert_file`.
+    """
+    name, content = member
+    recorder = new_stats() if stats else None
+    if recorder is not None:
+        recorder.start()
+        recorder.bytes_in += len(content)
+    try:
+        result = name, convert_bytes(content, path=path, stats=recorder,
+                                     data=data, unarchive=unarchive,
+                                     keys=keys), None
+    except Exception as e:
+        result = name, None, describe_error(e)
+    if recorder is None:
+        return result + (None,)
+    recorder.stop()
+    return result + (recorder.as_dict(),)
+
+
+def convert_archive(archive_path, patterns=None, jobs=None, ordered=True,
+                    key_path=(), stats=False, data=None, unarchive=False,
+                    keys=None):
+    """Convert the plist members of a zip or tar archive in parallel.
+
+    Members are selected by :func:`select_member` and read straight from
+    the archive, without extracting it.  Yields the results of
+    :func:`convert_member`, in archive order if *ordered*.
+    """
+    from pkg.archive import iter_members
+
+    members = iter_members(archive_path,
+                           functools.partial(select_member, patterns))
+    worker = functools.partial(convert_member, path=key_path, stats=stats,
+                               data=data, unarchive=unarchive, keys=keys)
+    return parallel_map(worker, members, jobs=jobs, ordered=ordered)
+
+
+def run_archive(archive_path, patterns=None, jobs=None, ordered=True,
+                key_path=(), stats=None, data=None, unarchive=False,
+                keys=None):
+    """Convert the plists in an archive, writing one NDJSON line per member.
+
+    Statistics are reported as by :func:`run_batch`.
+    """
+    out = stdout_stream()
+    status = 0
+    try:
+        for name, converted, error, file_stats in convert_archive(
+                archive_path, patterns, jobs=jobs, ordered=ordered,
+                key_path=key_path, stats=stats is not None, data=data,
+                unarchive=unarchive, keys=keys):
+            if error is not None:
+                print(f"Error: {name}: {error}", file=sys.stderr)
+                status = 1
+            if file_stats is not None:
+                report_stats(file_stats, name)
+                stats.add(file_stats)
+            out.write(ndjson_record(name, converted, error, key='member'))
+    except Exception as e:
+        print(f"Error: {describe_error(e, archive_path)}", file=sys.stderr)
+        status = 1
+    out.flush()
+    return status
+
+
+def run_stream(stream, framing='auto', key_path=(), stats=None, data=None,
+               unarchive=False, keys=None):
+    """Convert each plist document in *stream*, writing one NDJSON line each.
+
+    Lines are tagged with the document's index in the stream and written
+    as soon as the document has been read (see :mod:`pkg.stream`).  A
+    document that fails to convert produces an error line without ending
+    the stream.  The output buffer is reused between documents.
+    """
+    out = stdout_stream()
+    if stats is not None:
+        stream = stats.reader(stream)
+    converted = io.BytesIO()
+    status = 0
+    try:
+        for index, document in enumerate(iter_documents(stream, framing)):
+            converted.seek(0)
+            converted.truncate()
+            error = None
+            if stats is not None:
+                stats.start()
+            try:
+                write_events(iter_buffer_events(document, key_path, unarchive,
+                                                keys),
+                             converted, stats=stats, data=data)
+            except Exception as e:
+                error = describe_error(e)
+                status = 1
+            finally:
+                if stats is not None:
+                    stats.stop()
+            out.write(ndjson_record(index, converted.getvalue(), error,
+                                    key='index'))
+            out.flush()
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        status = 1
+    return status
+
+
+def run_diff(old_path, new_path, out, indent=None, buffer_size=BUFFER_SIZE,
+             path=(), data=None, ndjson=False, unarchive=False, keys=None):
+    """Write the differences between two plist files to binary stream *out*.
+
+    The differences between the objects at key *path* are written as a
+    JSON Patch array (see :mod:`pkg.diff`), or with *ndjson* as one
+    operation per line.  Returns the exit status.
+    """
+    from pkg.diff import hash_tree, iter_patch_events
+
+    trees = []
+    for file_path in (old_path, new_path):
+        try:
+            trees.append(hash_tree(iter_plist_events(
+                file_path, path, unarchive=unarchive, keys=keys)))
+        except Exception as e:
+            print(f"Error: {describe_error(e, file_path)}", file=sys.stderr)
+            return 1
+    write_events(iter_patch_events(*trees), out, indent=indent,
+                 buffer_size=buffer_size, data=data, ndjson=ndjson)
+    if not ndjson:
+        out.write(b'\n')
+    out.flush()
+    return 0
+
+
+def run_server(socket_path, jobs=None, cache=None):
+    """Serve conversion requests on a Unix socket until interrupted."""
+    from pkg import server
+
+    if not hasattr(server.socket, 'AF_UNIX'):
+        print("Error: Unix domain sockets are not supported", file=sys.stderr)
+        return 1
+    handler = functools.partial(convert_request, cache=cache)
+    try:
+        print(f"Listening on {socket_path}", file=sys.stderr)
+        server.serve(socket_path, handler, jobs=jobs)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def run_client(socket_path, file_path, out, indent=None, paths=((),),
+               buffer_size=BUFFER_SIZE, cache=None, data=None, ndjson=False,
+               unarchive=False, keys=None):
+    """Have the conversion server at *socket_path* convert one input.
+
+    The server converts through *cache*, if given, rather than its own.
+    Returns ``(buf, status)``.  *status* is None if no server is running,
+    in which case the conversion must be done locally, from *buf* if stdin
+    has already been read into it.
+    """
+    from pkg import server
+
+    sock = server.connect(socket_path)
+    if sock is None:
+        return None, None
+    header = {"indent": indent, "paths": [list(path) for path in paths],
+              "buffer_size": buffer_size, "ndjson": ndjson,
+              "unarchive": unarchive}
+    if cache is not None:
+        header["cache"] = {"directory": os.path.abspath(cache.directory),
+                           "max_size": cache.max_size}
+    if keys is not None:
+        header["include"], header["exclude"] = (
+            [list(pattern) for pattern in patterns] for patterns in keys)
+    if data is not None:
+        header["data"] = {"directory": data.directory and
+                          os.path.abspath(data.directory),
+                          "threshold": data.threshold}
+    buf = None
+    if file_path:
+        header["path"] = os.path.abspath(file_path)
+    else:
+        buf = read_stdin()
+    error = server.request(sock, header, out, body=buf)
+    if error is not None:
+        print(f"Error: {error}", file=sys.stderr)
+        return buf, 1
+    out.flush()
+    return buf, 0
+
+
+def positive_int(value):
+    """Parse a strictly positive integer command-line argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number <= 0:
+        import argparse
+
+        raise argparse.ArgumentTypeError(f"invalid positive integer: '{value}'")
+    return number
+
+
+def non_negative_float(value):
+    """Parse a non-negative number command-line argument."""
+    try:
+        number = float(value)
+    except ValueError:
+        number = -1.0
+    if not number >= 0:
+        import argparse
+
+        raise argparse.ArgumentTypeError(f"invalid non-negative number: '{value}'")
+    return number
+
+
+def key_pattern(value):
+    """Parse a key-path glob command-line argument."""
+    try:
+        return parse_pattern(value)
+    except ValueError as e:
+        import argparse
+
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def key_path(value):
+    """Parse a ``--path`` command-line argument into a key path."""
+    try:
+        return parse_path(value)
+    except ValueError as e:
+        import argparse
+
+        raise argparse.ArgumentTypeError(str(e))
+
+
+class TextWriter:
+    """Binary write adapter for text-only streams such as io.StringIO.
+
+    What is written is decoded as UTF-8 incrementally, so a character may
+    be split between chunks.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._decode = codecs.getincrementaldecoder('utf-8')().decode
+
+    def write(self, data):
+        self.stream.write(self._decode(data))
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def stdout_stream():
+    """Return a binary stream writing to stdout."""
+    buffer = getattr(sys.stdout, 'buffer', None)
+    if buffer is None:
+        return TextWriter(sys.stdout)
+    # Anything already written through the text layer must come first.
+    sys.stdout.flush()
+    return buffer
+
+
+@contextlib.contextmanager
+def compressed_stdout(compression):
+    """Compress everything written to stdout within the block.
+
+    The output is compressed as it is written (see :mod:`pkg.compress`).
+    """
+    out = stdout_stream()
+    with compress.compressed(out, compression) as writer:
+        text = io.TextIOWrapper(writer, encoding='utf-8', write_through=True)
+        try:
+            with contextlib.redirect_stdout(text):
+                yield
+        finally:
+            text.flush()
+            text.detach()
+    out.flush()
+
+
+def help_formatter(prog):
+    """Return an argparse help formatter as wide as the terminal.
+
+    argparse would find the width with :func:`shutil.get_terminal_size`,
+    whose module imports the compression libraries; the terminal is
+    queried the same way here, honoring ``COLUMNS``, without it.
+    """
+    import argparse
+
+    try:
+        width = int(os.environ['COLUMNS'])
+    except (KeyError, ValueError):
+        width = 0
+    if width <= 0:
+        try:
+            width = os.get_terminal_size(sys.__stdout__.fileno()).columns
+        except (AttributeError, ValueError, OSError):
+            width = 0
+    return argparse.HelpFormatter(prog, width=(width or 80) - 2)
+
+
+def parse_args():
+    """Parse and check the command-line arguments."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert plist to JSON',
+                                     formatter_class=help_formatter)
     parser.add_argument('-i', '--indent', type=str, default=None,
                         help='Indentation for JSON output (number of spaces or string)')
-    parser.add_argument('file', nargs='?',
-                        help='Input plist file (default: stdin)')
+    parser.add_argument('--buffer-size', type=positive_int, default=BUFFER_SIZE,
+                        metavar='BYTES',
+                        help=f'Output buffer size (default: {BUFFER_SIZE})')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=None,
+                        help='Worker processes for multiple files (default: number of CPUs)')
+    parser.add_argument('--order', choices=('input', 'completion'), default='input',
+                        help='Order of results for multiple files (default: input)')
+    parser.add_argument('--files-from', metavar='FILE',
+                        help='Read input file paths, one per line, from FILE ("-" for stdin)')
+    parser.add_argument('-r', '--recursive', metavar='SRC',
+                        help='Convert every plist under directory SRC (requires --out-dir)')
+    parser.add_argument('-o', '--out-dir', metavar='DST',
+                        help='Write JSON files to the same relative paths under DST')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='Keep running, converting the input files and directories into '
+                             '--out-dir again whenever they change')
+    parser.add_argument('--debounce', type=non_negative_float, default=DEFAULT_DEBOUNCE,
+                        metavar='SECONDS',
+                        help='Time a changed file must stay unchanged before it is converted '
+                             f'with --watch (default: {DEFAULT_DEBOUNCE})')
+    parser.add_argument('--diff', action='store_true',
+                        help='Write the differences between two input plists as a JSON Patch '
+                             '(one operation per line with --ndjson)')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='Reuse conversions of unchanged files cached in DIR')
+    parser.add_argument('--cache-size', type=positive_int, default=DEFAULT_MAX_SIZE,
+                        metavar='BYTES',
+                        help=f'Maximum size of the cache (default: {DEFAULT_MAX_SIZE})')
+    parser.add_argument('-p', '--path', type=key_path, action='append',
+                        dest='paths', metavar='PATH',
+                        help='Output only the object at key path PATH, e.g. "a.b[3].c" '
+                             '(repeatable: one JSON value per line)')
+    parser.add_argument('--include', type=key_pattern, action='append', dest='includes',
+                        metavar='PATTERN',
+                        help='Keep only the objects matching key-path glob PATTERN, e.g. '
+                             '"Sections.*" or "items[*].name", and their ancestors '
+                             '(repeatable)')
+    parser.add_argument('--exclude', type=key_pattern, action='append', dest='excludes',
+                        metavar='PATTERN',
+                        help='Leave out the objects matching key-path glob PATTERN '
+                             '(repeatable)')
+    parser.add_argument('--ndjson', action='store_true',
+                        help='Write each element of the root array, or each entry of the root '
+                             'dict as a single-entry object, as its own line of JSON')
+    parser.add_argument('-a', '--archive', action='store_true',
+                        help='Convert the plists in the zip or tar archive given as input, '
+                             'writing one NDJSON line per member')
+    parser.add_argument('--member', action='append', dest='members', metavar='PATTERN',
+                        help='Convert the archive members matching PATTERN (repeatable; '
+                             'default: *.plist and members identified as plists)')
+    parser.add_argument('--stream', nargs='?', const='auto', choices=FRAMINGS,
+                        help='Convert many plists from stdin, concatenated (auto, the default), '
+                             'NUL-delimited (nul) or prefixed by their 4-byte big-endian size '
+                             '(length), writing one NDJSON line per document')
+    parser.add_argument('--data', choices=('placeholder', 'base64'), default='placeholder',
+                        help='Output of data objects: a placeholder string or base64 '
+                             '(default: placeholder)')
+    parser.add_argument('--data-dir', metavar='DIR',
+                        help='Write data objects of at least --data-threshold bytes to files '
+                             'in DIR named by content hash, referenced from the JSON '
+                             '(implies --data base64)')
+    parser.add_argument('--data-threshold', type=positive_int, default=DEFAULT_THRESHOLD,
+                        metavar='BYTES',
+                        help=f'Minimum size of data written to --data-dir (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--compress', choices=tuple(compress.OUTPUT_SUFFIXES),
+                        help='Compress the output as it is written; with --out-dir, each '
+                             'JSON file, named with a .gz or .xz suffix')
+    parser.add_argument('--unarchive', action='store_true',
+                        help='Resolve NSKeyedArchiver object graphs into plain JSON, and encode '
+                             'containers shared within streamed binary plists once')
+    parser.add_argument('--stats', action='store_true',
+                        help='Report time per phase, byte and object counts and peak memory '
+                             'as JSON on stderr (per file and in total for multiple files)')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run a conversion server listening on the --socket path')
+    parser.add_argument('--socket', metavar='PATH',
+                        default=os.environ.get('PLIST2JSON_SOCKET') or None,
+                        help='Unix socket of the conversion server: single conversions are sent '
+                             'to it when it is running (default: $PLIST2JSON_SOCKET)')
+    parser.add_argument('files', nargs='*', metavar='file',
+                        help='Input plist file(s) (default: stdin)')
     args = parser.parse_args()
+    if args.watch:
+        if (args.out_dir is None or not (args.files or args.recursive is not None)
+                or args.files_from is not None or args.stream is not None or args.archive
+                or args.serve or (args.paths and len(args.paths) > 1)):
+            parser.error("--watch requires --out-dir and input files, directories or "
+                         "--recursive, and cannot be combined with --files-from, --stream, "
+                         "--archive, --serve or repeated --path")
+    elif (args.recursive is None) != (args.out_dir is None):
+        parser.error("--recursive and --out-dir must be used together")
+    if args.recursive is not None and (args.files or args.files_from is not None):
+        parser.error("--recursive cannot be combined with input files")
+    if args.serve and (args.socket is None or args.files or args.paths or args.stats
+                       or args.includes or args.excludes or args.compress is not None
+                       or args.files_from is not None or args.recursive is not None
+                       or args.stream is not None or args.ndjson or args.unarchive):
+        parser.error("--serve requires --socket and takes no input options")
+    paths = args.paths or [()]
+    multiple_files = len(args.files) > 1 or args.files_from is not None
+    if len(paths) > 1 and (multiple_files or args.recursive is not None):
+        parser.error("--path can only be repeated for a single input")
+    if args.diff and (len(args.files) != 2 or args.files_from is not None
+                      or args.recursive is not None or args.watch or args.archive
+                      or args.stream is not None or args.stats or len(paths) > 1):
+        parser.error("--diff requires exactly two input files and cannot be combined with "
+                     "--files-from, --recursive, --watch, --archive, --stream, --stats "
+                     "or repeated --path")
+    if args.members and not args.archive:
+        parser.error("--member requires --archive")
+    if args.archive and (len(args.files) != 1 or args.files_from is not None
+                         or args.recursive is not None or args.stream is not None
+                         or args.ndjson or args.indent is not None or len(paths) > 1):
+        parser.error("--archive requires a single input file and cannot be combined with "
+                     "--stream, --ndjson, --indent or repeated --path")
+    if args.stream is not None and (args.files or args.files_from is not None
+                                    or args.recursive is not None or args.ndjson
+                                    or args.indent is not None or len(paths) > 1):
+        parser.error("--stream reads stdin and cannot be combined with input files, "
+                     "--ndjson, --indent or repeated --path")
+    if args.ndjson and (args.indent is not None or len(paths) > 1
+                        or (multiple_files and not (args.watch or args.diff))):
+        parser.error("--ndjson cannot be combined with --indent, multiple files "
+                     "or repeated --path")
+    if (multiple_files and args.indent is not None
+            and not (args.watch or args.diff)):
+        parser.error("--indent cannot be used with multiple files")
+    return args
+
+
+def run_args(args):
+    """Run the conversions that parsed command-line arguments *args* ask for."""
+    paths = args.paths or [()]
+    multiple_files = len(args.files) > 1 or args.files_from is not None
+
+    keys = None
+    if args.includes or args.excludes:
+        keys = (tuple(args.includes or ()), tuple(args.excludes or ()))
+
+    indent = args.indent
+    if indent is not None:
+        try:
+            indent = int(indent)
+        except ValueError:
+            pass
+
+    data = None
+    if args.data_dir is not None:
+        data = DataEncoder(args.data_dir, args.data_threshold)
+    elif args.data == 'base64':
+        data = DataEncoder()
+
+    cache = None
+    if args.cache_dir is not None:
+        cache = ConversionCache(args.cache_dir, args.cache_size)
+
+    if args.serve:
+        return run_server(args.socket, jobs=args.jobs, cache=cache)
+
+    stats = None
+    if args.stats:
+        from pkg.stats import trace_memory
 
+        trace_memory()
+        stats = new_stats()
+
+    if args.archive:
+        try:
+            return run_archive(args.files[0], args.members, jobs=args.jobs,
+                               ordered=args.order == 'input', key_path=paths[0],
+                               stats=stats, data=data, unarchive=args.unarchive, keys=keys)
+        finally:
+            if stats is not None:
+                report_stats(stats)
+
+    if args.stream is not None:
+        try:
+            return run_stream(sys.stdin.buffer, args.stream, key_path=paths[0],
+                              stats=stats, data=data, unarchive=args.unarchive, keys=keys)
+        finally:
+            if stats is not None:
+                report_stats(stats)
+
+    if args.diff:
+        return run_diff(args.files[0], args.files[1], stdout_stream(), indent=indent,
+                        buffer_size=args.buffer_size, path=paths[0], data=data,
+                        ndjson=args.ndjson, unarchive=args.unarchive, keys=keys)
+
+    if args.watch:
+        try:
+            return run_watch(args.files or [args.recursive], args.out_dir, indent=indent,
+                             jobs=args.jobs, cache=cache, key_path=paths[0], stats=stats,
+                             data=data, ndjson=args.ndjson, unarchive=args.unarchive,
+                             keys=keys, debounce=args.debounce,
+                             compression=args.compress)
+        finally:
+            if stats is not None:
+                report_stats(stats)
+
+    if args.recursive is not None:
+        try:
+            return run_tree(args.recursive, args.out_dir, indent=indent,
+                            jobs=args.jobs, cache=cache, key_path=paths[0],
+                            stats=stats, data=data, ndjson=args.ndjson,
+                            unarchive=args.unarchive, keys=keys,
+                            compression=args.compress)
+        finally:
+            if stats is not None:
+                report_stats(stats)
+
+    if multiple_files:
+        # Each file becomes one NDJSON line: {"path": ..., "data": ...}
+        try:
+            return run_batch(iter_paths(args.files, args.files_from),
+                             jobs=args.jobs, ordered=args.order == 'input',
+                             cache=cache, key_path=paths[0], stats=stats,
+                             data=data, unarchive=args.unarchive, keys=keys)
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        finally:
+            if stats is not None:
+                report_stats(stats)
+
+    file_path = args.files[0] if args.files else None
+    buf = None
     try:
-        indent = args.indent
-        if indent is not None:
-            try:
-                indent = int(indent)
-            except ValueError:
-                pass
-        
-        data = read_plist(args.file)
-        output = json.dumps(data, indent=indent,
-                           default=serialize_default, ensure_ascii=False)
-        print(output)
+        out = stdout_stream()
+        # Statistics are only gathered by local conversions.
+        if args.socket is not None and stats is None:
+            buf, status = run_client(args.socket, file_path, out,
+                                     indent=indent, paths=paths,
+                                     buffer_size=args.buffer_size,
+                                     cache=cache, data=data,
+                                     ndjson=args.ndjson,
+                                     unarchive=args.unarchive, keys=keys)
+            if status is not None:
+                return status
+        if stats is not None:
+            stats.start()
+        write_plist_lines(file_path, out, paths, indent=indent,
+                          buffer_size=args.buffer_size, cache=cache, buf=buf,
+                          stats=stats, data=data, ndjson=args.ndjson,
+                          unarchive=args.unarchive, keys=keys)
+        out.flush()
         return 0
-    except FileNotFoundError:
-        print(f"Error: File '{args.file}' not found", file=sys.stderr)
-        return 1
-    except plistlib.InvalidFileException as e:
-        print(f"Error: Invalid plist format - {e}", file=sys.stderr)
-        return 1
     except Exception as e:
-        print(f"Error: {e}", file=sys.stderr)
+        print(f"Error: {describe_error(e, file_path)}", file=sys.stderr)
         return 1
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+        if stats is not None and stats.files:
+            stats.stop()
+            report_stats(stats)
+
+
+def main():
+    args = parse_args()
+    if args.compress is not None and args.out_dir is None:
+        with compressed_stdout(args.compress):
+            return run_args(args)
+    return run_args(args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,185 @@
+"""Asyncio API for converting plists without blocking the event loop.
+
+Reading and converting run in a bounded pool of worker processes (or
+threads), and an :class:`AsyncConverter` admits only a limited number of
+conversions at once: further requests wait for a free slot, and
+:meth:`AsyncConverter.convert_many` stops pulling inputs while the limit is
+reached, so an unbounded stream of inputs is consumed at the pace of the
+workers::
+
+    async with AsyncConverter(jobs=4) as converter:
+        data = await converter.convert('Info.plist', path=('CFBundleVersion',))
+        async for source, data, error in converter.convert_many(paths):
+            ...
+
+:func:`convert_async` and :func:`convert_many_async` use a shared
+converter with the default settings.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import os
+
+from pkg.__main__ import convert, convert_bytes, describe_error
+from pkg.batch import BACKLOG_PER_JOB, default_jobs
+
+_BYTES_TYPES = (bytes, bytearray, memoryview)
+
+# Options of pkg.__main__.convert that only apply to files.
+_PATH_OPTIONS = ('cache',)
+
+
+def _convert(source, options):
+    if isinstance(source, _BYTES_TYPES):
+        return convert_bytes(source, **{name: value for name, value in options.items()
+                                        if name not in _PATH_OPTIONS})
+    return convert(os.fspath(source), **options)
+
+
+def _describe(exc, source):
+    return describe_error(exc, os.fspath(source) if isinstance(
+        source, (str, os.PathLike)) else None)
+
+
+def _attempt(source, options):
+    """Convert *source*, returning ``(json_bytes, None)`` or ``(None, message)``."""
+    try:
+        return _convert(source, options), None
+    except Exception as e:
+        return None, _describe(e, source)
+
+
+async def _aiter(sources):
+    if hasattr(sources, '__aiter__'):
+        async for source in sources:
+            yield source
+    else:
+        for source in sources:
+            yield source
+
+
+class AsyncConverter:
+    """Converts plists in a pool of workers, for use from coroutines.
+
+    Conversions run in *jobs* worker processes (default: one per CPU), or
+    in as many threads if *threads* is true.  Processes convert in parallel
+    but copy each input and result between processes; threads avoid the
+    copies but share the GIL with the event loop.  At most *limit*
+    conversions are in flight at once (default: a few per worker).
+
+    Use a converter as an async context manager, or call :meth:`close`
+    when done.
+    """
+
+    def __init__(self, jobs=None, threads=False, limit=None):
+        self.jobs = jobs or default_jobs()
+        self.limit = limit or self.jobs * BACKLOG_PER_JOB
+        self._threads = threads
+        if threads:
+            self._executor = concurrent.futures.ThreadPoolExecutor(self.jobs)
+        else:
+            self._executor = concurrent.futures.ProcessPoolExecutor(self.jobs)
+        self._slots = self._loop = None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores belong to the loop they are first used in.
+            self._slots, self._loop = asyncio.Semaphore(self.limit), loop
+        async with self._slots:
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    def _sendable(self, source):
+        # Memory views cannot be pickled for worker processes.
+        if isinstance(source, memoryview) and not self._threads:
+            return bytes(source)
+        return source
+
+    async def convert(self, source, **options):
+        """Convert one plist and return its JSON as UTF-8 bytes.
+
+        *source* is a file path or the plist content as a bytes-like
+        object.  *options* are passed to :func:`pkg.__main__.convert`, for
+        example ``indent``, ``path`` or ``data``; ``cache`` only applies to
+        file paths and is ignored for bytes.  Conversion errors are raised.
+        """
+        return await self._run(_convert, self._sendable(source), options)
+
+    async def convert_many(self, sources, ordered=True, **options):
+        """Convert many plists, yielding ``(source, json_bytes, error)``.
+
+        *sources* is an iterable or async iterable of file paths and
+        bytes-like objects.  It is consumed lazily, only while fewer than
+        *limit* conversions are in flight.  Results come in input order if
+        *ordered*, otherwise as soon as each completes.  A failed
+        conversion yields None and an error message instead of raising.
+        """
+        async def attempt(source):
+            try:
+                return (source,) + await self._run(_attempt, self._sendable(source),
+                                                   options)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The conversion could not be handed to a worker.
+                return source, None, _describe(e, source)
+
+        pending = collections.deque() if ordered else set()
+        try:
+            async for source in _aiter(sources):
+                task = asyncio.ensure_future(attempt(source))
+                if ordered:
+                    pending.append(task)
+                    if len(pending) >= self.limit:
+                        result = await pending[0]
+                        pending.popleft()
+                        yield result
+                else:
+                    pending.add(task)
+                    if len(pending) >= self.limit:
+                        done, pending = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            yield task.result()
+            if ordered:
+                while pending:
+                    result = await pending[0]
+                    pending.popleft()
+                    yield result
+            else:
+                for task in asyncio.as_completed(pending):
+                    yield await task
+                pending = ()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def close(self, wait=True):
+        """Shut down the worker pool."""
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Waiting for the workers to exit would block the event loop.
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+@functools.lru_cache(maxsize=None)
+def _default_converter():
+    return AsyncConverter()
+
+
+async def convert_async(source, **options):
+    """Convert one plist with a shared :class:`AsyncConverter`."""
+    return await _default_converter().convert(source, **options)
+
+
+async def convert_many_async(sources, ordered=True, **options):
+    """Convert many plists with a shared :class:`AsyncConverter`."""
+    async for result in _default_converter().convert_many(
+            sources, ordered=ordered, **options):
+        yield result
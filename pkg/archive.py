@@ -0,0 +1,53 @@
+"""Reading plists straight out of zip and tar archives.
+
+Members are decompressed in memory one at a time, so converting the plists
+of an ``.ipa`` bundle or a backup tarball needs no extraction to disk.  Zip
+archives are read through their central directory; tar archives, possibly
+compressed with gzip, bzip2 or xz, as a stream, in a single pass.
+"""
+
+import tarfile
+import zipfile
+
+# Bytes of each member read to decide whether it is selected.
+HEADER_SIZE = 1024
+
+
+def _iter_zip(archive, select):
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        with archive.open(info) as member:
+            header = member.read(HEADER_SIZE)
+            if select(info.filename, header):
+                yield info.filename, header + member.read()
+
+
+def _iter_tar(archive, select):
+    for info in archive:
+        if not info.isfile():
+            continue
+        member = archive.extractfile(info)
+        header = member.read(HEADER_SIZE)
+        if select(info.name, header):
+            yield info.name, header + member.read()
+
+
+def iter_members(archive_path, select):
+    """Yield ``(name, content)`` for the selected members of an archive.
+
+    ``select(name, header)`` is called with the name and the first
+    :data:`HEADER_SIZE` bytes of each regular file in the archive and
+    returns True for those to yield, in archive order.  Raises ValueError
+    if the file is neither a zip nor a tar archive.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            yield from _iter_zip(archive, select)
+        return
+    try:
+        archive = tarfile.open(archive_path, 'r|*')
+    except tarfile.ReadError:
+        raise ValueError(f"'{archive_path}' is not a zip or tar archive")
+    with archive:
+        yield from _iter_tar(archive, select)
@@ -0,0 +1,189 @@
+"""Parallel conversion of many inputs across a process pool."""
+
+import collections
+import errno
+import json
+import os
+
+from pkg.compress import INPUT_SUFFIXES
+from pkg.fileutil import atomic_open
+
+# In-flight tasks per worker: enough to keep every worker busy while
+# bounding how far submission runs ahead of the results consumed.
+BACKLOG_PER_JOB = 4
+
+# File in the output directory of a tree conversion recording the files
+# found not to be plists, which are not read again while unchanged.
+SKIP_RECORD = '.plist2json-skip.json'
+
+
+def output_path(out_dir, relative_path, suffix='.json'):
+    """Return where the conversion of *relative_path* goes under *out_dir*.
+
+    A ``.plist`` extension, alone or followed by that of a compressed file
+    as in ``a.plist.gz``, is replaced by *suffix*; any other name has
+    *suffix* appended.  Names such as ``a.plist`` and ``a`` thus share an
+    output, which :func:`walk_tree` reports.
+    """
+    root, ext = os.path.splitext(relative_path)
+    if ext.lower() in INPUT_SUFFIXES:
+        root, ext = os.path.splitext(root)
+    if ext.lower() != '.plist':
+        root = relative_path
+    return os.path.join(out_dir, root + suffix)
+
+
+def _output_rank(name):
+    # Orders the inputs sharing an output: plain .plist files, then
+    # compressed ones, then the others.
+    root, ext = os.path.splitext(name)
+    if ext.lower() == '.plist':
+        return 0
+    if ext.lower() in INPUT_SUFFIXES and \
+            os.path.splitext(root)[1].lower() == '.plist':
+        return 1
+    return 2
+
+
+def up_to_date(output, mtime_ns):
+    """Return True if file *output* exists and is not older than *mtime_ns*."""
+    try:
+        return os.stat(output).st_mtime_ns >= mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def file_signature(st):
+    """Return what tells versions of a file apart from its ``os.stat`` result.
+
+    The change time is included because copies that keep the modification
+    time of their source still get a new one.
+    """
+    return [st.st_size, st.st_mtime_ns, st.st_ctime_ns]
+
+
+def read_skip_record(out_dir):
+    """Return the :data:`SKIP_RECORD` of *out_dir*, or {} if there is none.
+
+    It maps the paths of files that are not plists, relative to the source
+    tree, to their :func:`file_signature`.
+    """
+    try:
+        with open(os.path.join(out_dir, SKIP_RECORD), 'rb') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return record if isinstance(record, dict) else {}
+
+
+def write_skip_record(out_dir, record):
+    """Replace the :data:`SKIP_RECORD` of *out_dir* with *record*."""
+    os.makedirs(out_dir, exist_ok=True)
+    with atomic_open(os.path.join(out_dir, SKIP_RECORD)) as f:
+        f.write(json.dumps(record, sort_keys=True).encode('utf-8'))
+
+
+def walk_tree(src_dir, out_dir, onerror=None, suffix='.json'):
+    """Yield ``(input, output)`` paths for files under *src_dir* needing conversion.
+
+    Directories are scanned lazily, so conversion can start as soon as the
+    first file is found.  Files whose output under *out_dir* is at least as
+    new as the input are skipped, as is *out_dir* itself if it lies inside
+    *src_dir*.  Symlinked directories are not followed.  *onerror* is called
+    with the OSError of any entry or directory that cannot be examined.
+    Output paths end with *suffix* (see :func:`output_path`).
+
+    Files sharing an output path are not converted into it together: the
+    output goes to a ``.plist`` file first, then to a compressed one, then
+    to the first by name, and *onerror* is called with an EEXIST error for
+    each of the others, whether or not their output is up to date.
+    """
+    skip = os.path.realpath(out_dir)
+    pending = [src_dir]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+        subdirs = []
+        files = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.realpath(entry.path) != skip:
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    output = output_path(out_dir,
+                                         os.path.relpath(entry.path, src_dir),
+                                         suffix)
+                    files.append((_output_rank(entry.name), entry.name, entry, output))
+            except OSError as e:
+                if onerror is not None:
+                    onerror(e)
+        # Outputs only collide within a directory.
+        claimed = {}
+        for _, _, entry, output in sorted(files, key=lambda file: file[:2]):
+            owner = claimed.setdefault(output, entry.name)
+            try:
+                if owner != entry.name:
+                    raise OSError(errno.EEXIST,
+                                  f"Output {output!r} is that of {owner!r}",
+                                  entry.path)
+                if up_to_date(output, entry.stat().st_mtime_ns):
+                    continue
+            except OSError as e:
+                if onerror is not None:
+                    onerror(e)
+                continue
+            yield entry.path, output
+        pending.extend(reversed(subdirs))
+
+
+def default_jobs():
+    """Return the default number of worker processes."""
+    return os.cpu_count() or 1
+
+
+def parallel_map(func, items, jobs=None, ordered=True):
+    """Yield ``func(item)`` for each item, computed by worker processes.
+
+    *items* is consumed lazily, with at most ``BACKLOG_PER_JOB`` tasks per
+    worker in flight, so it may be an unbounded stream.  Results are yielded
+    in input order if *ordered*, otherwise as soon as each one completes.
+    With a single job everything runs in the calling process.  *func* must
+    be picklable and should report per-item failures in its return value:
+    an exception raised by *func* propagates and stops the iteration.
+    """
+    jobs = jobs or default_jobs()
+    if jobs == 1:
+        yield from map(func, items)
+        return
+
+    # Imported here: it is slow to import and not needed with a single job.
+    import concurrent.futures
+
+    limit = jobs * BACKLOG_PER_JOB
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        if ordered:
+            pending = collections.deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            for item in items:
+                pending.add(executor.submit(func, item))
+                if len(pending) >= limit:
+                    done, pending = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            for future in concurrent.futures.as_completed(pending):
+                yield future.result()
@@ -0,0 +1,89 @@
+"""Output of plist ``data`` objects as base64 strings or as separate files.
+
+By default, data objects are written through ``serialize_default`` as a
+placeholder string.  A :class:`DataEncoder` writes them as base64 strings
+instead, encoded in bulk by :mod:`binascii` and streamed in chunks, so a
+large blob never has to pass through the JSON string encoder.  Given a
+directory, it writes each blob of at least a threshold size to a file
+there, named by the SHA-256 of its content so that duplicates are stored
+once, and replaces it in the JSON by a reference object::
+
+    {"$data": "<sha256 hex>.bin", "size": 1234}
+"""
+
+import os
+
+from pkg.events import START_DICT, END_DICT, KEY, VALUE
+from pkg.fileutil import atomic_open
+
+# Blobs of at least this many bytes are written to files by default.
+DEFAULT_THRESHOLD = 4096
+
+# Bytes of data encoded per base64 chunk: a multiple of 3, so that only
+# the last chunk is padded.
+CHUNK_SIZE = 3 * 16 * 1024
+
+
+def iter_base64(data):
+    """Yield the JSON string fragments holding *data* in base64."""
+    import binascii
+
+    yield '"'
+    view = memoryview(data)
+    for pos in range(0, len(view), CHUNK_SIZE):
+        yield binascii.b2a_base64(view[pos:pos + CHUNK_SIZE],
+                                  newline=False).decode('ascii')
+    yield '"'
+
+
+class DataEncoder:
+    """How data objects are written to JSON.
+
+    Blobs are encoded in base64, except that, if *directory* is given,
+    blobs of at least *threshold* bytes are stored there as files.
+    """
+
+    def __init__(self, directory=None, threshold=DEFAULT_THRESHOLD):
+        self.directory = directory
+        self.threshold = threshold
+
+    def options(self):
+        """Return a description of the encoding, as a cache option."""
+        if self.directory is None:
+            return 'data=base64'
+        return (f'data={os.path.abspath(self.directory)!r}'
+                f' threshold={self.threshold!r}')
+
+    def encode(self, data):
+        """Yield the JSON fragments for a blob written inline."""
+        return iter_base64(data)
+
+    def store(self, data):
+        """Write *data* to the directory unless present, and return its name."""
+        import hashlib
+
+        name = hashlib.sha256(data).hexdigest() + '.bin'
+        path = os.path.join(self.directory, name)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            with atomic_open(path) as f:
+                f.write(data)
+        return name
+
+    def externalize(self, events):
+        """Yield *events*, with large blobs replaced by file references."""
+        if self.directory is None:
+            yield from events
+            return
+        threshold = self.threshold
+        for event, value in events:
+            if (event == VALUE and isinstance(value, (bytes, bytearray))
+                    and len(value) >= threshold):
+                yield START_DICT, None
+                yield KEY, '$data'
+                yield VALUE, self.store(value)
+                yield KEY, 'size'
+                yield VALUE, len(value)
+                yield END_DICT, None
+            else:
+                yield event, value
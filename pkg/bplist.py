@@ -0,0 +1,470 @@
+"""On-demand decoder for binary (bplist00) property lists.
+
+``plistlib`` decodes a binary plist into a complete Python object graph.
+:class:`BinaryPlist` instead keeps the encoded file in a buffer, usually a
+read-only memory map, and uses the trailer and offset table to decode each
+object only when it is visited.  Walking the plist with :meth:`iter_events`
+therefore needs memory proportional to the nesting depth, not the file size.
+
+Encoders store an object referenced from several places once, and the
+offset table lets every reference point to it.  Given the containers that
+are shared this way (see :meth:`BinaryPlist.shared_refs`), the walk
+decodes each of them only once and refers back to it afterwards.
+:meth:`BinaryPlist.decode` reuses them the same way when a small plist is
+decoded whole.  Dictionary keys, which encoders store once as well, are
+decoded once per walk while there are not too many of them.
+"""
+
+import mmap
+import struct
+
+from pkg.events import (START_DICT, END_DICT, START_ARRAY, END_ARRAY,
+                        KEY, VALUE, REF)
+
+MAGIC = b'bplist00'
+
+_TRAILER = struct.Struct('>6xBBQQQ')
+
+# Exceptions raised by malformed input while decoding; reported as
+# plistlib.InvalidFileException, as plistlib itself does.
+_DECODE_ERRORS = (IndexError, struct.error, OverflowError, ValueError)
+
+_UINT_FORMATS = {1: '>B', 2: '>H', 4: '>L', 8: '>Q'}
+
+_CONTAINER_KINDS = (0xA0, 0xD0)
+
+# Most dictionary keys remembered by a walk.
+_KEY_CACHE_SIZE = 4096
+
+_MISSING = object()
+
+
+# plistlib, which loads the XML parser, and datetime are only imported when
+# needed, so that decoding binary plists does not pay for them.
+def _invalid_file():
+    """Return the exception raised for a malformed plist."""
+    import plistlib
+
+    return plistlib.InvalidFileException()
+
+
+_unpack_double = struct.Struct('>d').unpack_from
+
+
+def _uint_unpacker(size):
+    """Return an ``unpack(buf, pos)`` function for *size*-byte unsigned ints.
+
+    Like ``struct.Struct.unpack_from``, it returns a 1-tuple.
+    """
+    if size in _UINT_FORMATS:
+        return struct.Struct(_UINT_FORMATS[size]).unpack_from
+    read = _uint_reader(size)
+    return lambda buf, pos: (read(buf, pos),)
+
+
+def _uint_reader(size):
+    """Return a ``read(buf, pos)`` function for *size*-byte unsigned ints."""
+    if size in _UINT_FORMATS:
+        unpack_from = struct.Struct(_UINT_FORMATS[size]).unpack_from
+        return lambda buf, pos: unpack_from(buf, pos)[0]
+
+    def read(buf, pos):
+        data = buf[pos:pos + size]
+        if len(data) != size:
+            raise IndexError("read past end of plist")
+        return int.from_bytes(data, 'big')
+    return read
+
+
+def is_complete(buf, start, end):
+    """Return True if ``buf[start:end]`` looks like a whole binary plist.
+
+    The trailer must describe an offset table that ends right where the
+    trailer begins, as plist encoders write it.  This finds where a binary
+    plist ends in a stream of concatenated documents.
+    """
+    size = end - start
+    if size < len(MAGIC) + _TRAILER.size or \
+            buf[start:start + len(MAGIC)] != MAGIC:
+        return False
+    offset_size, ref_size, num_objects, top_object, offset_table = \
+        _TRAILER.unpack_from(buf, end - _TRAILER.size)
+    return (0 < offset_size <= 8 and 0 < ref_size <= 8
+            and top_object < num_objects
+            and offset_table >= len(MAGIC)
+            and offset_table + num_objects * offset_size
+            == size - _TRAILER.size)
+
+
+class BinaryPlist:
+    """Random-access view of an encoded binary plist.
+
+    *buf* may be any object supporting slicing and the buffer protocol,
+    such as ``bytes``, ``bytearray`` or ``mmap.mmap``.
+    """
+
+    def __init__(self, buf):
+        if buf[:len(MAGIC)] != MAGIC or len(buf) < len(MAGIC) + _TRAILER.size:
+            raise _invalid_file()
+        self._buf = buf
+        (self._offset_size, self._ref_size, self.num_objects,
+         self.top_object, self._offset_table) = _TRAILER.unpack_from(
+             buf, len(buf) - _TRAILER.size)
+        if not self._offset_size or not self._ref_size:
+            raise _invalid_file()
+        self._read_offset = _uint_reader(self._offset_size)
+        self._read_ref = _uint_reader(self._ref_size)
+        self._unpack_offset = _uint_unpacker(self._offset_size)
+        self._unpack_ref = _uint_unpacker(self._ref_size)
+        self._mmap = None
+
+    @classmethod
+    def open(cls, file_path):
+        """Memory-map *file_path* and return a :class:`BinaryPlist` for it."""
+        with open(file_path, 'rb') as f:
+            try:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped.
+                raise _invalid_file()
+        try:
+            plist = cls(buf)
+        except Exception:
+            buf.close()
+            raise
+        plist._mmap = buf
+        return plist
+
+    def close(self):
+        """Release the memory map, if this plist owns one."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def load(self):
+        """Decode the whole plist with :mod:`plistlib` and return it."""
+        import plistlib
+
+        return plistlib.loads(self._buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _size(self, token, pos):
+        """Return ``(size, position after it)`` for a length-bearing object."""
+        size = token & 0x0F
+        if size != 0x0F:
+            return size, pos
+        width = 1 << (self._buf[pos] & 0x3)
+        return _uint_reader(width)(self._buf, pos + 1), pos + 1 + width
+
+    def _bytes(self, pos, size):
+        data = self._buf[pos:pos + size]
+        if len(data) != size:
+            raise _invalid_file()
+        return data
+
+    def read(self, ref):
+        """Decode object *ref* without descending into containers.
+
+        Returns ``(START_DICT, (count, refs_pos))`` or
+        ``(START_ARRAY, (count, refs_pos))`` for containers, where
+        *refs_pos* is the offset of the first object reference, and
+        ``(VALUE, value)`` for every other object.
+        """
+        if not 0 <= ref < self.num_objects:
+            raise _invalid_file()
+        buf = self._buf
+        try:
+            offset = self._unpack_offset(
+                buf, self._offset_table + ref * self._offset_size)[0]
+            # This runs for every object of a walk: the most common kinds
+            # are tested first, and lengths are read inline.
+            token = buf[offset]
+            kind = token & 0xF0
+            pos = offset + 1
+            if kind == 0x50:
+                size = token & 0x0F
+                if size == 0x0F:
+                    size, pos = self._size(token, pos)
+                data = buf[pos:pos + size]
+                if len(data) != size:
+                    raise _invalid_file()
+                return VALUE, data.decode('ascii')
+            if kind == 0xD0 or kind == 0xA0:
+                size = token & 0x0F
+                if size == 0x0F:
+                    size, pos = self._size(token, pos)
+                return (START_DICT if kind == 0xD0 else START_ARRAY), (size, pos)
+            if kind == 0x10:
+                size = 1 << (token & 0x0F)
+                data = buf[pos:pos + size]
+                if len(data) != size:
+                    raise _invalid_file()
+                return VALUE, int.from_bytes(data, 'big', signed=size >= 8)
+            if kind == 0x60:
+                size = token & 0x0F
+                if size == 0x0F:
+                    size, pos = self._size(token, pos)
+                return VALUE, self._bytes(pos, size * 2).decode('utf-16be')
+            if token == 0x23:
+                return VALUE, _unpack_double(buf, pos)[0]
+            if token == 0x08:
+                return VALUE, False
+            if token == 0x09:
+                return VALUE, True
+            return self._decode_other(buf, token, pos)
+        except _DECODE_ERRORS:
+            raise _invalid_file()
+
+    def find(self, path, ref=None):
+        """Return the reference of the object at key *path*, or None.
+
+        *path* is a sequence of dictionary keys and array indexes, followed
+        from object *ref* (default: the root).  Only the containers along
+        the path and the keys of the dictionaries searched are decoded.
+        """
+        read, read_ref, buf = self.read, self._read_ref, self._buf
+        ref_size = self._ref_size
+        ref = self.top_object if ref is None else ref
+        for node in path:
+            event, value = read(ref)
+            if event == VALUE:
+                return None
+            count, pos = value
+            try:
+                if event == START_ARRAY:
+                    if not isinstance(node, int) or node >= count:
+                        return None
+                    ref = read_ref(buf, pos + node * ref_size)
+                    continue
+                if not isinstance(node, str):
+                    return None
+                for index in range(count):
+                    key_event, key = read(read_ref(buf, pos + index * ref_size))
+                    if key_event == VALUE and key == node:
+                        ref = read_ref(buf, pos + (count + index) * ref_size)
+                        break
+                else:
+                    return None
+            except _DECODE_ERRORS:
+                raise _invalid_file()
+        return ref
+
+    def _decode_other(self, buf, token, pos):
+        """Decode the kinds of object that :meth:`read` does not test first."""
+        kind = token & 0xF0
+        if token == 0x00:
+            return VALUE, None
+        if token == 0x0F:
+            return VALUE, b''
+        if token == 0x22:
+            return VALUE, struct.unpack_from('>f', buf, pos)[0]
+        if token == 0x33:
+            import datetime
+
+            seconds = _unpack_double(buf, pos)[0]
+            return VALUE, (datetime.datetime(2001, 1, 1)
+                           + datetime.timedelta(seconds=seconds))
+        if kind == 0x40:
+            size, pos = self._size(token, pos)
+            # A copy if the buffer is a bytearray, as stdin read from a pipe
+            # is, so that data is always bytes.
+            return VALUE, bytes(self._bytes(pos, size))
+        if kind == 0x80:
+            from plistlib import UID
+
+            return VALUE, UID(
+                int.from_bytes(self._bytes(pos, (token & 0x0F) + 1), 'big'))
+        raise _invalid_file()
+
+    def _refs(self, pos, count):
+        """Return the *count* object references stored at *pos*."""
+        size = self._ref_size
+        if size in _UINT_FORMATS:
+            return struct.unpack_from(
+                f'>{count}{_UINT_FORMATS[size][1]}', self._buf, pos)
+        return [self._read_ref(self._buf, pos + index * size)
+                for index in range(count)]
+
+    def shared_refs(self):
+        """Return the set of containers referenced from more than one place.
+
+        Only the container headers and their references are read.  Keys
+        are not counted, since containers cannot be dictionary keys.
+        """
+        buf, read_offset = self._buf, self._read_offset
+        seen = bytearray(self.num_objects)
+        repeated = set()
+        try:
+            for ref in range(self.num_objects):
+                offset = read_offset(
+                    buf, self._offset_table + ref * self._offset_size)
+                token = buf[offset]
+                if token & 0xF0 not in _CONTAINER_KINDS:
+                    continue
+                count, pos = self._size(token, offset + 1)
+                if token & 0xF0 == 0xD0:
+                    pos += count * self._ref_size
+                for child in self._refs(pos, count):
+                    if seen[child]:
+                        repeated.add(child)
+                    else:
+                        seen[child] = 1
+            return {ref for ref in repeated
+                    if self.read(ref)[0] != VALUE}
+        except _DECODE_ERRORS:
+            raise _invalid_file()
+
+    def decode(self, ref=None):
+        """Decode object *ref* (default: the root) into Python objects.
+
+        This builds the same objects as :mod:`plistlib`, without importing
+        it: every object is decoded once and then reused wherever it is
+        referenced, so it is the fastest way to read a small plist whole.
+        """
+        read, read_ref, buf = self.read, self._read_ref, self._buf
+        ref_size = self._ref_size
+        ref = self.top_object if ref is None else ref
+        event, value = read(ref)
+        if event == VALUE:
+            return value
+        root = {} if event == START_DICT else []
+        objects = {ref: root}
+        keys = {}
+        # Each frame is [container, container ref, count, refs_pos, index].
+        stack = [[root, ref, value[0], value[1], 0]]
+        active = {ref}
+        while stack:
+            frame = stack[-1]
+            container, ref, count, pos, index = frame
+            if index == count:
+                stack.pop()
+                active.discard(ref)
+                continue
+            frame[4] = index + 1
+            try:
+                if container.__class__ is dict:
+                    key_ref = read_ref(buf, pos + index * ref_size)
+                    ref = read_ref(buf, pos + (count + index) * ref_size)
+                else:
+                    key_ref = None
+                    ref = read_ref(buf, pos + index * ref_size)
+            except _DECODE_ERRORS:
+                raise _invalid_file()
+            if ref in active:
+                raise ValueError("Circular reference detected")
+            if ref in objects:
+                obj = objects[ref]
+            else:
+                event, value = read(ref)
+                if event == VALUE:
+                    obj = value
+                else:
+                    obj = {} if event == START_DICT else []
+                    stack.append([obj, ref, value[0], value[1], 0])
+                    active.add(ref)
+                objects[ref] = obj
+            if key_ref is None:
+                container.append(obj)
+                continue
+            if key_ref in keys:
+                key = keys[key_ref]
+            else:
+                key_event, key = read(key_ref)
+                if key_event != VALUE:
+                    # Containers cannot be dictionary keys.
+                    raise _invalid_file()
+                keys[key_ref] = key
+            container[key] = obj
+        return root
+
+    def iter_events(self, ref=None, shared=frozenset(), prune=None):
+        """Yield the event stream for object *ref* (default: the root).
+
+        Containers in *shared* below *ref* are shared objects (see
+        :mod:`pkg.events`) identified by their reference: the first visit
+        yields their events, and later visits a single ``ref`` event.
+
+        If *prune* is given, objects below *ref* whose key path (relative
+        to *ref*) it returns True for are left out without being read; only
+        the keys of the dictionaries they belong to are decoded.  Nothing
+        is shared then, since the first visit of an object may be pruned.
+        """
+        read, unpack_ref, buf = self.read, self._unpack_ref, self._buf
+        ref_size = self._ref_size
+        ref = self.top_object if ref is None else ref
+        if prune is not None:
+            shared = frozenset()
+        # Each frame is [end event, container ref, count, refs_pos, index].
+        stack = []
+        # Keys or indexes of the open containers below *ref*, when pruning.
+        nodes = []
+        node = None
+        active = set()
+        visited = set()
+        # Decoded dictionary keys by reference: encoders store equal keys
+        # once, so the keys of records repeat.  Cleared when full, to keep
+        # memory bounded.
+        keys = {}
+        while True:
+            event, value = read(ref)
+            if event == VALUE:
+                yield event, value
+            elif ref in active:
+                raise ValueError("Circular reference detected")
+            elif ref in visited:
+                yield REF, ref
+            else:
+                active.add(ref)
+                if prune is not None and stack:
+                    nodes.append(node)
+                if ref in shared and stack:
+                    visited.add(ref)
+                    yield event, ref
+                else:
+                    yield event, None
+                end = END_DICT if event == START_DICT else END_ARRAY
+                stack.append([end, ref, value[0], value[1], 0])
+            while stack:
+                frame = stack[-1]
+                end, container, count, pos, index = frame
+                if index == count:
+                    stack.pop()
+                    active.discard(container)
+                    if nodes:
+                        nodes.pop()
+                    yield end, None
+                    continue
+                frame[4] = index + 1
+                try:
+                    if end == END_DICT:
+                        key_ref = unpack_ref(buf, pos + index * ref_size)[0]
+                        ref = unpack_ref(buf, pos + (count + index) * ref_size)[0]
+                    else:
+                        ref = unpack_ref(buf, pos + index * ref_size)[0]
+                except _DECODE_ERRORS:
+                    raise _invalid_file()
+                if end == END_DICT:
+                    key = keys.get(key_ref, _MISSING)
+                    if key is _MISSING:
+                        key_event, key = read(key_ref)
+                        if key_event != VALUE:
+                            # Containers cannot be dictionary keys.
+                            raise _invalid_file()
+                        if len(keys) >= _KEY_CACHE_SIZE:
+                            keys.clear()
+                        keys[key_ref] = key
+                    node = key
+                else:
+                    node = index
+                if prune is not None and prune(tuple(nodes) + (node,)):
+                    continue
+                if end == END_DICT:
+                    yield KEY, key
+                break
+            else:
+                return
@@ -0,0 +1,242 @@
+"""Persistent on-disk cache of conversion results.
+
+Converted JSON is stored under a key derived from the content of the input
+plist and the conversion options, so identical inputs share one entry no
+matter where they live.  A per-path index records the ``(size, mtime,
+inode)`` signature the input had when its key was computed; while that
+signature is unchanged a lookup costs one ``stat`` and one small read,
+without hashing the input at all.
+
+The cache directory may be shared by concurrent processes: every file is
+written to a temporary name and renamed into place.  Since many
+short-lived processes may share the cache, its total size, index files
+included, is kept in a ``size`` file in the cache directory, which every
+write adds to.  Once the total goes past the size limit, the cache is
+pruned: entries are evicted least recently used first, using each object's
+modification time, which is refreshed on every hit, until the cache is
+``_PRUNE_FRACTION`` of its limit below it.  Index files count as recently
+used as the object they point to, and the ones left pointing at no object
+go first.  Writes racing each other may lose an addition to the total, but
+each prune recounts it.
+"""
+
+import os
+
+from pkg.fileutil import atomic_open
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# Fraction of max_size freed below the limit by each prune, so that
+# prunes are at least that much writing apart.
+_PRUNE_FRACTION = 0.1
+
+# File holding the total size of the cache, in bytes.
+_SIZE_FILE = 'size'
+
+_READ_SIZE = 1024 * 1024
+
+
+class _Tee:
+    """Binary writer duplicating everything written to two streams."""
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def write(self, data):
+        self.second.write(data)
+        return self.first.write(data)
+
+
+class ConversionCache:
+    """Cache of JSON conversions kept in *directory*.
+
+    The ``hits`` and ``misses`` counters record lookups made through this
+    instance.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, kind, key, suffix=''):
+        return os.path.join(self.directory, kind, key[:2], key + suffix)
+
+    def _index_path(self, file_path, options):
+        import hashlib
+
+        name = f'{os.path.abspath(file_path)}\0{options}'
+        key = hashlib.blake2b(name.encode('utf-8', 'surrogateescape'),
+                              digest_size=20).hexdigest()
+        return self._path('index', key)
+
+    def _object_path(self, key):
+        return self._path('objects', key, '.json')
+
+    @staticmethod
+    def _signature(st):
+        return f'{st.st_size} {st.st_mtime_ns} {st.st_ino}'
+
+    @staticmethod
+    def _content_key(file_path, options):
+        import hashlib
+
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(options.encode('utf-8') + b'\0')
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(_READ_SIZE), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def lookup(self, file_path, options=''):
+        """Find the cached JSON for *file_path* converted with *options*.
+
+        Returns ``(path, key)``: *path* names the cached JSON file, or is
+        None on a miss, and *key* is the content key to pass to
+        :meth:`store` after converting.
+        """
+        signature = self._signature(os.stat(file_path))
+        index_path = self._index_path(file_path, options)
+        key = None
+        indexed_size = 0
+        try:
+            with open(index_path, encoding='ascii') as f:
+                indexed = f.read()
+            indexed_size = len(indexed)
+            indexed_signature, _, indexed_key = indexed.rpartition(' ')
+            if indexed_signature == signature:
+                key = indexed_key
+        except (OSError, ValueError):
+            pass
+        if key is None:
+            key = self._content_key(file_path, options)
+            index = f'{signature} {key}'.encode('ascii')
+            self._write(index_path, index)
+            self._grow(len(index) - indexed_size)
+
+        object_path = self._object_path(key)
+        try:
+            # Refresh the modification time: it orders LRU eviction.
+            os.utime(object_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None, key
+        self.hits += 1
+        return object_path, key
+
+    def store(self, key):
+        """Return a context manager to write the JSON for content *key*."""
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        return atomic_open(object_path)
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_open(path) as f:
+            f.write(data)
+
+    def _size_path(self):
+        return os.path.join(self.directory, _SIZE_FILE)
+
+    def _grow(self, size):
+        """Add *size* bytes written to the total, pruning if it is over the limit."""
+        try:
+            with open(self._size_path(), encoding='ascii') as f:
+                total = int(f.read()) + size
+        except (OSError, ValueError):
+            # Not counted yet: prune() counts it.
+            total = None
+        if total is None or total > self.max_size:
+            self.prune()
+        else:
+            self._write(self._size_path(), str(total).encode('ascii'))
+
+    def write(self, file_path, out, convert, options=''):
+        """Write the JSON for *file_path* to binary stream *out*.
+
+        A cached result is copied to *out*.  Otherwise ``convert(stream)``
+        is called to write the JSON, and its output is stored in the cache
+        as it is written.  Returns True on a cache hit.
+        """
+        import shutil
+
+        cached, key = self.lookup(file_path, options)
+        if cached is not None:
+            try:
+                with open(cached, 'rb') as f:
+                    shutil.copyfileobj(f, out, _READ_SIZE)
+                return True
+            except FileNotFoundError:
+                # Evicted by another process since the lookup.
+                self.hits -= 1
+                self.misses += 1
+        with self.store(key) as f:
+            convert(_Tee(out, f))
+            written = f.tell()
+        self._grow(written)
+        return False
+
+    def _entries(self, kind):
+        """Yield ``(name, stat result, path)`` for the files of *kind*."""
+        root = os.path.join(self.directory, kind)
+        try:
+            buckets = sorted(os.listdir(root))
+        except FileNotFoundError:
+            return
+        for bucket in buckets:
+            try:
+                with os.scandir(os.path.join(root, bucket)) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue  # still being written
+                    yield entry.name, entry.stat(), entry.path
+            except OSError:
+                # Removed concurrently by another process.
+                continue
+
+    def prune(self):
+        """Evict least recently used entries once over the size limit.
+
+        Objects are evicted oldest first, each with the index files that
+        point to it, until the cache is ``_PRUNE_FRACTION`` of its limit
+        below the limit.  The total left is recorded for later writes.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        # Per object key: [last use, total size, paths]
+        groups = {}
+        total = 0
+        for name, st, path in self._entries('objects'):
+            key = name[:-len('.json')]
+            groups[key] = [st.st_mtime_ns, st.st_size, [path]]
+            total += st.st_size
+        orphans = []
+        for name, st, path in self._entries('index'):
+            total += st.st_size
+            try:
+                with open(path, encoding='ascii') as f:
+                    key = f.read().rpartition(' ')[2]
+            except (OSError, ValueError):
+                key = None
+            group = groups.get(key)
+            if group is None:
+                orphans.append([st.st_mtime_ns, st.st_size, [path]])
+            else:
+                group[1] += st.st_size
+                group[2].append(path)
+        if total > self.max_size:
+            target = self.max_size * (1 - _PRUNE_FRACTION)
+            # Index files without an object only spare hashing an input.
+            for _, size, paths in sorted(orphans) + sorted(groups.values()):
+                if total <= target:
+                    break
+                for path in paths:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+        self._write(self._size_path(), str(total).encode('ascii'))
@@ -0,0 +1,113 @@
+"""Compressed input and output.
+
+Inputs compressed with gzip, bzip2 or xz are recognized by their magic
+bytes, whatever their name, and decompressed as they are read: an XML plist
+is parsed as it is decompressed, while a binary plist, whose offset table
+comes last, is decompressed into a single buffer first.
+
+Output is compressed with gzip or xz as the JSON writer produces it, so the
+uncompressed JSON is never held in full.  Closing a compressing stream
+writes the end of the compressed data but leaves the underlying stream
+open.
+
+The compression modules are only imported when compressed data is met.
+"""
+
+import contextlib
+
+# Magic bytes of each compression format, by name.
+MAGICS = {
+    'gzip': b'\x1f\x8b',
+    'bz2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+}
+
+# Enough of a header to identify every format.
+HEADER_SIZE = 6
+
+# Formats for compressed output, with their file name suffixes.
+OUTPUT_SUFFIXES = {'gzip': '.gz', 'xz': '.xz'}
+
+# File name suffixes of compressed input.
+INPUT_SUFFIXES = ('.gz', '.bz2', '.xz')
+
+_GZIP_LEVEL = 6
+
+
+def sniff(header):
+    """Return the compression format a header indicates, or None."""
+    for name, magic in MAGICS.items():
+        if header.startswith(magic):
+            # A bzip2 stream goes on with its block size, from 1 to 9.
+            if name == 'bz2' and not header[3:4].isdigit():
+                continue
+            return name
+    return None
+
+
+def open_reader(stream, compression):
+    """Return a binary stream decompressing what it reads from *stream*."""
+    if compression == 'gzip':
+        import gzip
+
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    if compression == 'bz2':
+        import bz2
+
+        return bz2.BZ2File(stream, 'rb')
+    if compression == 'xz':
+        import lzma
+
+        return lzma.LZMAFile(stream, 'rb')
+    raise ValueError(f"unknown compression: {compression!r}")
+
+
+def open_writer(stream, compression):
+    """Return a binary stream compressing what is written to *stream*."""
+    if compression == 'gzip':
+        import gzip
+
+        return gzip.GzipFile(fileobj=stream, mode='wb', compresslevel=_GZIP_LEVEL,
+                             mtime=0)
+    if compression == 'xz':
+        import lzma
+
+        return lzma.LZMAFile(stream, 'wb')
+    raise ValueError(f"unknown compression: {compression!r}")
+
+
+def decompressing(stream):
+    """Return *stream*, decompressed if its header shows it is compressed.
+
+    The header is read with ``peek()``, as buffered readers allow, or by
+    slicing, as memory maps allow, so nothing is consumed from *stream*.
+    Streams that support neither are returned as they are.
+    """
+    peek = getattr(stream, 'peek', None)
+    if peek is not None:
+        header = peek(HEADER_SIZE)
+    elif hasattr(stream, '__getitem__'):
+        header = stream[:HEADER_SIZE]
+    else:
+        return stream
+    compression = sniff(bytes(header[:HEADER_SIZE]))
+    if compression is None:
+        return stream
+    return open_reader(stream, compression)
+
+
+@contextlib.contextmanager
+def compressed(stream, compression):
+    """Yield a stream writing to *stream* compressed with *compression*.
+
+    The compressed data is completed when the block ends.  If *compression*
+    is None, *stream* itself is yielded.
+    """
+    if compression is None:
+        yield stream
+        return
+    writer = open_writer(stream, compression)
+    try:
+        yield writer
+    finally:
+        writer.close()
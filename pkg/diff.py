@@ -0,0 +1,211 @@
+"""Structural differences between plists, found by subtree hashing.
+
+:func:`hash_tree` builds a plist from its event stream, computing a digest
+of every container as it is closed.  Digests depend on content only: the
+order of dictionary entries does not matter, while that of array elements
+does.  :func:`diff` then compares two trees top-down, skipping every pair
+of subtrees with equal digests in constant time, so that the cost of
+comparing two mostly identical plists is dominated by decoding them.
+
+Differences are reported as JSON Patch (RFC 6902) operations that turn the
+old plist into the new one::
+
+    {"op": "replace", "path": "/Settings/Volume", "value": 7}
+    {"op": "add", "path": "/Items/3", "value": {"name": "new"}}
+    {"op": "remove", "path": "/Legacy"}
+
+Arrays are compared element by element after skipping their common prefix
+and suffix, so that an element inserted or removed in the middle of an
+array is reported as one operation.
+"""
+
+import hashlib
+import operator
+
+from pkg.events import (START_DICT, START_ARRAY, END_ARRAY, KEY, VALUE, REF,
+                        iter_object_events)
+
+DIGEST_SIZE = 16
+
+_first = operator.itemgetter(0)
+
+
+class Node:
+    """A container of a hashed plist tree.
+
+    *children* is a dict or list of the contained objects, each either a
+    plain value or a :class:`Node`.  The ``repr()`` of a node is its digest,
+    which cannot be mistaken for the ``repr()`` of a plain value.
+    """
+
+    __slots__ = ('children', 'digest')
+
+    def __init__(self, children, digest):
+        self.children = children
+        self.digest = digest
+
+    def __repr__(self):
+        return self.digest
+
+
+def digest(obj):
+    """Return the digest of a :class:`Node` or plain value, as a string.
+
+    Plain values are identified by their ``repr()``, which keeps apart
+    values that compare equal across types, such as 1, 1.0 and True.
+    """
+    if isinstance(obj, Node):
+        return obj.digest
+    return repr(obj)
+
+
+def _close(children):
+    """Return the :class:`Node` for the finished container *children*."""
+    # The repr() of the children, whose nodes are represented by their
+    # digests, is built by the interpreter without a call per child.
+    if isinstance(children, dict):
+        try:
+            items = sorted(children.items(), key=_first)
+        except TypeError:
+            items = sorted(children.items(), key=lambda item: repr(item[0]))
+        text = 'd' + repr(items)
+    else:
+        text = 'a' + repr(children)
+    hasher = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'),
+                             digest_size=DIGEST_SIZE)
+    return Node(children, f'<{hasher.hexdigest()}>')
+
+
+def hash_tree(events):
+    """Build the hashed tree of the plist described by *events*.
+
+    Returns the root, a :class:`Node` or a plain value.  Shared containers
+    (see :mod:`pkg.events`) are built and hashed once.
+    """
+    stack = []
+    shared = {}
+    key = None
+    root = None
+    # The innermost open container, kept in locals for speed.
+    children = None
+    for event, value in events:
+        if event == VALUE:
+            obj = value
+        elif event == KEY:
+            key = value
+            continue
+        elif event == START_DICT or event == START_ARRAY:
+            stack.append((children, key, value))
+            children = {} if event == START_DICT else []
+            continue
+        elif event == REF:
+            obj = shared[value]
+        else:
+            obj = _close(children)
+            children, key, identifier = stack.pop()
+            if identifier is not None:
+                shared[identifier] = obj
+        if children is None:
+            root = obj
+        elif type(children) is dict:
+            children[key] = obj
+        else:
+            children.append(obj)
+    return root
+
+
+def plain(obj, _memo=None):
+    """Return the plain plist object for a :class:`Node` or plain value."""
+    if not isinstance(obj, Node):
+        return obj
+    memo = {} if _memo is None else _memo
+    stack = [obj]
+    while stack:
+        node = stack[-1]
+        if id(node) in memo:
+            stack.pop()
+            continue
+        children = node.children
+        values = children.values() if isinstance(children, dict) else children
+        missing = [value for value in values
+                   if isinstance(value, Node) and id(value) not in memo]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        if isinstance(children, dict):
+            memo[id(node)] = {key: plain(value, memo)
+                              for key, value in children.items()}
+        else:
+            memo[id(node)] = [plain(value, memo) for value in children]
+    return memo[id(obj)]
+
+
+def json_pointer(path):
+    """Return the JSON Pointer (RFC 6901) for key path *path*."""
+    return ''.join('/' + str(node).replace('~', '~0').replace('/', '~1')
+                   for node in path)
+
+
+def _compare(path, old, new):
+    """Return the operations and pending comparisons for two objects."""
+    if isinstance(old, Node) and isinstance(new, Node) \
+            and type(old.children) is type(new.children):
+        old, new = old.children, new.children
+        if isinstance(old, dict):
+            steps = [('remove', path + (key,)) for key in old if key not in new]
+            for key, value in new.items():
+                if key not in old:
+                    steps.append(('add', path + (key,), value))
+                else:
+                    steps.append((path + (key,), old[key], value))
+            return steps
+        start = 0
+        end = min(len(old), len(new))
+        while start < end and digest(old[start]) == digest(new[start]):
+            start += 1
+        old_end, new_end = len(old), len(new)
+        while (old_end > start and new_end > start
+               and digest(old[old_end - 1]) == digest(new[new_end - 1])):
+            old_end -= 1
+            new_end -= 1
+        common = min(old_end, new_end)
+        steps = [(path + (index,), old[index], new[index])
+                 for index in range(start, common)]
+        steps.extend(('remove', path + (index,))
+                     for index in reversed(range(common, old_end)))
+        steps.extend(('add', path + (index,), new[index])
+                     for index in range(common, new_end))
+        return steps
+    return [('replace', path, new)]
+
+
+def diff(old, new):
+    """Yield the JSON Patch operations that turn tree *old* into *new*.
+
+    *old* and *new* are roots returned by :func:`hash_tree`.  Operations
+    are dicts, holding their value as a plain plist object, and are
+    yielded in document order.
+    """
+    memo = {}
+    pending = [((), old, new)]
+    while pending:
+        step = pending.pop()
+        if isinstance(step[0], str):
+            op = {'op': step[0], 'path': json_pointer(step[1])}
+            if len(step) > 2:
+                op['value'] = plain(step[2], memo)
+            yield op
+            continue
+        path, old, new = step
+        if old is new or digest(old) == digest(new):
+            continue
+        pending.extend(reversed(_compare(path, old, new)))
+
+
+def iter_patch_events(old, new):
+    """Yield the event stream of the JSON Patch array from :func:`diff`."""
+    yield START_ARRAY, None
+    for op in diff(old, new):
+        yield from iter_object_events(op)
+    yield END_ARRAY, None
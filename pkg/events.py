@@ -0,0 +1,236 @@
+"""Plist event streams shared by the decoders and the JSON writer.
+
+A plist is described as a flat sequence of ``(event, value)`` pairs, in the
+same spirit as a SAX parser.  Containers open and close with ``start_*`` and
+``end_*`` events (whose value is normally ``None``), dictionary entries are
+announced by a ``key`` event, and every other object is a single ``value``
+event carrying the decoded Python value.
+
+A container that is referenced more than once may be shared: its start
+event then carries an identifier instead of ``None``, and every later
+reference to it is a single ``ref`` event carrying that identifier, so that
+it is decoded and encoded only once.
+
+Positions within a plist are identified by key paths: tuples of dictionary
+keys and array indexes leading from the root to an object.
+"""
+
+import json
+import re
+
+START_DICT = 'start_dict'
+END_DICT = 'end_dict'
+START_ARRAY = 'start_array'
+END_ARRAY = 'end_array'
+KEY = 'key'
+VALUE = 'value'
+REF = 'ref'
+
+# Pattern component of ``[*]``, which matches any array index.  None is
+# never a key or an index, and survives JSON and pickling.
+ANY_INDEX = None
+
+_done = object()
+
+
+def iter_object_events(obj, prune=None):
+    """Yield the event stream describing an already-decoded plist object.
+
+    If *prune* is given, objects below the root whose key path it returns
+    True for are left out of the stream (see :func:`path_pruner`).
+    """
+    stack = []
+    # Keys or indexes of the open containers below the root, when pruning.
+    nodes = []
+    node = None
+    active = set()
+    while True:
+        if isinstance(obj, (dict, list, tuple)):
+            if id(obj) in active:
+                raise ValueError("Circular reference detected")
+            active.add(id(obj))
+            if prune is not None and stack:
+                nodes.append(node)
+            if isinstance(obj, dict):
+                yield START_DICT, None
+                stack.append((END_DICT, obj, iter(obj.items())))
+            else:
+                yield START_ARRAY, None
+                stack.append((END_ARRAY, obj,
+                              iter(obj) if prune is None else enumerate(obj)))
+        else:
+            yield VALUE, obj
+        while stack:
+            end, container, items = stack[-1]
+            item = next(items, _done)
+            if item is _done:
+                stack.pop()
+                active.discard(id(container))
+                if nodes:
+                    nodes.pop()
+                yield end, None
+                continue
+            if prune is not None:
+                node, obj = item
+                if prune(tuple(nodes) + (node,)):
+                    continue
+                if end is END_DICT:
+                    yield KEY, node
+            elif end is END_DICT:
+                yield KEY, item[0]
+                obj = item[1]
+            else:
+                obj = item
+            break
+        else:
+            return
+
+
+_PATH_TOKEN = re.compile(r'''
+    (?P<dot>\.)?
+    (?:
+        (?P<name>[^.\[\]"]+)
+      | \[(?P<index>\d+|\*)\]
+      | \[(?P<quoted>"(?:[^"\\]|\\.)*")\]
+    )''', re.VERBOSE)
+
+
+def parse_path(text, _pattern=False):
+    """Parse a key path such as ``a.b[3].c`` into ``('a', 'b', 3, 'c')``.
+
+    Names are separated by dots, array indexes are written in brackets, and
+    keys containing special characters can be given as bracketed JSON
+    strings (``a["b.c"]``).  A leading dot is optional, and ``.`` or the
+    empty string select the root object.
+    """
+    components = []
+    pos = 0
+    if text == '.':
+        return ()
+    while pos < len(text):
+        match = _PATH_TOKEN.match(text, pos)
+        if match is None or (match.group('name') is not None
+                             and components and not match.group('dot')):
+            raise ValueError(f"invalid key path: '{text}'")
+        if match.group('name') is not None:
+            components.append(match.group('name'))
+        elif match.group('index') == '*':
+            if not _pattern:
+                raise ValueError(f"invalid key path: '{text}'")
+            components.append(ANY_INDEX)
+        elif match.group('index') is not None:
+            components.append(int(match.group('index')))
+        else:
+            components.append(json.loads(match.group('quoted')))
+        pos = match.end()
+    return tuple(components)
+
+
+def parse_pattern(text):
+    """Parse a key-path glob such as ``a.*.b[*]`` into its components.
+
+    The syntax is that of :func:`parse_path`.  Keys may hold the shell-style
+    wildcards of :mod:`fnmatch`, which also match array indexes, and
+    ``[*]``, parsed to :data:`ANY_INDEX`, matches any array index but no
+    dictionary key.
+    """
+    return parse_path(text, _pattern=True)
+
+
+def _component_matcher(component):
+    if component is ANY_INDEX:
+        return lambda node: isinstance(node, int)
+    if isinstance(component, int):
+        return lambda node: node == component and isinstance(node, int)
+    if not any(char in component for char in '*?['):
+        return lambda node: node == component
+    import fnmatch
+
+    match = re.compile(fnmatch.translate(component)).match
+    return lambda node: match(str(node)) is not None
+
+
+def _matches(matchers, node):
+    """Return True if the leading components of *node* match *matchers*."""
+    for match, component in zip(matchers, node):
+        if not match(component):
+            return False
+    return True
+
+
+def key_pruner(includes=(), excludes=()):
+    """Return a predicate selecting the nodes to leave out for key-path globs.
+
+    *includes* and *excludes* are patterns from :func:`parse_pattern`.  A
+    node is kept if it lies on the way to or inside an object matching one
+    of *includes* (any node, if there are none), and is neither an object
+    matching one of *excludes* nor inside one.  Only key paths are
+    considered, so a value at a position on the way to a match is kept
+    too.  Returns None if there are no patterns.
+    """
+    if not includes and not excludes:
+        return None
+    includes = [[_component_matcher(c) for c in pattern] for pattern in includes]
+    excludes = [[_component_matcher(c) for c in pattern] for pattern in excludes]
+
+    def prune(node):
+        if includes and not any(_matches(pattern, node) for pattern in includes):
+            return True
+        return any(len(pattern) <= len(node) and _matches(pattern, node)
+                   for pattern in excludes)
+    return prune
+
+
+def path_pruner(path, skip=None):
+    """Return a predicate selecting the nodes a decoder may skip for *path*.
+
+    Only the ancestors of the object at *path* and the object's own subtree
+    are needed; the predicate is True for every other node path.  Within
+    the object, it is also True for the nodes that the predicate *skip*,
+    if given, returns True for, called with key paths relative to the
+    object.
+    """
+    def prune(node):
+        if node[:len(path)] != path[:len(node)]:
+            return True
+        return skip is not None and len(node) > len(path) and skip(node[len(path):])
+    return prune
+
+
+def select_path(events, path):
+    """Yield the events of the object at *path* within a pruned event stream.
+
+    *events* must come from a decoder pruned with ``path_pruner(path)``, so
+    that every object in it lies on the path or inside the selected object.
+    The stream is consumed only until the object ends, or until it is known
+    to be missing, in which case a single null value is yielded, as ``jq``
+    does.
+    """
+    # Number of open containers; the object sought is the first one found
+    # below as many containers as the path has components.
+    depth = 0
+    events = iter(events)
+    for event, value in events:
+        if event == KEY:
+            continue
+        if event == END_DICT or event == END_ARRAY or (
+                event == VALUE and depth < len(path)):
+            # A container on the path ended, or a scalar sits on the path,
+            # before the object was found.
+            break
+        if depth < len(path):
+            depth += 1
+            continue
+        yield event, value
+        if event == VALUE:
+            return
+        depth += 1
+        for event, value in events:
+            yield event, value
+            if event == START_DICT or event == START_ARRAY:
+                depth += 1
+            elif event == END_DICT or event == END_ARRAY:
+                depth -= 1
+                if depth == len(path):
+                    return
+    yield VALUE, None
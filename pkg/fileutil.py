@@ -0,0 +1,26 @@
+"""Filesystem helpers."""
+
+import contextlib
+import os
+
+
+@contextlib.contextmanager
+def atomic_open(path):
+    """Open *path* for binary writing, replacing it atomically on success.
+
+    Data is written to a temporary file in the same directory, which is
+    renamed over *path* only if the block completes without an exception,
+    so readers never see a partially written file.
+    """
+    import tempfile
+
+    directory, name = os.path.split(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory or '.', prefix=f'.{name}.',
+                                     suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
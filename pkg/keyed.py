@@ -0,0 +1,211 @@
+"""Resolution of the object graphs stored by NSKeyedArchiver.
+
+A keyed archive is a plist dictionary whose ``$objects`` array holds every
+archived object, with the references between them written as UIDs, which
+are indexes into ``$objects`` (in XML, dicts with a single ``CF$UID``
+integer).  ``$top`` maps the top-level keys, usually just ``root``, to
+their objects.  :func:`iter_events` describes ``$top`` with every UID
+replaced by the object it refers to, and the Foundation collections and
+values turned into plain plist objects:
+
+- ``NSDictionary``: a dict of its ``NS.keys`` and ``NS.objects``
+- ``NSArray``, ``NSSet`` and ``NSOrderedSet``: an array of its ``NS.objects``
+- ``NSString``: its ``NS.string``
+- ``NSData``: its ``NS.data``
+- ``NSDate``: the date of its ``NS.time``
+- ``$null``: null
+
+Any other object becomes a dict of its archived fields, with its class
+name under ``$class``.  Containers referenced more than once are shared
+objects (see :mod:`pkg.events`) identified by their index in ``$objects``,
+so each is encoded only once.  Object graphs may be cyclic, as with parent
+and child objects that refer to each other: a UID referring back to an
+object that contains it is written as a reference marker,
+``{"$ref": <index>}``, instead.
+"""
+
+import collections
+import datetime
+import plistlib
+
+from pkg.events import (START_DICT, END_DICT, START_ARRAY, END_ARRAY, KEY,
+                        VALUE, REF)
+
+ARCHIVER = 'NSKeyedArchiver'
+
+_NULL = '$null'
+
+_EPOCH = datetime.datetime(2001, 1, 1)
+
+_done = object()
+
+# Key of the marker written for a UID referring back to an enclosing object.
+REF_KEY = '$ref'
+
+
+def is_keyed_archive(obj):
+    """Return True if the decoded plist *obj* is a keyed archive."""
+    return (isinstance(obj, dict) and obj.get('$archiver') == ARCHIVER
+            and isinstance(obj.get('$objects'), list)
+            and isinstance(obj.get('$top'), dict))
+
+
+def is_keyed_binary(plist):
+    """Return True if a :class:`~pkg.bplist.BinaryPlist` is a keyed archive.
+
+    Only the ``$archiver`` entry of the root is decoded.
+    """
+    ref = plist.find(('$archiver',))
+    return ref is not None and plist.read(ref) == (VALUE, ARCHIVER)
+
+
+def _uid(obj):
+    """Return the index that *obj* refers to if it is a UID, else None."""
+    if isinstance(obj, plistlib.UID):
+        return obj.data
+    if isinstance(obj, dict) and len(obj) == 1:
+        index = obj.get('CF$UID')
+        if isinstance(index, int):
+            return index
+    return None
+
+
+def _deref(objects, index):
+    if not 0 <= index < len(objects):
+        raise ValueError(f"Invalid keyed archive: UID {index} out of range")
+    obj = objects[index]
+    return None if obj == _NULL else obj
+
+
+def _scalar(objects, obj):
+    """Return the scalar that *obj*, possibly a UID, stands for."""
+    index = _uid(obj)
+    if index is not None:
+        obj = _deref(objects, index)
+    if isinstance(obj, dict) and 'NS.string' in obj:
+        obj = _scalar(objects, obj['NS.string'])
+    if isinstance(obj, (dict, list)):
+        raise ValueError("Invalid keyed archive: container used as a key")
+    return obj
+
+
+def _class_name(objects, index):
+    cls = _deref(objects, index)
+    if not isinstance(cls, dict) or '$classname' not in cls:
+        raise ValueError("Invalid keyed archive: bad class reference")
+    return cls['$classname']
+
+
+def _expand(objects, obj):
+    """Return ``(event, items)`` for an archived object.
+
+    *items* iterates over the ``(key, value)`` pairs of a dict or the
+    elements of an array, and is the value itself for a scalar.
+    """
+    if isinstance(obj, list):
+        return START_ARRAY, iter(obj)
+    if not isinstance(obj, dict):
+        return VALUE, obj
+    cls = _uid(obj.get('$class'))
+    if cls is None:
+        return START_DICT, iter(obj.items())
+    if 'NS.objects' in obj:
+        if 'NS.keys' in obj:
+            return START_DICT, zip(obj['NS.keys'], obj['NS.objects'])
+        return START_ARRAY, iter(obj['NS.objects'])
+    if 'NS.string' in obj:
+        return VALUE, _scalar(objects, obj['NS.string'])
+    if 'NS.data' in obj:
+        return VALUE, _scalar(objects, obj['NS.data'])
+    if 'NS.time' in obj:
+        seconds = _scalar(objects, obj['NS.time'])
+        return VALUE, _EPOCH + datetime.timedelta(seconds=seconds)
+    fields = [('$class', _class_name(objects, cls))]
+    fields.extend(item for item in obj.items() if item[0] != '$class')
+    return START_DICT, iter(fields)
+
+
+def _shared_indexes(archive):
+    """Return the indexes of the objects referenced by more than one UID."""
+    counts = collections.Counter()
+    pending = [archive['$top'], archive['$objects']]
+    seen = set()
+    while pending:
+        obj = pending.pop()
+        index = _uid(obj)
+        if index is not None:
+            counts[index] += 1
+        elif isinstance(obj, (dict, list)) and id(obj) not in seen:
+            seen.add(id(obj))
+            pending.extend(obj.values() if isinstance(obj, dict) else obj)
+    return {index for index, count in counts.items() if count > 1}
+
+
+def iter_events(archive, prune=None):
+    """Yield the event stream for the resolved ``$top`` of a keyed archive.
+
+    If *prune* is given, objects below the root whose key path it returns
+    True for are left out, as by :func:`pkg.events.iter_object_events`,
+    and no objects are shared, since their first occurrence may be pruned.
+    A UID referring to an object that contains it yields the events of a
+    ``{"$ref": <index>}`` marker.  Raises ValueError if a UID is invalid.
+    """
+    objects = archive['$objects']
+    shared = _shared_indexes(archive) if prune is None else ()
+    stack = []
+    # Keys or indexes of the open containers below the root, when pruning.
+    nodes = []
+    node = None
+    active = set()
+    visited = set()
+    obj = archive['$top']
+    while True:
+        index = _uid(obj)
+        if index is not None:
+            obj = _deref(objects, index)
+        event, items = _expand(objects, obj)
+        identity = (id(obj),) if index is None else index
+        if event == VALUE:
+            yield event, items
+        elif identity in active:
+            if index is None:
+                raise ValueError("Circular reference detected")
+            yield START_DICT, None
+            yield KEY, REF_KEY
+            yield VALUE, index
+            yield END_DICT, None
+        elif index in visited:
+            yield REF, index
+        else:
+            active.add(identity)
+            if prune is not None and stack:
+                nodes.append(node)
+            if index in shared and stack:
+                visited.add(index)
+                yield event, index
+            else:
+                yield event, None
+            end = END_DICT if event == START_DICT else END_ARRAY
+            stack.append((end, identity, enumerate(items)))
+        while stack:
+            end, identity, items = stack[-1]
+            item = next(items, _done)
+            if item is _done:
+                stack.pop()
+                active.discard(identity)
+                if nodes:
+                    nodes.pop()
+                yield end, None
+                continue
+            if end == END_DICT:
+                key, obj = item[1]
+                node = _scalar(objects, key)
+            else:
+                node, obj = item
+            if prune is not None and prune(tuple(nodes) + (node,)):
+                continue
+            if end == END_DICT:
+                yield KEY, node
+            break
+        else:
+            return
@@ -0,0 +1,177 @@
+"""Conversion server listening on a Unix domain socket, and its client.
+
+Starting Python and importing the converter costs far more than converting
+a typical plist.  A :class:`ConversionServer` stays running and hands each
+request to a pool of worker processes, so a client only pays for a socket
+round trip per conversion.
+
+Every connection carries one request: a JSON header line, followed by the
+raw plist bytes when the header does not name a file, up to the end of the
+client's half of the connection.  The reply is a JSON header line,
+``{"status": 0}`` or ``{"status": 1, "error": message}``, followed by the
+converted output.
+"""
+
+import concurrent.futures
+import errno
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import threading
+
+# Longest request header accepted, in bytes.
+MAX_HEADER_SIZE = 64 * 1024
+
+_COPY_SIZE = 64 * 1024
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads one request, converts it and writes the reply."""
+
+    def handle(self):
+        try:
+            line = self.rfile.readline(MAX_HEADER_SIZE)
+            if not line:
+                return  # connection probe, see ConversionServer
+            if not line.endswith(b'\n'):
+                raise ValueError("request header too long or incomplete")
+            header = json.loads(line)
+            if not isinstance(header, dict):
+                raise ValueError("request header is not an object")
+        except ValueError as e:
+            self.reply(None, f"Malformed request: {e}")
+            return
+        body = None if 'path' in header else self.rfile.read()
+        try:
+            output, error = self.server.convert(header, body)
+        except Exception as e:
+            output, error = None, str(e)
+        self.reply(output, error)
+
+    def reply(self, output, error):
+        try:
+            if error is None:
+                self.wfile.write(b'{"status": 0}\n')
+                self.wfile.write(output)
+            else:
+                self.wfile.write(json.dumps({"status": 1, "error": error})
+                                 .encode('ascii') + b'\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away
+
+
+class ConversionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Server answering conversion requests on the Unix socket *socket_path*.
+
+    ``handler(header, body)`` performs a conversion and returns ``(output,
+    error)``: the converted bytes and None, or None and an error message.
+    It runs in a pool of *jobs* worker processes, or in the thread serving
+    the connection with a single job, so it must be picklable.  The socket
+    is only accessible to the current user.  A socket file left behind by a
+    server that is no longer running is replaced; if a server is still
+    listening, OSError with ``errno.EADDRINUSE`` is raised.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, handler, jobs=None):
+        probe = connect(socket_path)
+        if probe is not None:
+            probe.close()
+            raise OSError(errno.EADDRINUSE, "Server already running",
+                          socket_path)
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        self.handler = handler
+        self.executor = None
+        if jobs != 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(jobs)
+            # Start the workers now, before any request thread exists:
+            # forking a multithreaded process is unsafe.
+            self.executor.submit(int).result()
+        umask = os.umask(0o077)
+        try:
+            super().__init__(socket_path, _RequestHandler)
+        except Exception:
+            self.shutdown_executor()
+            raise
+        finally:
+            os.umask(umask)
+
+    def convert(self, header, body):
+        """Run the handler for one request and return its result."""
+        if self.executor is None:
+            return self.handler(header, body)
+        return self.executor.submit(self.handler, header, body).result()
+
+    def shutdown_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except FileNotFoundError:
+            pass
+        self.shutdown_executor()
+
+
+def serve(socket_path, handler, jobs=None):
+    """Serve conversion requests on *socket_path* until interrupted.
+
+    SIGTERM stops the server as cleanly as SIGINT does, removing the socket.
+    """
+    with ConversionServer(socket_path, handler, jobs) as server:
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def connect(socket_path):
+    """Return a socket connected to the server at *socket_path*.
+
+    Returns None if no server is listening there.
+    """
+    if not socket_path or not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError, NotADirectoryError):
+        sock.close()
+        return None
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def request(sock, header, out, body=None):
+    """Send a request over connected socket *sock* and copy the output to *out*.
+
+    *body* holds the raw plist when *header* names no file.  Returns None
+    on success and the server's error message otherwise.  The socket is
+    closed.
+    """
+    with sock, sock.makefile('rb') as reply:
+        sock.sendall(json.dumps(header).encode('utf-8') + b'\n')
+        if body is not None:
+            sock.sendall(body)
+        sock.shutdown(socket.SHUT_WR)
+        status = json.loads(reply.readline() or b'null')
+        if not isinstance(status, dict):
+            return "Malformed reply from server"
+        if status.get('status') != 0:
+            return status.get('error', "Conversion failed")
+        shutil.copyfileobj(reply, out, _COPY_SIZE)
+    return None
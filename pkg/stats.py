@@ -0,0 +1,270 @@
+"""Statistics about conversions, broken down by phase.
+
+A :class:`Stats` object passed to the conversion functions records where
+the time goes.  Conversions are streamed, so the phases interleave: each
+moment is charged to the innermost phase running.
+
+- ``read``: reading input from files and pipes.  Memory-mapped input is
+  read by page faults while it is parsed, so it counts as ``parse``.
+- ``parse``: decoding the plist into events.
+- ``serialize``: encoding events as JSON.
+- ``write``: writing the output.
+- ``cache``: looking up, hashing and storing conversions in the conversion
+  cache.  Copying a cached conversion to the output counts as ``write``.
+
+Parsing is timed over batches of events, to keep the overhead low.  The
+little time spent outside every phase, setting up a conversion, only counts
+toward the ``total``.
+
+The peak memory is that of the process, since it started: a file converted
+in a worker process of a batch reports the peak of the worker so far, which
+may have been reached converting an earlier file.
+"""
+
+import collections
+import datetime
+import itertools
+import plistlib
+import sys
+import time
+
+from pkg.events import START_DICT, END_DICT, START_ARRAY, END_ARRAY, KEY, VALUE
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+PHASES = ('read', 'parse', 'serialize', 'write', 'cache')
+
+# Events decoded per timed parsing step.
+BATCH_SIZE = 1024
+
+_TYPE_NAMES = {
+    START_DICT: 'dict',
+    START_ARRAY: 'array',
+    KEY: 'key',
+    str: 'string',
+    int: 'integer',
+    float: 'real',
+    bool: 'boolean',
+    datetime.datetime: 'date',
+    bytes: 'data',
+    bytearray: 'data',
+    plistlib.UID: 'uid',
+    type(None): 'null',
+}
+
+
+def peak_memory():
+    """Return the peak memory use of this process in bytes, or None.
+
+    The peak resident set size is used where available, and otherwise the
+    peak traced by :mod:`tracemalloc`, if it is tracing.
+    """
+    if resource is not None:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return rss if sys.platform == 'darwin' else rss * 1024
+    if tracemalloc is not None and tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1]
+    return None
+
+
+def trace_memory():
+    """Start tracing memory allocations if the peak RSS is not available."""
+    if resource is None and tracemalloc is not None:
+        tracemalloc.start()
+
+
+class _Reader:
+    """Binary input stream wrapper timing and counting what is read."""
+
+    def __init__(self, stream, stats):
+        self.stream = stream
+        self.stats = stats
+
+    def _read(self, method, arg):
+        stats = self.stats
+        stats.enter('read')
+        try:
+            data = method(arg)
+        finally:
+            stats.leave()
+        stats.bytes_in += data if isinstance(data, int) else len(data)
+        return data
+
+    def read(self, size=-1):
+        return self._read(self.stream.read, size)
+
+    def read1(self, size=-1):
+        return self._read(getattr(self.stream, 'read1', self.stream.read), size)
+
+    def readinto(self, buf):
+        return self._read(self.stream.readinto, buf)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class _Writer:
+    """Output stream wrapper timing and counting what is written."""
+
+    def __init__(self, stream, stats):
+        self.stream = stream
+        self.stats = stats
+
+    def write(self, data):
+        stats = self.stats
+        stats.enter('write')
+        try:
+            count = self.stream.write(data)
+        finally:
+            stats.leave()
+        stats.bytes_out += len(data)
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Stats:
+    """Wall and CPU time per phase, byte and object counts of conversions.
+
+    Results from other processes can be merged in with :meth:`add`.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.wall = dict.fromkeys(PHASES + ('total',), 0.0)
+        self.cpu = dict.fromkeys(PHASES + ('total',), 0.0)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.objects = collections.Counter()
+        self.default_calls = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.peak_memory = None
+        self._phases = []
+        self._wall = self._cpu = 0.0
+        self._start = None
+
+    def _charge(self):
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self._phases:
+            phase = self._phases[-1]
+            self.wall[phase] += wall - self._wall
+            self.cpu[phase] += cpu - self._cpu
+        self._wall, self._cpu = wall, cpu
+
+    def enter(self, phase):
+        """Start charging time to *phase* until the matching :meth:`leave`."""
+        self._charge()
+        self._phases.append(phase)
+
+    def leave(self):
+        """Go back to charging the phase interrupted by :meth:`enter`."""
+        self._charge()
+        self._phases.pop()
+
+    def start(self):
+        """Start timing the conversion of one file."""
+        self.files += 1
+        self._start = time.perf_counter(), time.process_time()
+
+    def stop(self):
+        """Finish timing the conversion started by :meth:`start`."""
+        wall, cpu = self._start
+        self.wall['total'] += time.perf_counter() - wall
+        self.cpu['total'] += time.process_time() - cpu
+
+    def parsing(self, events):
+        """Yield *events*, timing their production and counting objects."""
+        events = iter(events)
+        objects = self.objects
+        while True:
+            self.enter('parse')
+            try:
+                batch = list(itertools.islice(events, BATCH_SIZE))
+            finally:
+                self.leave()
+            if not batch:
+                return
+            for event, value in batch:
+                objects[type(value) if event == VALUE else event] += 1
+            yield from batch
+
+    def reader(self, stream):
+        """Wrap binary input *stream* so that reading it is timed and counted."""
+        if isinstance(stream, _Reader) and stream.stats is self:
+            return stream
+        return _Reader(stream, self)
+
+    def writer(self, stream):
+        """Wrap output *stream* so that writing to it is timed and counted."""
+        if isinstance(stream, _Writer) and stream.stats is self:
+            return stream
+        return _Writer(stream, self)
+
+    def counting(self, default):
+        """Wrap a JSON *default* function so that its calls are counted."""
+        def counted(obj):
+            self.default_calls += 1
+            return default(obj)
+        return counted
+
+    def as_dict(self):
+        """Return the statistics as a JSON-serializable dict.
+
+        ``peak_memory`` is the peak of this process so far (see
+        :func:`peak_memory`), or that of a merged-in result if larger.
+        """
+        objects = collections.Counter()
+        for kind, count in self.objects.items():
+            if kind == END_DICT or kind == END_ARRAY:
+                continue
+            if kind in _TYPE_NAMES:
+                objects[_TYPE_NAMES[kind]] += count
+            elif isinstance(kind, type):
+                objects[kind.__name__] += count
+            else:
+                objects[kind] += count
+        memory = peak_memory()
+        if self.peak_memory is not None:
+            memory = max(memory or 0, self.peak_memory)
+        return {
+            "files": self.files,
+            "wall_seconds": dict(self.wall),
+            "cpu_seconds": dict(self.cpu),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "objects": dict(sorted(objects.items())),
+            "default_calls": self.default_calls,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "peak_memory": memory,
+        }
+
+    def add(self, other):
+        """Merge in statistics returned by :meth:`as_dict`, e.g. from a worker.
+
+        Times and counts are summed, and the peak memory is the largest.
+        """
+        self.files += other["files"]
+        for phase, seconds in other["wall_seconds"].items():
+            self.wall[phase] += seconds
+        for phase, seconds in other["cpu_seconds"].items():
+            self.cpu[phase] += seconds
+        self.bytes_in += other["bytes_in"]
+        self.bytes_out += other["bytes_out"]
+        self.objects.update(other["objects"])
+        self.default_calls += other["default_calls"]
+        self.cache_hits += other["cache_hits"]
+        self.cache_misses += other["cache_misses"]
+        if other["peak_memory"] is not None:
+            self.peak_memory = max(self.peak_memory or 0, other["peak_memory"])
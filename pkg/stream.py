@@ -0,0 +1,186 @@
+"""Splitting a stream that carries many plists into its documents.
+
+Three framings are supported:
+
+- ``nul``: documents are separated by NUL bytes.  Binary plists contain
+  NUL bytes, so this is only suitable for XML plists.
+- ``length``: each document is preceded by its size in bytes, as a 4-byte
+  big-endian unsigned integer.
+- ``auto``: documents are simply concatenated.  An XML plist ends with its
+  ``</plist>`` tag, and a binary plist where its trailer describes an
+  offset table ending right before it: at the end of the input read so
+  far, or where the next document starts.  Whitespace and NUL bytes
+  between documents are ignored.
+
+Input is read as it arrives into a single buffer that is reused for every
+document, and each document is yielded as soon as it is complete.
+"""
+
+import struct
+
+from pkg.bplist import MAGIC, is_complete
+
+FRAMINGS = ('auto', 'nul', 'length')
+
+CHUNK_SIZE = 64 * 1024
+
+_LENGTH = struct.Struct('>I')
+
+_XML_END = b'</plist>'
+
+# Byte sequences that can start the document following a binary plist.
+_STARTS = (MAGIC, b'<?xml', b'<!DOCTYPE', b'<plist')
+
+_SEPARATORS = frozenset(b' \t\r\n\0')
+
+
+class _Buffer:
+    """Input read so far from a binary stream, and not yet consumed."""
+
+    def __init__(self, stream, chunk_size):
+        self.data = bytearray()
+        self._read = getattr(stream, 'read1', stream.read)
+        self._chunk_size = chunk_size
+
+    def fill(self):
+        """Read more input, returning False at the end of the stream."""
+        chunk = self._read(self._chunk_size)
+        self.data += chunk
+        return bool(chunk)
+
+    def need(self, size):
+        """Read until *size* bytes are buffered, or the stream ends."""
+        while len(self.data) < size:
+            if not self.fill():
+                return False
+        return True
+
+    def take(self, size, skip=0):
+        """Remove and return the first *size* bytes, and *skip* more."""
+        document = bytes(self.data[:size])
+        del self.data[:size + skip]
+        return document
+
+    def skip_separators(self):
+        """Drop separators at the start, returning False at the end of input."""
+        data = self.data
+        while True:
+            count = 0
+            while count < len(data) and data[count] in _SEPARATORS:
+                count += 1
+            del data[:count]
+            if data:
+                return True
+            if not self.fill():
+                return False
+
+
+def _iter_nul(buf):
+    data = buf.data
+    scanned = 0
+    while True:
+        end = data.find(b'\0', scanned)
+        if end >= 0:
+            yield buf.take(end, 1)
+            scanned = 0
+        else:
+            scanned = len(data)
+            if not buf.fill():
+                if data:
+                    yield buf.take(len(data))
+                return
+
+
+def _iter_length(buf):
+    data = buf.data
+    while True:
+        if not buf.need(_LENGTH.size):
+            if data:
+                raise ValueError("Truncated length prefix at end of stream")
+            return
+        size = _LENGTH.unpack_from(data)[0]
+        if not buf.need(_LENGTH.size + size):
+            raise ValueError("Truncated document at end of stream")
+        del data[:_LENGTH.size]
+        yield buf.take(size)
+
+
+def _complete_before(data, pos):
+    """Return where a binary plist at the start of *data* ends before *pos*.
+
+    The plist may be followed by separators; returns None if it does not
+    end there.
+    """
+    while True:
+        if is_complete(data, 0, pos):
+            return pos
+        if not pos or data[pos - 1] not in _SEPARATORS:
+            return None
+        pos -= 1
+
+
+def _find_all(data, markers, start):
+    """Yield every position of each of *markers* in *data* from *start* on."""
+    for marker in markers:
+        pos = data.find(marker, start)
+        while pos >= 0:
+            yield pos
+            pos = data.find(marker, pos + 1)
+
+
+def _binary_end(buf):
+    """Return the size of the binary plist at the start of the buffer."""
+    data = buf.data
+    overlap = max(len(start) for start in _STARTS) - 1
+    scanned = len(MAGIC)
+    while True:
+        end = _complete_before(data, len(data))
+        if end is not None:
+            return end
+        start = max(len(MAGIC), scanned - overlap)
+        for pos in sorted(_find_all(data, _STARTS, start)):
+            end = _complete_before(data, pos)
+            if end is not None:
+                return end
+        scanned = len(data)
+        if not buf.fill():
+            return len(data)
+
+
+def _xml_end(buf):
+    """Return the size of the XML plist at the start of the buffer."""
+    data = buf.data
+    scanned = 0
+    while True:
+        end = data.find(_XML_END, scanned)
+        if end >= 0:
+            return end + len(_XML_END)
+        scanned = max(0, len(data) - len(_XML_END) + 1)
+        if not buf.fill():
+            return len(data)
+
+
+def _iter_auto(buf):
+    while buf.skip_separators():
+        buf.need(len(MAGIC))
+        if buf.data.startswith(MAGIC):
+            yield buf.take(_binary_end(buf))
+        else:
+            yield buf.take(_xml_end(buf))
+
+
+def iter_documents(stream, framing='auto', chunk_size=CHUNK_SIZE):
+    """Yield each plist document in binary *stream* as bytes.
+
+    *framing* is one of :data:`FRAMINGS`.  Empty documents are skipped,
+    except with the ``length`` framing.  Raises ValueError if the stream
+    ends inside a length-prefixed document.
+    """
+    buf = _Buffer(stream, chunk_size)
+    if framing == 'length':
+        yield from _iter_length(buf)
+        return
+    documents = _iter_nul(buf) if framing == 'nul' else _iter_auto(buf)
+    for document in documents:
+        if document and not document.isspace():
+            yield document
@@ -0,0 +1,270 @@
+"""Watching plist files and directory trees for changes.
+
+A :class:`Watcher` reports the files that appear, change or disappear
+under its inputs.  Changes are detected from stat signatures (size,
+modification time and inode) and confirmed by a hash of the content, so a
+file that is touched or rewritten unchanged is not reported.  A change is
+only reported once the file has stayed the same for the debounce delay, so
+that a file written in several steps is reported once, complete.
+
+Where the Linux inotify API is available, the watcher sleeps until
+something happens in one of the watched directories; elsewhere it checks
+the signatures every :data:`POLL_INTERVAL` seconds.  Either way no file is
+read while nothing changes.
+"""
+
+import os
+import stat
+import struct
+import sys
+import time
+
+DEFAULT_DEBOUNCE = 0.5
+
+POLL_INTERVAL = 1.0
+
+_READ_SIZE = 1024 * 1024
+
+# inotify(7) events that may change the files of a directory.
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM
+            | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE)
+# Sent when a watch is removed, e.g. because its directory was deleted.
+_IN_IGNORED = 0x8000
+
+_EVENT = struct.Struct('iIII')
+
+
+def signature(st):
+    """Return the stat signature of a file: ``(size, mtime, inode)``."""
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def file_digest(path):
+    """Return a hash of the content of file *path*."""
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_READ_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class _Inotify:
+    """Notifications of changes in watched directories, through inotify(7)."""
+
+    def __init__(self, libc, fd):
+        self._libc = libc
+        self._fd = fd
+        self._watches = {}
+        self._paths = {}
+
+    @classmethod
+    def open(cls):
+        """Return a new instance, or None if inotify is not available."""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            import ctypes
+
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (AttributeError, OSError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def watch(self, directory):
+        """Watch *directory*, returning True if it was not watched already."""
+        if directory in self._watches:
+            return False
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory),
+                                          _IN_MASK)
+        if wd < 0:
+            return False
+        self._watches[directory] = wd
+        self._paths[wd] = directory
+        return True
+
+    def wait(self, timeout):
+        """Wait up to *timeout* seconds (None: forever) for notifications."""
+        import select
+
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            pos = 0
+            while pos < len(data):
+                wd, mask, _, size = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size + size
+                if mask & _IN_IGNORED:
+                    directory = self._paths.pop(wd, None)
+                    if self._watches.get(directory) == wd:
+                        del self._watches[directory]
+
+    def close(self):
+        os.close(self._fd)
+
+
+class Watcher:
+    """Reports changes to the files under *inputs*.
+
+    *inputs* are files, and directories whose files are watched
+    recursively, without following symlinked directories and skipping the
+    directory *skip*.  Changes are reported once they have been stable for
+    *debounce* seconds.  If *inotify* is false, or inotify is not
+    available, the files are checked every *interval* seconds.
+    """
+
+    def __init__(self, inputs, skip=None, debounce=DEFAULT_DEBOUNCE,
+                 interval=POLL_INTERVAL, inotify=True):
+        self.inputs = list(inputs)
+        self.skip = None if skip is None else os.path.realpath(skip)
+        self.debounce = debounce
+        self.interval = interval
+        self._inotify = _Inotify.open() if inotify else None
+        # Signature and digest of the last reported content of each file.
+        self._known = {}
+        # Signature (None if missing) and time first seen of unstable files.
+        self._pending = {}
+        self._started = False
+        self._rescan = False
+
+    @property
+    def uses_inotify(self):
+        """True if changes are notified by inotify rather than polled."""
+        return self._inotify is not None
+
+    def _scan_tree(self, root, files, directories):
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            directories.append(directory)
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.realpath(entry.path) != self.skip:
+                            pending.append(entry.path)
+                    elif entry.is_file():
+                        files[entry.path] = signature(entry.stat())
+                except OSError:
+                    continue
+
+    def scan(self):
+        """Return the signature of every file under the inputs, by path."""
+        files = {}
+        directories = []
+        for path in self.inputs:
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Watch for the file to be created.
+                directories.append(os.path.dirname(path) or '.')
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                self._scan_tree(path, files, directories)
+            else:
+                files[path] = signature(st)
+                directories.append(os.path.dirname(path) or '.')
+        if self._inotify is not None:
+            for directory in directories:
+                if self._inotify.watch(directory):
+                    # Changes made before the watch was added are only
+                    # seen by scanning again.
+                    self._rescan = True
+        return files
+
+    def check(self, files, now):
+        """Return the ``(changed, removed)`` paths given a :meth:`scan`.
+
+        All the files found by the first check are reported as changed.
+        """
+        changed = []
+        removed = []
+        for path in sorted(set(files).union(self._known, self._pending)):
+            current = files.get(path)
+            known = self._known.get(path)
+            if current == (known and known[0]):
+                self._pending.pop(path, None)
+                continue
+            if self._started:
+                first = self._pending.get(path)
+                if first is None or first[0] != current:
+                    self._pending[path] = current, now
+                    continue
+                if now - first[1] < self.debounce:
+                    continue
+                del self._pending[path]
+            if current is None:
+                del self._known[path]
+                removed.append(path)
+                continue
+            try:
+                digest = file_digest(path)
+            except OSError:
+                # Gone or unreadable again: left to the next scan.
+                continue
+            if known is None or known[1] != digest:
+                changed.append(path)
+            self._known[path] = current, digest
+        self._started = True
+        return changed, removed
+
+    def _timeout(self, now):
+        if self._rescan:
+            return 0
+        timeout = None if self._inotify is not None else self.interval
+        if self._pending:
+            deadline = min(seen for _, seen in self._pending.values())
+            remaining = max(0, deadline + self.debounce - now)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    def wait(self):
+        """Sleep until the files may have changed or a change is stable."""
+        timeout = self._timeout(time.monotonic())
+        self._rescan = False
+        if self._inotify is not None:
+            self._inotify.wait(timeout)
+        else:
+            time.sleep(timeout)
+
+    def changes(self):
+        """Yield ``(changed, removed)`` lists of paths, forever.
+
+        The first batch holds every file found under the inputs.
+        """
+        while True:
+            changed, removed = self.check(self.scan(), time.monotonic())
+            if changed or removed:
+                yield changed, removed
+            self.wait()
+
+    def close(self):
+        """Stop watching the directories."""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
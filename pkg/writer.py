@@ -0,0 +1,174 @@
+"""Incremental JSON writer for plist event streams."""
+
+import io
+import json
+
+from pkg.events import (START_DICT, END_DICT, START_ARRAY, END_ARRAY, KEY,
+                        VALUE, REF)
+
+BUFFER_SIZE = 64 * 1024
+
+try:
+    from _json import encode_basestring as _encode_str
+except ImportError:  # pragma: no cover - pure-Python interpreters
+    from json.encoder import py_encode_basestring as _encode_str
+
+
+def _encode_key(key):
+    """Coerce a dictionary key the same way ``json.dumps`` does."""
+    if isinstance(key, str):
+        return _encode_str(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, (int, float)):
+        return _encode_str(json.dumps(key))
+    raise TypeError(f"keys must be str, int, float, bool or None, "
+                    f"not {type(key).__name__}")
+
+
+def _subtree(event, events):
+    """Yield the events of the container opened by *event* from *events*."""
+    yield event, None
+    depth = 1
+    for event, value in events:
+        yield event, value
+        if event == START_DICT or event == START_ARRAY:
+            depth += 1
+        elif event == END_DICT or event == END_ARRAY:
+            depth -= 1
+            if not depth:
+                return
+
+
+def _indented(fragment, indent, depth):
+    """Indent an encoded root object for nesting at *depth*."""
+    if indent is None or not depth:
+        return fragment
+    # Strings are encoded with escaped newlines, so every newline is a
+    # line break of the indented layout.
+    return fragment.replace('\n', '\n' + indent * depth)
+
+
+def iterencode(events, indent=None, default=None, encode_bytes=None,
+               lines=False, _fragments=None):
+    """Yield JSON text fragments for a plist event stream.
+
+    The output is identical to ``json.dumps(obj, indent=indent,
+    default=default, ensure_ascii=False)`` for the object the events
+    describe, but only the current nesting path is held in memory.
+    If *encode_bytes* is given, it is called for bytes values instead of
+    *default* and returns an iterable of the JSON fragments to write.
+
+    With *lines*, the output is newline-delimited JSON instead, without
+    indentation: each element of a root array, and each entry of a root
+    dict as a single-entry object, is written as a line of its own.  Any
+    other root is written as a single line.
+
+    Shared containers are encoded once, and every ``ref`` event to them
+    writes a copy of that encoding.
+    """
+    if lines:
+        indent = None
+    if indent is not None and not isinstance(indent, str):
+        indent = ' ' * indent
+    item_separator = ',' if indent is not None else ', '
+    encode = json.JSONEncoder(default=default, ensure_ascii=False).encode
+    # Encodings of the shared containers, by identifier.
+    fragments = {} if _fragments is None else _fragments
+    events = iter(events)
+
+    # One entry per open container: True until its first child is written.
+    stack = []
+    after_key = False
+    event = None
+    for event, value in events:
+        if event == END_DICT or event == END_ARRAY:
+            empty = stack.pop()
+            if lines and not stack:
+                if not empty:
+                    yield '}\n' if event == END_DICT else '\n'
+                continue
+            if indent is not None and not empty:
+                yield '\n' + indent * len(stack)
+            yield '}' if event == END_DICT else ']'
+            continue
+
+        if after_key:
+            after_key = False
+        elif stack:
+            if stack[-1]:
+                stack[-1] = False
+                if lines and event == KEY and len(stack) == 1:
+                    yield '{'
+            elif lines and len(stack) == 1:
+                # The next line of the root container.
+                yield '}\n{' if event == KEY else '\n'
+            else:
+                yield item_separator
+            if indent is not None:
+                yield '\n' + indent * len(stack)
+
+        if event == KEY:
+            yield _encode_key(value) + ': '
+            after_key = True
+        elif event == START_DICT or event == START_ARRAY:
+            if value is not None:
+                fragment = fragments[value] = ''.join(iterencode(
+                    _subtree(event, events), indent, default, encode_bytes,
+                    _fragments=fragments))
+                yield _indented(fragment, indent, len(stack))
+                continue
+            if stack or not lines:
+                yield '{' if event == START_DICT else '['
+            stack.append(True)
+        elif event == REF:
+            yield _indented(fragments[value], indent, len(stack))
+        elif value.__class__ is str:
+            yield _encode_str(value)
+        elif value.__class__ is int:
+            yield int.__repr__(value)
+        elif value is True:
+            yield 'true'
+        elif value is False:
+            yield 'false'
+        elif value is None:
+            yield 'null'
+        elif encode_bytes is not None and isinstance(value, (bytes, bytearray)):
+            yield from encode_bytes(value)
+        else:
+            yield encode(value)
+    if lines and event == VALUE:
+        yield '\n'
+
+
+def write_json(events, fp, indent=None, default=None, buffer_size=BUFFER_SIZE,
+               encode_bytes=None, lines=False):
+    """Write the JSON for a plist event stream to *fp*.
+
+    Fragments from :func:`iterencode` are collected until about
+    *buffer_size* characters are pending and then written in one call, as
+    UTF-8 bytes if *fp* is a binary file or as text if it is a text file.
+    Returns the number of characters written.
+    """
+    encode = not isinstance(fp, io.TextIOBase)
+    pending = []
+    size = total = 0
+    for fragment in iterencode(events, indent=indent, default=default,
+                               encode_bytes=encode_bytes, lines=lines):
+        pending.append(fragment)
+        size += len(fragment)
+        if size >= buffer_size:
+            chunk = ''.join(pending)
+            fp.write(chunk.encode('utf-8') if encode else chunk)
+            pending.clear()
+            total += size
+            size = 0
+    if pending:
+        chunk = ''.join(pending)
+        fp.write(chunk.encode('utf-8') if encode else chunk)
+        total += size
+    return total
@@ -0,0 +1,272 @@
+"""Incremental decoder for XML property lists.
+
+``plistlib`` parses an XML plist into a complete Python object graph before
+returning it.  :func:`iter_events` instead feeds the input to expat one
+chunk at a time and yields the plist events (see :mod:`pkg.events`) for each
+chunk as soon as it has been parsed.  Only the element currently being read
+and the chain of open containers are kept in memory, so arbitrarily large
+documents are converted in constant memory.
+
+An optional *prune* predicate lets a caller that needs only part of the
+plist skip whole subtrees: elements inside a pruned object are neither
+decoded nor validated.
+
+Element handling mirrors ``plistlib._PlistParser``, including its error
+messages.  The one difference is a document with several top-level objects:
+plistlib keeps the last one, which cannot be done once the first has been
+written, so it is rejected here.
+"""
+
+import binascii
+import codecs
+import datetime
+import plistlib
+import re
+from xml.parsers.expat import ParserCreate
+
+from pkg.events import (START_DICT, END_DICT, START_ARRAY, END_ARRAY,
+                        KEY, VALUE)
+
+CHUNK_SIZE = 64 * 1024
+
+_PREFIXES = (b'<?xml', b'<plist')
+
+_DATE = re.compile(
+    r"(?P<year>\d\d\d\d)"
+    r"(?:-(?P<month>\d\d)"
+    r"(?:-(?P<day>\d\d)"
+    r"(?:T(?P<hour>\d\d)"
+    r"(?::(?P<minute>\d\d)"
+    r"(?::(?P<second>\d\d))"
+    r"?)?)?)?)?Z", re.ASCII)
+
+
+def is_xml_plist(header):
+    """Return True if *header* starts like a UTF-8 XML plist."""
+    if header.startswith(codecs.BOM_UTF8):
+        header = header[len(codecs.BOM_UTF8):]
+    return header.startswith(_PREFIXES)
+
+
+def _date_from_string(s):
+    """Parse an ISO 8601 plist date the same way plistlib does."""
+    fields = []
+    for value in _DATE.match(s).groups():
+        if value is None:
+            break
+        fields.append(int(value))
+    return datetime.datetime(*fields)
+
+
+class _Handler:
+    """Expat callbacks translating plist elements into events."""
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.events = []
+        # Open containers, innermost last: START_DICT or START_ARRAY.
+        self.stack = []
+        self.current_key = None
+        self.data = []
+        self.have_root = False
+        self.end_handlers = {
+            'dict': self.end_dict,
+            'key': self.end_key,
+            'array': self.end_array,
+            'true': lambda: self.add_object(True),
+            'false': lambda: self.add_object(False),
+            'integer': self.end_integer,
+            'real': lambda: self.add_object(float(self.get_data())),
+            'string': lambda: self.add_object(self.get_data()),
+            'data': lambda: self.add_object(
+                binascii.a2b_base64(self.get_data().encode('utf-8'))),
+            'date': lambda: self.add_object(
+                _date_from_string(self.get_data())),
+        }
+
+    def line(self):
+        return self.parser.CurrentLineNumber
+
+    def handle_entity_decl(self, *args):
+        raise plistlib.InvalidFileException(
+            "XML entity declarations are not supported in plist files")
+
+    def handle_begin_element(self, element, attrs):
+        self.data = []
+        if element == 'dict':
+            self.begin_container(START_DICT)
+        elif element == 'array':
+            self.begin_container(START_ARRAY)
+
+    def handle_end_element(self, element):
+        handler = self.end_handlers.get(element)
+        if handler is not None:
+            handler()
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def get_data(self):
+        data = ''.join(self.data)
+        self.data = []
+        return data
+
+    def check_position(self):
+        """Validate that an object may appear at the current position.
+
+        Returns True if the object is a dictionary value.
+        """
+        if self.current_key is not None:
+            if self.stack[-1] != START_DICT:
+                raise ValueError("unexpected element at line %d" % self.line())
+            self.events.append((KEY, self.current_key))
+            self.current_key = None
+            return True
+        if not self.stack:
+            if self.have_root:
+                raise ValueError("unexpected element at line %d" % self.line())
+            self.have_root = True
+        elif self.stack[-1] != START_ARRAY:
+            raise ValueError("unexpected element at line %d" % self.line())
+        return False
+
+    def add_object(self, value):
+        self.check_position()
+        self.events.append((VALUE, value))
+
+    def begin_container(self, event):
+        self.check_position()
+        self.events.append((event, None))
+        self.stack.append(event)
+
+    def end_dict(self):
+        if self.current_key:
+            raise ValueError("missing value for key '%s' at line %d" %
+                             (self.current_key, self.line()))
+        # plistlib silently drops an empty key that has no value.
+        self.current_key = None
+        self.end_container(END_DICT)
+
+    def end_key(self):
+        if self.current_key or not self.stack or self.stack[-1] != START_DICT:
+            raise ValueError("unexpected key at line %d" % self.line())
+        self.current_key = self.get_data()
+
+    def end_array(self):
+        self.end_container(END_ARRAY)
+
+    def end_container(self, event):
+        self.stack.pop()
+        self.events.append((event, None))
+
+    def end_integer(self):
+        raw = self.get_data()
+        if raw.startswith('0x') or raw.startswith('0X'):
+            self.add_object(int(raw, 16))
+        else:
+            self.add_object(int(raw))
+
+
+class _PruningHandler(_Handler):
+    """Handler leaving out the objects whose key path *prune* rejects.
+
+    While a pruned object is parsed, the parser calls minimal handlers that
+    only track the element depth, and no character data handler at all.
+    """
+
+    def __init__(self, parser, prune):
+        super().__init__(parser)
+        self.prune = prune
+        # Key or index of each open container below the root, and for each
+        # open container the index of its next item.
+        self.nodes = []
+        self.indexes = []
+        # Depth of elements inside a pruned object, or 0.
+        self.skip = 0
+
+    def handle_begin_element(self, element, attrs):
+        if self.stack and element != 'key' and element in self.end_handlers:
+            if self.current_key is not None:
+                node = self.current_key
+            elif self.stack[-1] == START_ARRAY:
+                node = self.indexes[-1]
+            else:
+                node = None  # misplaced; reported by check_position
+            if node is not None and self.prune(tuple(self.nodes) + (node,)):
+                if self.current_key is None:
+                    self.indexes[-1] += 1
+                self.current_key = None
+                self.skip = 1
+                parser = self.parser
+                parser.StartElementHandler = self.skip_begin_element
+                parser.EndElementHandler = self.skip_end_element
+                parser.CharacterDataHandler = None
+                return
+        super().handle_begin_element(element, attrs)
+
+    def skip_begin_element(self, element, attrs):
+        self.skip += 1
+
+    def skip_end_element(self, element):
+        self.skip -= 1
+        if not self.skip:
+            parser = self.parser
+            parser.StartElementHandler = self.handle_begin_element
+            parser.EndElementHandler = self.handle_end_element
+            parser.CharacterDataHandler = self.handle_data
+
+    def check_position(self):
+        if not super().check_position() and self.stack:
+            self.indexes[-1] += 1
+            return False
+        return True
+
+    def begin_container(self, event):
+        if self.stack:
+            if self.current_key is not None:
+                self.nodes.append(self.current_key)
+            elif self.stack[-1] == START_ARRAY:
+                self.nodes.append(self.indexes[-1])
+        super().begin_container(event)
+        self.indexes.append(0)
+
+    def end_container(self, event):
+        super().end_container(event)
+        self.indexes.pop()
+        if self.stack:
+            self.nodes.pop()
+
+
+def iter_events(fp, chunk_size=CHUNK_SIZE, prune=None):
+    """Yield the event stream of the XML plist read from binary file *fp*.
+
+    Events are yielded after each *chunk_size* block of input is parsed, so
+    output can begin before the whole document has been read.  If *prune*
+    is given, it is called with the key path of each object below the root
+    (see :mod:`pkg.events`), and objects for which it returns True are
+    left out of the stream without being decoded.
+    """
+    parser = ParserCreate()
+    parser.buffer_text = True
+    if prune is None:
+        handler = _Handler(parser)
+    else:
+        handler = _PruningHandler(parser, prune)
+    parser.StartElementHandler = handler.handle_begin_element
+    parser.EndElementHandler = handler.handle_end_element
+    parser.CharacterDataHandler = handler.handle_data
+    parser.EntityDeclHandler = handler.handle_entity_decl
+
+    read = getattr(fp, 'read1', fp.read)
+    events = handler.events
+    while True:
+        chunk = read(chunk_size)
+        parser.Parse(chunk, not chunk)
+        if events:
+            yield from events
+            events.clear()
+        if not chunk:
+            break
+    if not handler.have_root:
+        # plistlib returns None for a document without any object.
+        yield VALUE, None
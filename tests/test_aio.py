@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Test suite for the asyncio conversion API."""
+
+import asyncio
+import json
+import os
+import plistlib
+import tempfile
+
+import pytest
+
+from pkg.aio import AsyncConverter
+from pkg.cache import ConversionCache
+
+
+DOCUMENTS = [plistlib.dumps({"index": i}, fmt=plistlib.FMT_BINARY) for i in range(8)]
+
+
+def _run(coroutine_function):
+    async def main():
+        async with AsyncConverter(jobs=2, threads=True, limit=3) as converter:
+            return await coroutine_function(converter)
+    return asyncio.run(main())
+
+
+class TestAsyncConverter:
+    """Test cases for AsyncConverter."""
+
+    def test_convert(self):
+        """Test converting a path and bytes, with conversion options."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'test.plist')
+            with open(path, 'wb') as f:
+                f.write(plistlib.dumps({"a": [1, 2]}))
+
+            async def convert(converter):
+                return (await converter.convert(path),
+                        await converter.convert(DOCUMENTS[1], path=("index",)))
+
+            assert _run(convert) == (b'{"a": [1, 2]}', b'1')
+
+    def test_convert_error(self):
+        """Test that conversion errors are raised."""
+        async def convert(converter):
+            return await converter.convert(b'not a plist')
+
+        with pytest.raises(plistlib.InvalidFileException):
+            _run(convert)
+
+    @pytest.mark.parametrize("ordered", [True, False])
+    def test_convert_many(self, ordered):
+        """Test converting a lazy async stream, with failures reported."""
+        pulled = []
+
+        async def sources():
+            for document in DOCUMENTS + [b'not a plist']:
+                pulled.append(document)
+                yield document
+
+        async def convert_many(converter):
+            results = []
+            async for result in converter.convert_many(sources(), ordered=ordered):
+                # The input is consumed no further than the in-flight limit.
+                assert len(pulled) <= len(results) + converter.limit
+                results.append(result)
+            return results
+
+        results = _run(convert_many)
+        if not ordered:
+            results.sort(key=lambda result: (result[1] is None, result[1] and
+                                             json.loads(result[1])["index"]))
+        assert [(source, json.loads(data)) for source, data, _ in results[:-1]] \
+            == [(document, {"index": i}) for i, document in enumerate(DOCUMENTS)]
+        source, data, error = results[-1]
+        assert (source, data) == (b'not a plist', None)
+        assert "Invalid plist format" in error
+
+    def test_process_pool(self):
+        """Test converting in worker processes."""
+        async def main():
+            async with AsyncConverter(jobs=1) as converter:
+                return [data async for _, data, _ in converter.convert_many(
+                    DOCUMENTS[:2], path=("index",))]
+
+        assert asyncio.run(main()) == [b'0', b'1']
+
+    def test_process_pool_sources(self):
+        """Test memory views, file options and unpicklable sources with worker processes."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ConversionCache(os.path.join(tmpdir, 'cache'))
+
+            async def main():
+                async with AsyncConverter(jobs=1) as converter:
+                    data = await converter.convert(memoryview(DOCUMENTS[0]), cache=cache)
+                    results = [result async for result in converter.convert_many(
+                        [memoryview(DOCUMENTS[1]), lambda: None], cache=cache)]
+                return data, results
+
+            data, results = asyncio.run(main())
+            assert json.loads(data) == {"index": 0}
+            assert json.loads(results[0][1]) == {"index": 1}
+            assert results[1][1] is None and results[1][2]
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Test suite for reading plists from zip and tar archives."""
+
+import io
+import os
+import tarfile
+import tempfile
+import zipfile
+
+import pytest
+
+from pkg.archive import HEADER_SIZE, iter_members
+
+
+MEMBERS = {
+    "Payload/App.app/Info.plist": b"<plist/>",
+    "Payload/App.app/large": b"x" * (3 * HEADER_SIZE),
+    "Payload/App.app/readme.txt": b"hello",
+}
+
+
+def _write_zip(path):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("Payload/", b"")
+        for name, content in MEMBERS.items():
+            archive.writestr(name, content)
+
+
+def _write_tar(path):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, content in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+
+@pytest.fixture
+def root():
+    with tempfile.TemporaryDirectory() as root:
+        yield root
+
+
+class TestIterMembers:
+    """Test cases for iter_members."""
+
+    @pytest.mark.parametrize("write", [_write_zip, _write_tar])
+    def test_selected_members(self, root, write):
+        """Test that selected regular files are read whole, in archive order."""
+        path = os.path.join(root, 'archive')
+        write(path)
+        seen = []
+
+        def select(name, header):
+            seen.append((name, header))
+            return not name.endswith('.txt')
+
+        assert list(iter_members(path, select)) == [
+            (name, content) for name, content in MEMBERS.items()
+            if not name.endswith('.txt')]
+        assert seen == [(name, content[:HEADER_SIZE])
+                        for name, content in MEMBERS.items()]
+
+    def test_not_an_archive(self, root):
+        """Test that other files are rejected."""
+        path = os.path.join(root, 'file.plist')
+        with open(path, 'wb') as f:
+            f.write(b'<plist/>')
+        with pytest.raises(ValueError):
+            list(iter_members(path, lambda name, header: True))
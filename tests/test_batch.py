@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Test suite for parallel batch conversion."""
+
+import os
+import tempfile
+
+import pytest
+
+from pkg.batch import default_jobs, output_path, parallel_map, walk_tree
+
+
+def _square(x):
+    return x * x
+
+
+def _fail(x):
+    raise RuntimeError(f"failed on {x}")
+
+
+class TestParallelMap:
+    """Test cases for parallel_map."""
+
+    def test_default_jobs(self):
+        """Test that at least one worker is used by default."""
+        assert default_jobs() >= 1
+
+    def test_single_job_runs_inline(self):
+        """Test that one job maps in the calling process."""
+        assert list(parallel_map(lambda x: x + 1, [1, 2, 3], jobs=1)) == [2, 3, 4]
+
+    @pytest.mark.parametrize("jobs", [None, 2])
+    def test_ordered(self, jobs):
+        """Test that results follow input order."""
+        items = range(50)
+        assert list(parallel_map(_square, items, jobs=jobs)) == [
+            x * x for x in items]
+
+    def test_completion_order(self):
+        """Test that unordered results cover every input."""
+        items = range(50)
+        results = parallel_map(_square, iter(items), jobs=2, ordered=False)
+        assert sorted(results) == [x * x for x in items]
+
+    def test_lazy_consumption(self):
+        """Test that input is consumed only a bounded distance ahead."""
+        consumed = []
+
+        def items():
+            for x in range(1000):
+                consumed.append(x)
+                yield x
+
+        results = parallel_map(_square, items(), jobs=2)
+        assert next(results) == 0
+        assert len(consumed) < 100
+        results.close()
+
+    def test_worker_exception_propagates(self):
+        """Test that an exception raised by the function propagates."""
+        with pytest.raises(RuntimeError, match="failed on"):
+            list(parallel_map(_fail, [1, 2], jobs=2))
+
+
+class TestOutputPath:
+    """Test cases for output_path."""
+
+    def test_plist_extension_replaced(self):
+        """Test that a .plist extension becomes .json."""
+        assert output_path('out', os.path.join('a', 'b.PLIST')) == \
+            os.path.join('out', 'a', 'b.json')
+
+    def test_compressed_plist_extension_replaced(self):
+        """Test that a .plist extension is replaced along with a compression suffix."""
+        assert output_path('out', 'a.plist.gz', '.json.gz') == os.path.join('out', 'a.json.gz')
+        assert output_path('out', 'a.plist.XZ') == os.path.join('out', 'a.json')
+        assert output_path('out', 'notes.gz') == os.path.join('out', 'notes.gz.json')
+
+    def test_other_names_appended(self):
+        """Test that other names get .json appended."""
+        assert output_path('out', 'b.xml') == os.path.join('out', 'b.xml.json')
+        assert output_path('out', 'b') == os.path.join('out', 'b.json')
+
+
+class TestWalkTree:
+    """Test cases for walk_tree."""
+
+    def _touch(self, path, mtime=None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w'):
+            pass
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_walk_and_skip_up_to_date(self):
+        """Test that only files with stale or missing output are yielded."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(src, 'out')  # output inside the source tree
+            self._touch(os.path.join(src, 'a.plist'), 1000)
+            self._touch(os.path.join(src, 'sub', 'b.plist'), 1000)
+            self._touch(os.path.join(src, 'sub', 'c'), 3000)
+            self._touch(os.path.join(dst, 'sub', 'b.json'), 2000)
+            self._touch(os.path.join(dst, 'sub', 'c.json'), 2000)
+            os.symlink(src, os.path.join(src, 'loop'))
+
+            assert list(walk_tree(src, dst)) == [
+                (os.path.join(src, 'a.plist'), os.path.join(dst, 'a.json')),
+                (os.path.join(src, 'sub', 'c'), os.path.join(dst, 'sub', 'c.json')),
+            ]
+
+    def test_shared_output_reported(self):
+        """Test that files sharing an output are reported, the .plist one converted."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(root, 'dst')
+            for name in ('a', 'a.plist', 'a.plist.gz', 'b'):
+                self._touch(os.path.join(src, name), 1000)
+            self._touch(os.path.join(dst, 'a.json'), 2000)
+
+            b = (os.path.join(src, 'b'), os.path.join(dst, 'b.json'))
+            a = (os.path.join(src, 'a.plist'), os.path.join(dst, 'a.json'))
+            # Whether or not the output is up to date.
+            for expected in ([b], [a, b]):
+                errors = []
+                assert list(walk_tree(src, dst, onerror=errors.append)) == expected
+                assert sorted(e.filename for e in errors) == [
+                    os.path.join(src, 'a'), os.path.join(src, 'a.plist.gz')]
+                assert all("'a.plist'" in str(e) for e in errors)
+                os.utime(a[1], (0, 0))
+
+    def test_unreadable_directory(self):
+        """Test that scan errors are reported through onerror."""
+        errors = []
+        missing = os.path.join(tempfile.gettempdir(), 'nonexistent-plist2json-dir')
+        assert list(walk_tree(missing, 'out', onerror=errors.append)) == []
+        assert len(errors) == 1 and isinstance(errors[0], OSError)
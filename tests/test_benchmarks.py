@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Smoke test for the benchmark harness."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     'benchmarks', 'bench.py')
+
+
+class TestBenchmarks:
+    """Test cases for benchmarks/bench.py."""
+
+    def test_report(self):
+        """Test that a small run produces a complete JSON report."""
+        with tempfile.TemporaryDirectory() as root:
+            corpus = os.path.join(root, 'corpus')
+            result = subprocess.run(
+                [sys.executable, BENCH, '--corpus', corpus, '--size', '20000',
+                 '--shape', 'dates', '--format', 'xml', '--repeat', '1'],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+            report = json.loads(result.stdout)
+            with open(os.path.join(corpus, 'manifest.json')) as f:
+                manifest = json.load(f)
+
+        assert list(manifest) == ['dates.xml.plist']
+        assert abs(manifest['dates.xml.plist']['size'] - 20000) <= 1000
+        assert [(r["name"], r["operation"]) for r in report["results"]] == [
+            ('dates.xml.plist', 'read_plist'), ('dates.xml.plist', 'main')]
+        for r in report["results"]:
+            assert r["seconds"] > 0 and r["mb_per_s"] > 0
+            assert r["objects_per_s"] > 0 and r["objects"] > 1
+        assert report["startup"]["seconds"] > 0
+        assert b"startup" in result.stderr
+        assert report["startup"]["import_seconds"] >= 0
+        assert "pkg.bplist" in report["startup"]["modules"]
+
+    def test_startup_threshold(self):
+        """Test that --max-startup fails on a start-up slower than allowed."""
+        with tempfile.TemporaryDirectory() as root:
+            baseline = os.path.join(root, 'baseline.json')
+            command = [sys.executable, BENCH, '--startup-only', '--repeat', '1',
+                       '--compare', baseline, '--max-startup', '2']
+            for seconds, status in ((100.0, 0), (1e-6, 1)):
+                with open(baseline, 'w') as f:
+                    json.dump({"startup": {"relative_seconds": seconds,
+                                           "relative_import_seconds": seconds},
+                               "results": []}, f)
+                result = subprocess.run(command, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+                assert result.returncode == status
+                assert json.loads(result.stdout)["results"] == []
+        assert b"startup imports" in result.stderr
+
+    def test_startup_imports(self):
+        """Test that start-up does not import the modules kept off the binary path."""
+        result = subprocess.run([sys.executable, BENCH, '--startup-only', '--repeat', '1'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        modules = json.loads(result.stdout)["startup"]["modules"]
+        # The stdlib import graph varies between Python versions, so only
+        # the modules left out on purpose are checked, not their number.
+        assert not {'plistlib', 'pyexpat', 'shutil'} & set(modules)
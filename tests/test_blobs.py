@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Test suite for the output of data objects."""
+
+import base64
+import json
+import os
+import tempfile
+
+import pytest
+
+from pkg.blobs import CHUNK_SIZE, DataEncoder, iter_base64
+from pkg.events import iter_object_events
+from pkg.writer import iterencode
+
+
+class TestIterBase64:
+    """Test cases for iter_base64."""
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, CHUNK_SIZE - 1, CHUNK_SIZE,
+                                      CHUNK_SIZE + 1, 3 * CHUNK_SIZE + 2])
+    def test_matches_b64encode(self, size):
+        """Test that chunked encoding matches encoding in one piece."""
+        data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+        expected = json.dumps(base64.b64encode(data).decode('ascii'))
+        assert ''.join(iter_base64(data)) == expected
+        assert ''.join(iter_base64(bytearray(data))) == expected
+
+
+class TestDataEncoder:
+    """Test cases for DataEncoder."""
+
+    def _encode(self, obj, encoder):
+        return json.loads(''.join(iterencode(
+            encoder.externalize(iter_object_events(obj)),
+            encode_bytes=encoder.encode)))
+
+    def test_inline(self):
+        """Test that without a directory every blob is written inline."""
+        obj = {"a": b"\x00\x01", "b": [b"x" * 10000]}
+        assert self._encode(obj, DataEncoder()) == {
+            "a": "AAE=", "b": [base64.b64encode(b"x" * 10000).decode('ascii')]}
+
+    def test_directory(self):
+        """Test that large blobs are stored once and referenced."""
+        blob = os.urandom(100)
+        with tempfile.TemporaryDirectory() as root:
+            directory = os.path.join(root, 'blobs')
+            encoder = DataEncoder(directory, threshold=100)
+            result = self._encode({"a": blob, "b": [blob, blob[:99]]}, encoder)
+            reference = result["a"]
+            assert reference == {"$data": reference["$data"], "size": 100}
+            assert result["b"] == [reference,
+                                   base64.b64encode(blob[:99]).decode('ascii')]
+            assert os.listdir(directory) == [reference["$data"]]
+            with open(os.path.join(directory, reference["$data"]), 'rb') as f:
+                assert f.read() == blob
+
+    def test_options(self):
+        """Test that the cache options tell encodings apart."""
+        options = {DataEncoder().options(), DataEncoder('d').options(),
+                   DataEncoder('d', 1).options(), DataEncoder('e').options()}
+        assert len(options) == 4
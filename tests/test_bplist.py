@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Test suite for the on-demand binary plist decoder."""
+
+import datetime
+import os
+import plistlib
+import struct
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from pkg.bplist import BinaryPlist
+from pkg.events import iter_object_events, key_pruner, path_pruner
+
+
+def _build_bplist(objects, top=0):
+    """Assemble a binary plist from pre-encoded objects (1-byte refs)."""
+    body = bytearray(b'bplist00')
+    offsets = []
+    for obj in objects:
+        offsets.append(len(body))
+        body += obj
+    table = len(body)
+    body += bytes(offsets)
+    body += struct.pack('>6xBBQQQ', 1, 1, len(objects), top, table)
+    return bytes(body)
+
+
+SAMPLE = {
+    "string": "value",
+    "unicode": "café 🎉",
+    "integer": 42,
+    "negative": -7,
+    "big": 2 ** 63 - 1,
+    "float": 3.5,
+    "true": True,
+    "false": False,
+    "data": b"\x00\x01\x02",
+    "empty": b"",
+    "date": datetime.datetime(2023, 1, 1, 12, 0, 0),
+    "uid": plistlib.UID(7),
+    "array": [1, "two", [3, {"four": 4}]],
+    "dict": {"nested": {"deeper": "yes"}},
+    "long": "x" * 100,
+    "wide": list(range(300)),
+}
+
+
+class TestBinaryPlist:
+    """Test cases for BinaryPlist."""
+
+    def test_events_match_plistlib(self):
+        """Test that decoding matches plistlib for all object types."""
+        data = plistlib.dumps(SAMPLE, fmt=plistlib.FMT_BINARY)
+        expected = list(iter_object_events(plistlib.loads(data)))
+        assert list(BinaryPlist(data).iter_events()) == expected
+
+    def test_repeated_keys(self):
+        """Test that keys decoded once are reused, however many there are."""
+        records = [{"id": i, f"key {i % 5}": i, "name": "x"} for i in range(20)]
+        data = plistlib.dumps(records, fmt=plistlib.FMT_BINARY)
+        expected = list(iter_object_events(records))
+        for size in (2, 4096):
+            with patch('pkg.bplist._KEY_CACHE_SIZE', size):
+                assert list(BinaryPlist(data).iter_events()) == expected
+
+    def test_scalar_root(self):
+        """Test a plist whose root object is not a container."""
+        data = plistlib.dumps("root", fmt=plistlib.FMT_BINARY)
+        assert list(BinaryPlist(data).iter_events()) == [("value", "root")]
+
+    def test_open_memory_maps_file(self):
+        """Test opening a file and closing its memory map."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(SAMPLE, f, fmt=plistlib.FMT_BINARY, sort_keys=False)
+            temp_path = f.name
+
+        try:
+            with BinaryPlist.open(temp_path) as plist:
+                events = list(plist.iter_events())
+            assert events == list(iter_object_events(SAMPLE))
+            plist.close()  # closing twice is harmless
+        finally:
+            os.unlink(temp_path)
+
+    def test_open_empty_file(self):
+        """Test that an empty file is rejected."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            temp_path = f.name
+
+        try:
+            with pytest.raises(plistlib.InvalidFileException):
+                BinaryPlist.open(temp_path)
+        finally:
+            os.unlink(temp_path)
+
+    def test_open_invalid_file(self):
+        """Test that a file without the binary header is rejected."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            f.write(b"This is not a valid plist file, but it is long enough")
+            temp_path = f.name
+
+        try:
+            with pytest.raises(plistlib.InvalidFileException):
+                BinaryPlist.open(temp_path)
+        finally:
+            os.unlink(temp_path)
+
+    def test_shared_objects(self):
+        """Test that an object referenced twice is decoded twice."""
+        data = _build_bplist([b'\xa2\x01\x01', b'\x51a'])
+        assert list(BinaryPlist(data).iter_events()) == [
+            ("start_array", None), ("value", "a"), ("value", "a"),
+            ("end_array", None)]
+
+    def test_shared_refs(self):
+        """Test finding the containers referenced from several places."""
+        # [[a], [a], [a], "a"] with the inner array and the string shared.
+        data = _build_bplist([b'\xa4\x01\x01\x01\x02', b'\xa1\x02', b'\x51a'])
+        plist = BinaryPlist(data)
+        assert plist.shared_refs() == {1}
+        assert list(plist.iter_events(shared=plist.shared_refs())) == [
+            ("start_array", None), ("start_array", 1), ("value", "a"),
+            ("end_array", None), ("ref", 1), ("ref", 1), ("value", "a"),
+            ("end_array", None)]
+
+    def test_prune(self):
+        """Test that pruned objects are left out without being read."""
+        plist = BinaryPlist(plistlib.dumps(SAMPLE, fmt=plistlib.FMT_BINARY,
+                                           sort_keys=False))
+        for prune in (path_pruner(("array", 2)), key_pruner([("dict",)], [("dict", "*", "*")])):
+            assert list(plist.iter_events(prune=prune)) == list(
+                iter_object_events(SAMPLE, prune=prune))
+        # A pruned value that cannot be decoded is never read.
+        data = _build_bplist([b'\xd2\x01\x02\x03\x04', b'\x51a', b'\x51b',
+                              b'\xff', b'\x10\x01'])
+        events = BinaryPlist(data).iter_events(prune=key_pruner([], [("a",)]))
+        assert list(events) == [("start_dict", None), ("key", "b"), ("value", 1),
+                                ("end_dict", None)]
+        # Nothing is shared when pruning.
+        data = _build_bplist([b'\xa2\x01\x01', b'\xa1\x02', b'\x51a'])
+        plist = BinaryPlist(data)
+        assert ("ref", 1) not in list(plist.iter_events(
+            shared=plist.shared_refs(), prune=key_pruner([], [(0, 0)])))
+
+    def test_circular_reference(self):
+        """Test that a container containing itself is rejected."""
+        data = _build_bplist([b'\xa1\x00'])
+        with pytest.raises(ValueError, match="Circular reference"):
+            list(BinaryPlist(data).iter_events())
+
+    def test_decode_matches_plistlib(self):
+        """Test that decoding whole objects matches plistlib."""
+        data = plistlib.dumps(SAMPLE, fmt=plistlib.FMT_BINARY)
+        plist = BinaryPlist(data)
+        assert plist.decode() == plistlib.loads(data)
+        assert plist.decode(plist.find(("dict",))) == SAMPLE["dict"]
+        assert BinaryPlist(plistlib.dumps("root", fmt=plistlib.FMT_BINARY)).decode() == "root"
+
+    def test_decode_shared_objects(self):
+        """Test that a container referenced twice is decoded once."""
+        data = _build_bplist([b'\xa2\x01\x01', b'\xa1\x02', b'\x51a'])
+        root = BinaryPlist(data).decode()
+        assert root == [["a"], ["a"]]
+        assert root[0] is root[1]
+
+    def test_decode_invalid(self):
+        """Test that decoding rejects cycles and container keys."""
+        with pytest.raises(ValueError, match="Circular reference"):
+            BinaryPlist(_build_bplist([b'\xa1\x01', b'\xa1\x00'])).decode()
+        with pytest.raises(plistlib.InvalidFileException):
+            BinaryPlist(_build_bplist([b'\xd1\x01\x01', b'\xa0'])).decode()
+
+    def test_truncated_trailer(self):
+        """Test that a plist too short for its trailer is rejected."""
+        with pytest.raises(plistlib.InvalidFileException):
+            BinaryPlist(b'bplist00' + b'\x00' * 8)
+
+    def test_zero_ref_size(self):
+        """Test that a trailer with zero-sized references is rejected."""
+        data = b'bplist00' + struct.pack('>6xBBQQQ', 1, 0, 0, 0, 8)
+        with pytest.raises(plistlib.InvalidFileException):
+            BinaryPlist(data)
+
+    def test_reference_out_of_range(self):
+        """Test that a reference past the object table is rejected."""
+        data = _build_bplist([b'\xa1\x05'])
+        with pytest.raises(plistlib.InvalidFileException):
+            list(BinaryPlist(data).iter_events())
+
+    def test_truncated_string(self):
+        """Test that a string running past the buffer is rejected."""
+        data = _build_bplist([b'\x5f\x10\xff'])
+        with pytest.raises(plistlib.InvalidFileException):
+            list(BinaryPlist(data).iter_events())
+
+    def test_unknown_token(self):
+        """Test that an unknown object marker is rejected."""
+        data = _build_bplist([b'\xc0'])
+        with pytest.raises(plistlib.InvalidFileException):
+            list(BinaryPlist(data).iter_events())
+
+    def test_container_key(self):
+        """Test that a container used as a dictionary key is rejected."""
+        data = _build_bplist([b'\xd1\x01\x01', b'\xa0'])
+        with pytest.raises(plistlib.InvalidFileException):
+            list(BinaryPlist(data).iter_events())
+
+    def test_truncated_reference_list(self):
+        """Test that references running past the buffer are rejected."""
+        plist = BinaryPlist(_build_bplist([b'\xaf\x10\xff']))
+        with pytest.raises(plistlib.InvalidFileException):
+            list(plist.iter_events())
+
+    @pytest.mark.parametrize("path", [
+        (), ("array",), ("array", 2, 1, "four"), ("dict", "nested"),
+        ("wide", 299),
+    ])
+    def test_find(self, path):
+        """Test that find locates the object at a key path."""
+        plist = BinaryPlist(plistlib.dumps(SAMPLE, fmt=plistlib.FMT_BINARY,
+                                           sort_keys=False))
+        obj = SAMPLE
+        for node in path:
+            obj = obj[node]
+        assert list(plist.iter_events(plist.find(path))) == list(
+            iter_object_events(obj))
+
+    @pytest.mark.parametrize("path", [
+        ("missing",), ("array", 3), ("array", "0"), ("dict", 0),
+        ("string", 0),
+    ])
+    def test_find_missing(self, path):
+        """Test that find returns None when there is no object at the path."""
+        plist = BinaryPlist(plistlib.dumps(SAMPLE, fmt=plistlib.FMT_BINARY,
+                                           sort_keys=False))
+        assert plist.find(path) is None
+
+    def test_find_decodes_only_the_path(self):
+        """Test that values beside the path are never decoded."""
+        # {"a": <invalid>, "b": [<invalid>, "x"]}
+        data = _build_bplist([b'\xd2\x01\x02\x03\x04', b'\x51a', b'\x51b',
+                              b'\xc0', b'\xa2\x03\x05', b'\x51x'])
+        plist = BinaryPlist(data)
+        assert list(plist.iter_events(plist.find(("b", 1)))) == [
+            ("value", "x")]
+
+
+class TestObjectEvents:
+    """Test cases for iter_object_events."""
+
+    def test_events(self):
+        """Test the event stream of a nested object."""
+        assert list(iter_object_events({"a": [1, {}], "b": ()})) == [
+            ("start_dict", None),
+            ("key", "a"), ("start_array", None), ("value", 1),
+            ("start_dict", None), ("end_dict", None), ("end_array", None),
+            ("key", "b"), ("start_array", None), ("end_array", None),
+            ("end_dict", None),
+        ]
+
+    def test_circular_reference(self):
+        """Test that a list containing itself is rejected."""
+        data = []
+        data.append(data)
+        with pytest.raises(ValueError, match="Circular reference"):
+            list(iter_object_events(data))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Test suite for the persistent conversion cache."""
+
+import io
+import os
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+from pkg.cache import ConversionCache
+
+
+@pytest.fixture
+def workdir():
+    with tempfile.TemporaryDirectory() as root:
+        yield root
+
+
+def _write(path, data, mtime=None):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _cache_size(directory):
+    """Return the total size of the entries and index files of a cache."""
+    return sum(entry.stat().st_size
+               for kind in ('objects', 'index')
+               for bucket in os.scandir(os.path.join(directory, kind))
+               for entry in os.scandir(bucket.path))
+
+
+def _converter(calls, output=b'{"converted": true}'):
+    def convert(stream):
+        calls.append(1)
+        stream.write(output)
+    return convert
+
+
+class TestConversionCache:
+    """Test cases for ConversionCache."""
+
+    def test_miss_then_hit(self, workdir):
+        """Test that a second conversion is served from the cache."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+        calls = []
+        for expected_hit in (False, True):
+            out = io.BytesIO()
+            assert cache.write(src, out, _converter(calls)) is expected_hit
+            assert out.getvalue() == b'{"converted": true}'
+        assert len(calls) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_stat_signature_skips_hashing(self, workdir):
+        """Test that an unchanged file is not hashed again."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+        cache.write(src, io.BytesIO(), _converter([]))
+        with patch.object(ConversionCache, '_content_key',
+                          side_effect=AssertionError("hashed")):
+            assert cache.lookup(src)[0] is not None
+
+    def test_touched_file_hits_by_content(self, workdir):
+        """Test that a changed signature falls back to the content hash."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        copy = os.path.join(workdir, 'b.plist')
+        _write(src, b'plist', mtime=1000)
+        cache.write(src, io.BytesIO(), _converter([]))
+        _write(src, b'plist', mtime=2000)
+        _write(copy, b'plist')
+        calls = []
+        assert cache.write(src, io.BytesIO(), _converter(calls))
+        assert cache.write(copy, io.BytesIO(), _converter(calls))
+        assert calls == []
+
+    def test_changed_content_misses(self, workdir):
+        """Test that new content is converted again."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist', mtime=1000)
+        cache.write(src, io.BytesIO(), _converter([], b'old'))
+        _write(src, b'changed', mtime=2000)
+        out = io.BytesIO()
+        assert not cache.write(src, out, _converter([], b'new'))
+        assert out.getvalue() == b'new'
+
+    def test_options_are_part_of_the_key(self, workdir):
+        """Test that different options do not share entries."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+        cache.write(src, io.BytesIO(), _converter([]), options='indent=None')
+        assert cache.lookup(src, options='indent=2')[0] is None
+
+    def test_failed_conversion_not_stored(self, workdir):
+        """Test that a conversion error leaves no cache entry."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+
+        def fail(stream):
+            stream.write(b'partial')
+            raise ValueError("bad plist")
+
+        with pytest.raises(ValueError):
+            cache.write(src, io.BytesIO(), fail)
+        assert cache.lookup(src)[0] is None
+
+    def test_entry_evicted_after_lookup(self, workdir):
+        """Test that an entry removed after lookup is converted again."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+        cache.write(src, io.BytesIO(), _converter([]))
+        cached, key = cache.lookup(src)
+        os.unlink(cached)
+        with patch.object(cache, 'lookup', return_value=(cached, key)):
+            calls = []
+            assert not cache.write(src, io.BytesIO(), _converter(calls))
+            assert calls == [1]
+
+    def test_prune_evicts_least_recently_used(self, workdir):
+        """Test that pruning removes the oldest entries first, with their index files."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        paths = []
+        for i in range(3):
+            src = os.path.join(workdir, f'{i}.plist')
+            _write(src, b'plist %d' % i)
+            cache.write(src, io.BytesIO(), _converter([], b'x' * 100))
+            os.utime(cache.lookup(src)[0], (1000 + i, 1000 + i))
+            paths.append(src)
+        # Touch the oldest entry so that the second one is evicted instead.
+        cache.lookup(paths[0])
+        total = _cache_size(cache.directory)
+        cache.max_size = total - 1
+        cache.prune()
+        assert cache.lookup(paths[0])[0] is not None
+        assert cache.lookup(paths[2])[0] is not None
+        assert _cache_size(cache.directory) == total * 2 // 3
+        with patch.object(ConversionCache, '_content_key',
+                          side_effect=AssertionError("hashed")):
+            with pytest.raises(AssertionError):
+                cache.lookup(paths[1])
+
+    def test_prune_counts_and_evicts_index_files(self, workdir):
+        """Test that index files count toward the limit, orphaned ones going first."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+        cache.write(src, io.BytesIO(), _converter([], b'x' * 100))
+        for i in range(20):
+            _write(src, b'plist', mtime=1000 + i)
+            cache.lookup(src, options=f'indent={i}')  # an index file each
+        with open(os.path.join(cache.directory, 'size')) as f:
+            assert int(f.read()) == _cache_size(cache.directory)
+        cache.max_size = _cache_size(cache.directory) // 2
+        cache.prune()
+        assert _cache_size(cache.directory) <= cache.max_size
+        assert cache.lookup(src)[0] is not None
+
+    def test_rewritten_index_files_counted_once(self, workdir):
+        """Test that rewriting an index file only adds its change in size."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'))
+        src = os.path.join(workdir, 'a.plist')
+        _write(src, b'plist')
+        cache.write(src, io.BytesIO(), _converter([]))
+        for mtime in (1, 1000, 10 ** 9):
+            _write(src, b'plist', mtime=mtime)
+            cache.lookup(src)
+        with open(os.path.join(cache.directory, 'size')) as f:
+            assert int(f.read()) == _cache_size(cache.directory)
+
+    def test_large_writes_trigger_pruning(self, workdir):
+        """Test that storing entries prunes the cache when it is full."""
+        cache = ConversionCache(os.path.join(workdir, 'cache'), max_size=25)
+        for i in range(5):
+            src = os.path.join(workdir, f'{i}.plist')
+            _write(src, b'plist %d' % i)
+            cache.write(src, io.BytesIO(), _converter([], b'x' * 10))
+        objects = os.path.join(workdir, 'cache', 'objects')
+        sizes = [entry.stat().st_size
+                 for bucket in os.scandir(objects)
+                 for entry in os.scandir(bucket.path)]
+        assert sum(sizes) <= 25
+
+    def test_prune_empty_cache(self, workdir):
+        """Test pruning a cache that has no entries yet."""
+        ConversionCache(os.path.join(workdir, 'cache')).prune()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Test suite for compressed input and output."""
+
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+
+import pytest
+
+from pkg.compress import compressed, decompressing, open_reader, sniff
+
+DATA = b'<?xml version="1.0"?>\n<plist><string>text</string></plist>\n' * 100
+
+COMPRESSORS = {'gzip': gzip.compress, 'bz2': bz2.compress, 'xz': lzma.compress}
+
+DECOMPRESSORS = {'gzip': gzip.decompress, 'xz': lzma.decompress}
+
+
+class TestInput:
+    """Test cases for recognizing and decompressing input."""
+
+    @pytest.mark.parametrize("compression", sorted(COMPRESSORS))
+    def test_sniff(self, compression):
+        """Test recognizing each format by its magic bytes."""
+        assert sniff(COMPRESSORS[compression](DATA)[:6]) == compression
+
+    def test_sniff_uncompressed(self):
+        """Test that plists and look-alikes are not taken for compressed data."""
+        for header in (b'bplist00', b'<?xml ', b'BZh!', b'\x1f', b''):
+            assert sniff(header) is None
+
+    @pytest.mark.parametrize("compression", sorted(COMPRESSORS))
+    def test_decompressing(self, compression):
+        """Test decompressing from buffered readers and memory maps."""
+        content = COMPRESSORS[compression](DATA)
+        assert decompressing(io.BufferedReader(io.BytesIO(content))).read() == DATA
+        with mmap.mmap(-1, len(content)) as buf:
+            buf.write(content)
+            buf.seek(0)
+            assert decompressing(buf).read() == DATA
+        assert open_reader(io.BytesIO(content), compression).read() == DATA
+
+    def test_decompressing_uncompressed(self):
+        """Test that uncompressed and unsniffable streams are returned as they are."""
+        stream = io.BufferedReader(io.BytesIO(DATA))
+        assert decompressing(stream) is stream
+        assert stream.read() == DATA
+        raw = io.BytesIO(gzip.compress(DATA))
+        assert decompressing(raw) is raw
+
+
+class TestOutput:
+    """Test cases for compressing output."""
+
+    @pytest.mark.parametrize("compression", sorted(DECOMPRESSORS))
+    def test_compressed(self, compression):
+        """Test that chunks written are compressed and the stream is left open."""
+        out = io.BytesIO()
+        with compressed(out, compression) as writer:
+            for start in range(0, len(DATA), 1000):
+                writer.write(DATA[start:start + 1000])
+        assert not out.closed
+        assert DECOMPRESSORS[compression](out.getvalue()) == DATA
+
+    def test_uncompressed(self):
+        """Test that no compression writes to the stream itself."""
+        out = io.BytesIO()
+        with compressed(out, None) as writer:
+            assert writer is out
+
+    def test_unknown(self):
+        """Test that bzip2 output and unknown formats are rejected."""
+        with pytest.raises(ValueError, match="unknown compression"):
+            with compressed(io.BytesIO(), 'bz2'):
+                pass
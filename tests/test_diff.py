@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Test suite for structural differences between plists."""
+
+import datetime
+import plistlib
+
+import pytest
+
+from pkg.__main__ import iter_buffer_events
+from pkg.diff import diff, digest, hash_tree, json_pointer, plain
+from pkg.events import iter_object_events
+
+
+def _tree(obj):
+    return hash_tree(iter_object_events(obj))
+
+
+def _diff(old, new):
+    return list(diff(_tree(old), _tree(new)))
+
+
+class TestHashTree:
+    """Test cases for hash_tree."""
+
+    def test_digests(self):
+        """Test that digests ignore dict order but not array order or types."""
+        obj = {"a": [1, 2.0, True, "x", b"y", datetime.datetime(2020, 1, 1)], "b": {}}
+        assert plain(_tree(obj)) == obj
+        reordered = {"b": {}, "a": obj["a"]}
+        assert digest(_tree(obj)) == digest(_tree(reordered))
+        for other in ({"a": obj["a"][::-1], "b": {}}, {"a": obj["a"], "b": []},
+                      {"a": [1.0, 2.0, True, "x", b"y", obj["a"][5]], "b": {}},
+                      {"a": obj["a"], "b": {}, "c": None}):
+            assert digest(_tree(obj)) != digest(_tree(other))
+
+    def test_shared_containers(self):
+        """Test that shared containers are built once."""
+        events = [("start_array", None), ("start_dict", 1), ("key", "k"), ("value", 2),
+                  ("end_dict", None), ("ref", 1), ("end_array", None)]
+        tree = hash_tree(events)
+        assert tree.children[0] is tree.children[1]
+        assert plain(tree) == [{"k": 2}, {"k": 2}]
+
+
+class TestDiff:
+    """Test cases for diff."""
+
+    def test_identical(self):
+        """Test that identical plists have no differences."""
+        obj = {"a": [1, {"b": b"data"}], "c": None}
+        assert _diff(obj, {"c": None, "a": [1, {"b": b"data"}]}) == []
+
+    def test_dict_changes(self):
+        """Test removed, added and replaced entries in document order."""
+        old = {"keep": {"deep": [1, 2]}, "gone": 1, "change": {"x": 1}}
+        new = {"keep": {"deep": [1, 2]}, "change": {"x": 2}, "new/key": [3]}
+        assert _diff(old, new) == [
+            {"op": "remove", "path": "/gone"},
+            {"op": "replace", "path": "/change/x", "value": 2},
+            {"op": "add", "path": "/new~1key", "value": [3]},
+        ]
+
+    @pytest.mark.parametrize("old, new, expected", [
+        ([1, 2, 3, 4], [1, 9, 2, 3, 4], [{"op": "add", "path": "/1", "value": 9}]),
+        ([1, 2, 3, 4], [1, 3, 4], [{"op": "remove", "path": "/1"}]),
+        ([1, 2, 3, 4], [1, 5, 6, 4], [{"op": "replace", "path": "/1", "value": 5},
+                                      {"op": "replace", "path": "/2", "value": 6}]),
+        ([1, 2, 3], [1], [{"op": "remove", "path": "/2"}, {"op": "remove", "path": "/1"}]),
+        ([], [[1]], [{"op": "add", "path": "/0", "value": [1]}]),
+    ])
+    def test_array_changes(self, old, new, expected):
+        """Test that common prefixes and suffixes of arrays are skipped."""
+        assert _diff(old, new) == expected
+
+    def test_type_changes(self):
+        """Test that values of different types or containers are replaced."""
+        assert _diff({"a": 1}, {"a": 1.0}) == [{"op": "replace", "path": "/a", "value": 1.0}]
+        assert _diff({"a": {}}, {"a": []}) == [{"op": "replace", "path": "/a", "value": []}]
+        assert _diff(1, "1") == [{"op": "replace", "path": "", "value": "1"}]
+
+    def test_binary_plist(self):
+        """Test diffing plists decoded on demand."""
+        old = plistlib.dumps({"a": [1, 2], "b": "x"}, fmt=plistlib.FMT_BINARY)
+        new = plistlib.dumps({"b": "y", "a": [1, 2]})
+        ops = list(diff(hash_tree(iter_buffer_events(old)), hash_tree(iter_buffer_events(new))))
+        assert ops == [{"op": "replace", "path": "/b", "value": "y"}]
+
+    def test_json_pointer(self):
+        """Test escaping of JSON Pointer components."""
+        assert json_pointer(()) == ""
+        assert json_pointer(("a/b", "c~d", 3)) == "/a~1b/c~0d/3"
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Test suite for key paths over plist event streams."""
+
+import pytest
+
+from pkg.events import (ANY_INDEX, iter_object_events, key_pruner,
+                        parse_path, parse_pattern, path_pruner, select_path)
+
+
+SAMPLE = {"a": [1, {"b": [5, 6]}, 3], "c": {}, "s": "x", "d.e": True}
+
+
+def _select(obj, path):
+    return list(select_path(iter_object_events(obj, prune=path_pruner(path)),
+                            path))
+
+
+class TestParsePath:
+    """Test cases for parse_path."""
+
+    @pytest.mark.parametrize("text, path", [
+        ('a.b[3].c', ('a', 'b', 3, 'c')),
+        ('.a', ('a',)),
+        ('[0][1]', (0, 1)),
+        ('.[2]', (2,)),
+        ('a["b.c"].d', ('a', 'b.c', 'd')),
+        ('a.3', ('a', '3')),
+        ('', ()),
+        ('.', ()),
+    ])
+    def test_valid(self, text, path):
+        """Test parsing of valid key paths."""
+        assert parse_path(text) == path
+
+    @pytest.mark.parametrize("text", [
+        'a..b', 'a.', 'a[x]', 'a[-1]', 'a]', 'a[0]b', 'a"b', '..',
+    ])
+    def test_invalid(self, text):
+        """Test that malformed key paths are rejected."""
+        with pytest.raises(ValueError, match="invalid key path"):
+            parse_path(text)
+
+
+class TestKeyPruner:
+    """Test cases for parse_pattern and key_pruner."""
+
+    def test_parse_pattern(self):
+        """Test parsing of key-path globs."""
+        assert parse_pattern('a.*.b[*]') == ('a', '*', 'b', ANY_INDEX)
+        assert parse_pattern('["x.*"][2]') == ('x.*', 2)
+        with pytest.raises(ValueError, match="invalid key path"):
+            parse_path('a[*]')
+
+    @pytest.mark.parametrize("includes, excludes, expected", [
+        (['a[1].b'], [], {"a": [{"b": [5, 6]}]}),
+        (['a[*]', 'd*'], [], {"a": [1, {"b": [5, 6]}, 3], "d.e": True}),
+        # [*] matches array indexes only, * dictionary keys too.
+        (['c[*]', 'a[1][*]'], [], {"a": [{}], "c": {}}),
+        (['c.*', 'a[1].*'], [], {"a": [{"b": [5, 6]}], "c": {}}),
+        ([], ['a[1]', 's'], {"a": [1, 3], "c": {}, "d.e": True}),
+        ([], ['?'], {"d.e": True}),
+        (['a.*'], ['a.*.b[0]'], {"a": [1, {"b": [6]}, 3]}),
+        (['a.1'], [], {"a": []}),
+        (['x'], [], {}),
+    ])
+    def test_filtering(self, includes, excludes, expected):
+        """Test that only the included objects and their ancestors are kept."""
+        prune = key_pruner([parse_pattern(p) for p in includes],
+                           [parse_pattern(p) for p in excludes])
+        assert list(iter_object_events(SAMPLE, prune=prune)) == \
+            list(iter_object_events(expected))
+
+    def test_no_patterns(self):
+        """Test that no predicate is needed without patterns."""
+        assert key_pruner() is None
+
+    def test_relative_to_path(self):
+        """Test that patterns apply within the object selected by path_pruner."""
+        path = ('a', 1)
+        prune = path_pruner(path, key_pruner([], [('b', 0)]))
+        events = select_path(iter_object_events(SAMPLE, prune=prune), path)
+        assert list(events) == list(iter_object_events({"b": [6]}))
+
+
+class TestSelectPath:
+    """Test cases for path_pruner and select_path."""
+
+    @pytest.mark.parametrize("path", [
+        (), ('a',), ('a', 1), ('a', 1, 'b', 1), ('a', 2), ('c',), ('d.e',),
+    ])
+    def test_existing_objects(self, path):
+        """Test that the selected events describe the object at the path."""
+        obj = SAMPLE
+        for node in path:
+            obj = obj[node]
+        assert _select(SAMPLE, path) == list(iter_object_events(obj))
+
+    @pytest.mark.parametrize("path", [
+        ('x',), ('a', 9), ('a', 'b'), ('c', 0), ('s', 0), ('c', 'z'), (0,),
+    ])
+    def test_missing_objects(self, path):
+        """Test that a missing object selects a single null value."""
+        assert _select(SAMPLE, path) == [("value", None)]
+
+    def test_pruned_subtrees_not_visited(self):
+        """Test that only objects on the path or inside its target are kept."""
+        visited = []
+        prune = path_pruner(('a', 1))
+
+        def record(node):
+            visited.append(node)
+            return prune(node)
+
+        events = list(iter_object_events(SAMPLE, prune=record))
+        assert visited == [('a',), ('a', 0), ('a', 1), ('a', 1, 'b'),
+                           ('a', 1, 'b', 0), ('a', 1, 'b', 1), ('a', 2),
+                           ('c',), ('s',), ('d.e',)]
+        assert ("value", 1) not in events and ("key", "c") not in events
+
+    def test_stops_after_object(self):
+        """Test that the stream is not consumed past the selected object."""
+        events = iter_object_events([[1], [2]], prune=path_pruner((0,)))
+        assert list(select_path(events, (0,))) == [
+            ("start_array", None), ("value", 1), ("end_array", None)]
+        assert next(events) == ("end_array", None)
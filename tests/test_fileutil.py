@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Test suite for filesystem helpers."""
+
+import os
+import tempfile
+
+import pytest
+
+from pkg.fileutil import atomic_open
+
+
+class TestAtomicOpen:
+    """Test cases for atomic_open."""
+
+    def test_replaces_file(self):
+        """Test that the file is replaced when the block succeeds."""
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'out.json')
+            with open(path, 'wb') as f:
+                f.write(b'old')
+            with atomic_open(path) as f:
+                f.write(b'new')
+            with open(path, 'rb') as f:
+                assert f.read() == b'new'
+            assert os.listdir(root) == ['out.json']
+
+    def test_failure_leaves_file_untouched(self):
+        """Test that nothing is replaced or left behind on failure."""
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'out.json')
+            with open(path, 'wb') as f:
+                f.write(b'old')
+            with pytest.raises(RuntimeError):
+                with atomic_open(path) as f:
+                    f.write(b'partial')
+                    raise RuntimeError("interrupted")
+            with open(path, 'rb') as f:
+                assert f.read() == b'old'
+            assert os.listdir(root) == ['out.json']
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Test suite for resolving NSKeyedArchiver object graphs."""
+
+import datetime
+import json
+import plistlib
+from plistlib import UID
+
+import pytest
+
+from pkg.events import iter_object_events, path_pruner, select_path
+from pkg.keyed import is_keyed_archive, iter_events
+from pkg.writer import iterencode
+
+
+def _archive(objects, top=None):
+    return {"$version": 100000, "$archiver": "NSKeyedArchiver",
+            "$top": top or {"root": UID(1)}, "$objects": ["$null"] + objects}
+
+
+def _class(name):
+    return {"$classname": name, "$classes": [name, "NSObject"]}
+
+
+# root: {"point": <Point x=1 label="p">, "list": [<Point>, "text", null],
+#        "when": <date>, "again": <Point>}
+ARCHIVE = _archive([
+    {"$class": UID(2), "NS.keys": [UID(3), UID(4), UID(5), UID(6)],
+     "NS.objects": [UID(7), UID(10), UID(13), UID(7)]},
+    _class("NSMutableDictionary"),
+    "point", "list", "when", "again",
+    {"$class": UID(8), "x": 1, "label": UID(9), "none": UID(0)},
+    _class("Point"),
+    "p",
+    {"$class": UID(11), "NS.objects": [UID(7), UID(12), UID(0)]},
+    _class("NSArray"),
+    {"$class": UID(14), "NS.string": "text"},
+    {"$class": UID(15), "NS.time": 86400.0},
+    _class("NSMutableString"),
+    _class("NSDate"),
+])
+
+POINT = {"$class": "Point", "x": 1, "label": "p", "none": None}
+
+RESOLVED = {"root": {"point": POINT, "list": [POINT, "text", None],
+                     "when": datetime.datetime(2001, 1, 2), "again": POINT}}
+
+
+def _xml_uids(obj):
+    """Write UIDs as the CF$UID dicts of XML keyed archives."""
+    if isinstance(obj, UID):
+        return {"CF$UID": obj.data}
+    if isinstance(obj, dict):
+        return {key: _xml_uids(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_xml_uids(value) for value in obj]
+    return obj
+
+
+class TestIterEvents:
+    """Test cases for iter_events."""
+
+    def test_is_keyed_archive(self):
+        """Test recognizing keyed archives."""
+        assert is_keyed_archive(ARCHIVE)
+        assert not is_keyed_archive({"$archiver": "Other", "$objects": [], "$top": {}})
+        assert not is_keyed_archive([ARCHIVE])
+
+    @pytest.mark.parametrize("archive", [ARCHIVE, _xml_uids(ARCHIVE)])
+    def test_resolved(self, archive):
+        """Test resolving UIDs, Foundation classes and shared objects."""
+        events = list(iter_events(archive))
+        # The Point is shared: its later references are ref events.
+        assert events.count(("start_dict", 7)) == 1
+        assert events.count(("ref", 7)) == 2
+        expected = list(iter_object_events(RESOLVED))
+        shared = events.index(("start_dict", 7))
+        point = list(iter_object_events(POINT))
+        expanded = events[:shared] + [("start_dict", None)] + events[shared + 1:]
+        while ("ref", 7) in expanded:
+            position = expanded.index(("ref", 7))
+            expanded[position:position + 1] = point
+        assert expanded == expected
+
+    def test_pruned(self):
+        """Test that pruning skips subtrees and shares no objects."""
+        path = ("root", "list", 1)
+        events = select_path(iter_events(ARCHIVE, prune=path_pruner(path)), path)
+        assert list(events) == [("value", "text")]
+        events = list(iter_events(ARCHIVE, prune=path_pruner(("root", "again"))))
+        assert ("ref", 7) not in events
+        assert events[:4] == [("start_dict", None), ("key", "root"),
+                              ("start_dict", None), ("key", "again")]
+
+    def test_circular_reference(self):
+        """Test that a reference back to an enclosing object is a marker."""
+        # A parent and child referring to each other.
+        archive = _archive([{"$class": UID(3), "child": UID(2)},
+                            {"$class": UID(3), "parent": UID(1)},
+                            _class("Node")])
+        assert json.loads(''.join(iterencode(iter_events(archive)))) == {"root": {
+            "$class": "Node",
+            "child": {"$class": "Node", "parent": {"$ref": 1}}}}
+        # An object containing itself.
+        archive = _archive([{"$class": UID(2), "NS.objects": [UID(1)]},
+                            _class("NSArray")])
+        assert json.loads(''.join(iterencode(iter_events(archive)))) == {
+            "root": [{"$ref": 1}]}
+
+    def test_invalid_uid(self):
+        """Test that a UID past the end of $objects is rejected."""
+        with pytest.raises(ValueError, match="out of range"):
+            list(iter_events(_archive([], top={"root": UID(5)})))
+
+    def test_container_key(self):
+        """Test that a dictionary key resolving to a container is rejected."""
+        archive = _archive([{"$class": UID(2), "NS.keys": [UID(3)], "NS.objects": [UID(0)]},
+                            _class("NSDictionary"), ["not", "a", "key"]])
+        with pytest.raises(ValueError, match="key"):
+            list(iter_events(archive))
+
+    def test_binary_archive(self):
+        """Test that UIDs survive a binary plist round trip."""
+        data = plistlib.dumps(ARCHIVE, fmt=plistlib.FMT_BINARY, sort_keys=False)
+        events = list(iter_events(plistlib.loads(data)))
+        assert events == list(iter_events(ARCHIVE))
@@ -1,18 +1,27 @@
 #!/usr/bin/env python3
 """Comprehensive test suite for plist2json."""
 
+import bz2
+import gzip
 import io
 import json
+import lzma
 import os
 import plistlib
 import pytest
 import runpy
+import socket
 import subprocess
 import sys
 import tempfile
+import threading
+import zipfile
 from unittest.mock import patch, MagicMock
 
-from pkg.__main__ import main, read_plist, serialize_default
+from pkg.__main__ import (convert_request, looks_like_plist, main, read_plist,
+                          serialize_default)
+from pkg.bplist import BinaryPlist
+from pkg.server import ConversionServer
 
 
 class TestSerializeDefault:
@@ -59,12 +68,36 @@ class TestReadPlist:
         """Test reading plist from stdin."""
         test_data = {"key": "value", "list": [1, 2, 3]}
         plist_bytes = plistlib.dumps(test_data)
-        plist_str = plist_bytes.decode('utf-8')
         
-        with patch('sys.stdin.read', return_value=plist_str):
+        with patch('sys.stdin', new=io.TextIOWrapper(io.BytesIO(plist_bytes))):
             result = read_plist(None)
             assert result == test_data
     
+    def test_read_plist_binary_from_stdin_pipe(self):
+        """Test reading a binary plist from a piped stdin."""
+        test_data = {"key": "value", "list": list(range(5000))}
+        plist_bytes = plistlib.dumps(test_data, fmt=plistlib.FMT_BINARY)
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(plist_bytes)))
+        
+        with patch('sys.stdin', new=stdin):
+            result = read_plist(None)
+            assert result == test_data
+    
+    def test_read_plist_binary_from_stdin_file(self):
+        """Test reading a binary plist from a file redirected to stdin."""
+        test_data = {"key": "value", "list": [1, 2, 3]}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            temp_path = f.name
+        
+        try:
+            with open(temp_path, 'rb') as f:
+                with patch('sys.stdin', new=io.TextIOWrapper(f)):
+                    result = read_plist(None)
+                    assert result == test_data
+        finally:
+            os.unlink(temp_path)
+    
     def test_read_plist_complex_data(self):
         """Test reading plist with complex nested data."""
         test_data = {
@@ -146,10 +179,9 @@ class TestMain:
         """Test main with stdin input."""
         test_data = {"key": "value", "number": 42}
         plist_bytes = plistlib.dumps(test_data)
-        plist_str = plist_bytes.decode('utf-8')
         
         with patch('sys.argv', ['plist2json']):
-            with patch('sys.stdin.read', return_value=plist_str):
+            with patch('sys.stdin', new=io.TextIOWrapper(io.BytesIO(plist_bytes))):
                 with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
                     result = main()
                     output = mock_stdout.getvalue()
@@ -160,16 +192,59 @@ class TestMain:
         """Test main with stdin input and indentation."""
         test_data = {"key": "value"}
         plist_bytes = plistlib.dumps(test_data)
-        plist_str = plist_bytes.decode('utf-8')
         
         with patch('sys.argv', ['plist2json', '-i', '4']):
-            with patch('sys.stdin.read', return_value=plist_str):
+            with patch('sys.stdin', new=io.TextIOWrapper(io.BytesIO(plist_bytes))):
                 with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
                     result = main()
                     output = mock_stdout.getvalue()
                     assert result == 0
                     assert json.loads(output) == test_data
     
+    def test_main_with_stdin_formats(self):
+        """Test main with binary and XML plists on a piped stdin."""
+        test_data = {"key": "café", "list": list(range(3000)), "nested": {}}
+        for fmt in (plistlib.FMT_BINARY, plistlib.FMT_XML):
+            plist_bytes = plistlib.dumps(test_data, fmt=fmt, sort_keys=False)
+            stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(plist_bytes)))
+            with patch('sys.argv', ['plist2json']):
+                with patch('sys.stdin', new=stdin):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        result = main()
+                        output = mock_stdout.getvalue()
+                        assert result == 0
+                        assert output == json.dumps(test_data, ensure_ascii=False) + '\n'
+    
+    def test_main_with_stdin_regular_file(self):
+        """Test main with plist files redirected to stdin."""
+        test_data = {"key": "value", "list": [1, 2, 3]}
+        for fmt in (plistlib.FMT_BINARY, plistlib.FMT_XML):
+            with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+                plistlib.dump(test_data, f, fmt=fmt)
+                temp_path = f.name
+            
+            try:
+                with open(temp_path, 'rb') as f:
+                    with patch('sys.argv', ['plist2json']):
+                        with patch('sys.stdin', new=io.TextIOWrapper(f)):
+                            with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                                result = main()
+                                assert result == 0
+                                assert json.loads(mock_stdout.getvalue()) == test_data
+            finally:
+                os.unlink(temp_path)
+    
+    def test_main_with_invalid_stdin(self):
+        """Test main with non-plist data on stdin."""
+        for stdin_bytes in (b"This is not a valid plist file", b""):
+            stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(stdin_bytes)))
+            with patch('sys.argv', ['plist2json']):
+                with patch('sys.stdin', new=stdin):
+                    with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                        result = main()
+                        assert result == 1
+                        assert "Invalid plist format" in mock_stderr.getvalue()
+    
     def test_main_file_not_found(self):
         """Test main with non-existent file."""
         with patch('sys.argv', ['plist2json', 'nonexistent.plist']):
@@ -381,6 +456,488 @@ class TestMain:
         finally:
             os.unlink(temp_path)
     
+    def test_main_with_binary_plist(self):
+        """Test main with a binary plist decoded on demand."""
+        test_data = {"key": "value", "array": [1, 2.5, True], "nested": {"a": {}}}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY,
+                          sort_keys=False)
+            temp_path = f.name
+
+        try:
+            for indent in (None, '2'):
+                argv = ['plist2json', temp_path]
+                if indent is not None:
+                    argv[1:1] = ['-i', indent]
+                with patch('sys.argv', argv):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        result = main()
+                        output = mock_stdout.getvalue()
+                        assert result == 0
+                        assert output == json.dumps(
+                            test_data, indent=indent and int(indent)) + '\n'
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_binary_plist_size_threshold(self):
+        """Test that small binary plists are decoded whole and large ones streamed."""
+        shared = {"name": "shared", "values": [1, 2, 3]}
+        test_data = {"first": shared, "second": [shared, shared], "data": b"\x00"}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            temp_path = f.name
+        
+        def run(*args):
+            with patch('sys.argv', ['plist2json'] + list(args) + [temp_path]):
+                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                    assert main() == 0
+                    return mock_stdout.getvalue()
+        
+        try:
+            decode = BinaryPlist.decode
+            for args in ((), ('-p', 'second')):
+                with patch.object(BinaryPlist, 'decode', autospec=True,
+                                  side_effect=decode) as mock_decode:
+                    small = run(*args)
+                    assert mock_decode.called
+                with patch('pkg.__main__.FAST_PATH_SIZE', 0):
+                    # Large plists are streamed without looking for shared
+                    # objects first, which only --unarchive does.
+                    with patch.object(BinaryPlist, 'decode') as mock_decode, \
+                            patch.object(BinaryPlist, 'shared_refs') as mock_shared:
+                        assert run(*args) == small
+                        assert not mock_decode.called
+                        assert not mock_shared.called
+            assert json.loads(small) == [shared, shared]
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_unarchive_shares_streamed_containers(self):
+        """Test that only --unarchive looks for shared containers in a streamed plist."""
+        shared = {"values": [1, 2, 3]}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump([shared, shared], f, fmt=plistlib.FMT_BINARY)
+            temp_path = f.name
+        try:
+            shared_refs = BinaryPlist.shared_refs
+            for args, called in (([], False), (['--unarchive'], True)):
+                with patch('sys.argv', ['plist2json'] + args + [temp_path]), \
+                        patch('pkg.__main__.FAST_PATH_SIZE', 0), \
+                        patch('sys.stdout', new=io.StringIO()) as mock_stdout, \
+                        patch.object(BinaryPlist, 'shared_refs', autospec=True,
+                                     side_effect=shared_refs) as mock_shared:
+                    assert main() == 0
+                    assert mock_shared.called is called
+                    assert json.loads(mock_stdout.getvalue()) == [shared, shared]
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_with_invalid_binary_plist(self):
+        """Test main with a corrupt binary plist."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            f.write(b"bplist00 truncated")
+            temp_path = f.name
+
+        try:
+            with patch('sys.argv', ['plist2json', temp_path]):
+                with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                    result = main()
+                    assert result == 1
+                    assert "Invalid plist format" in mock_stderr.getvalue()
+        finally:
+            os.unlink(temp_path)
+
+    def test_main_writes_bytes_to_stdout_buffer(self):
+        """Test that output goes to the binary stdout buffer as UTF-8."""
+        test_data = {"key": "café", "list": list(range(50))}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f)
+            temp_path = f.name
+
+        try:
+            stdout = io.TextIOWrapper(io.BytesIO(), encoding='ascii')
+            with patch('sys.argv', ['plist2json', '--buffer-size', '16', temp_path]):
+                with patch('sys.stdout', new=stdout):
+                    result = main()
+                    output = stdout.buffer.getvalue().decode('utf-8')
+                    assert result == 0
+                    assert json.loads(output) == test_data
+                    assert output.endswith('\n')
+        finally:
+            os.unlink(temp_path)
+
+    def test_main_invalid_buffer_size(self):
+        """Test that a non-positive buffer size is rejected."""
+        with patch('sys.argv', ['plist2json', '--buffer-size', '0']):
+            with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+                assert exc_info.value.code == 2
+                assert "invalid positive integer" in mock_stderr.getvalue()
+
+    def test_main_with_cache(self):
+        """Test that unchanged files are served from the conversion cache."""
+        test_data = {"key": "value", "list": [1, 2, 3]}
+        with tempfile.TemporaryDirectory() as root:
+            temp_path = os.path.join(root, 'input.plist')
+            with open(temp_path, 'wb') as f:
+                plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            cache_dir = os.path.join(root, 'cache')
+            outputs = []
+            for indent in ('2', '2', '4'):
+                argv = ['plist2json', '--cache-dir', cache_dir, '-i', indent, temp_path]
+                with patch('sys.argv', argv):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        assert main() == 0
+                        outputs.append(mock_stdout.getvalue())
+            assert outputs[0] == outputs[1] == json.dumps(test_data, indent=2) + '\n'
+            assert outputs[2] == json.dumps(test_data, indent=4) + '\n'
+            objects = os.path.join(cache_dir, 'objects')
+            assert sum(len(os.listdir(os.path.join(objects, d)))
+                       for d in os.listdir(objects)) == 2
+    
+    def test_main_cache_hit_to_text_stdout(self):
+        """Test copying a large cached conversion to a text-only stdout."""
+        # Characters straddle the 1 MiB chunks the cached JSON is copied in.
+        test_data = "\u00e9" * 600000
+        with tempfile.TemporaryDirectory() as root:
+            temp_path = os.path.join(root, 'input.plist')
+            with open(temp_path, 'wb') as f:
+                plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            argv = ['plist2json', '--cache-dir', os.path.join(root, 'cache'), temp_path]
+            for _ in range(2):
+                with patch('sys.argv', argv):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        assert main() == 0
+                        assert json.loads(mock_stdout.getvalue()) == test_data
+    
+    def test_main_with_key_paths(self):
+        """Test extracting objects by key path from binary and XML plists."""
+        test_data = {"a": {"b": [1, 2, {"c": "deep"}]}, "key.with.dots": True}
+        for fmt in (plistlib.FMT_BINARY, plistlib.FMT_XML):
+            with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+                plistlib.dump(test_data, f, fmt=fmt)
+                temp_path = f.name
+
+            try:
+                argv = ['plist2json', '--path', 'a.b[2].c', '-p', 'a.b',
+                        '-p', '["key.with.dots"]', '-p', 'a.missing', temp_path]
+                with patch('sys.argv', argv):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        result = main()
+                        output = mock_stdout.getvalue()
+                        assert result == 0
+                        assert output == '"deep"\n[1, 2, {"c": "deep"}]\ntrue\nnull\n'
+            finally:
+                os.unlink(temp_path)
+
+    def test_main_key_paths_from_stdin(self):
+        """Test extracting several objects from a plist piped to stdin."""
+        plist_bytes = plistlib.dumps({"a": [1, 2], "b": "x"})
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(plist_bytes)))
+        with patch('sys.argv', ['plist2json', '-p', 'b', '-p', 'a[1]']):
+            with patch('sys.stdin', new=stdin):
+                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                    assert main() == 0
+                    assert mock_stdout.getvalue() == '"x"\n2\n'
+
+    def test_main_invalid_key_path(self):
+        """Test that a malformed key path is rejected."""
+        with patch('sys.argv', ['plist2json', '--path', 'a..b']):
+            with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+                assert exc_info.value.code == 2
+                assert "invalid key path" in mock_stderr.getvalue()
+    
+    def test_main_stats(self):
+        """Test reporting conversion statistics on stderr."""
+        test_data = {"a": [1, 2.5, "x"], "b": b"data"}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f)
+            temp_path = f.name
+        
+        try:
+            with patch('sys.argv', ['plist2json', '--stats', temp_path]):
+                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                    with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                        assert main() == 0
+            output = mock_stdout.getvalue()
+            stats = json.loads(mock_stderr.getvalue())
+            assert stats["files"] == 1
+            assert stats["bytes_in"] == os.path.getsize(temp_path)
+            assert stats["bytes_out"] == len(output.encode('utf-8'))
+            assert stats["objects"] == {"array": 1, "data": 1, "dict": 1, "integer": 1,
+                                        "key": 2, "real": 1, "string": 1}
+            assert stats["default_calls"] == 1
+            assert set(stats["wall_seconds"]) == {"read", "parse", "serialize", "write", "cache",
+                                                  "total"}
+            assert stats["wall_seconds"]["total"] >= stats["wall_seconds"]["parse"]
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_stats_with_cache(self):
+        """Test that output bytes are counted once on cache misses and hits, and cache time."""
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump({"a": [1, 2, 3], "b": "text"}, f)
+            temp_path = f.name
+        
+        try:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                reports = []
+                for argv in ([], ['--cache-dir', cache_dir], ['--cache-dir', cache_dir]):
+                    with patch('sys.argv', ['plist2json', '--stats'] + argv + [temp_path]):
+                        with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                            with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                                assert main() == 0
+                    reports.append(json.loads(mock_stderr.getvalue()))
+            size = len(mock_stdout.getvalue().encode('utf-8'))
+            assert [report["bytes_out"] for report in reports] == [size] * 3
+            assert [(report["cache_misses"], report["cache_hits"]) for report in reports[1:]] == [
+                (1, 0), (0, 1)]
+            assert reports[0]["wall_seconds"]["cache"] == 0
+            assert all(report["wall_seconds"]["cache"] > 0 for report in reports[1:])
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_data_output(self):
+        """Test writing data objects as base64 and as files in --data-dir."""
+        blob = bytes(range(256)) * 20
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump({"small": b"abc", "large": blob}, f, fmt=plistlib.FMT_BINARY)
+            temp_path = f.name
+        
+        try:
+            with tempfile.TemporaryDirectory() as data_dir:
+                for argv in (['--data', 'base64'], ['--data-dir', data_dir]):
+                    with patch('sys.argv', ['plist2json'] + argv + [temp_path]):
+                        with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                            assert main() == 0
+                            output = json.loads(mock_stdout.getvalue())
+                    assert output["small"] == "YWJj"
+                large = output["large"]
+                assert large["size"] == len(blob)
+                with open(os.path.join(data_dir, large["$data"]), 'rb') as f:
+                    assert f.read() == blob
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_ndjson(self):
+        """Test writing the items of the root container as NDJSON lines."""
+        test_data = {"rows": [{"id": 1}, {"id": 2}], "name": "x"}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f)
+            temp_path = f.name
+        
+        try:
+            for argv, expected in ((['--ndjson'], '{"name": "x"}\n{"rows": [{"id": 1}, {"id": 2}]}\n'),
+                                   (['--ndjson', '-p', 'rows'], '{"id": 1}\n{"id": 2}\n')):
+                with patch('sys.argv', ['plist2json'] + argv + [temp_path]):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        assert main() == 0
+                        assert mock_stdout.getvalue() == expected
+            with patch('sys.argv', ['plist2json', '--ndjson', '-i', '2', temp_path]):
+                with patch('sys.stderr', new=io.StringIO()):
+                    with pytest.raises(SystemExit) as exc_info:
+                        main()
+                    assert exc_info.value.code == 2
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_stream(self):
+        """Test converting many plists concatenated on stdin."""
+        plist_bytes = (plistlib.dumps({"a": 1}) + plistlib.dumps([2], fmt=plistlib.FMT_BINARY)
+                       + b'<plist><dict><key>x</key></plist>' + plistlib.dumps("ok"))
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(plist_bytes)))
+        with patch('sys.argv', ['plist2json', '--stream']):
+            with patch('sys.stdin', new=stdin):
+                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                    assert main() == 1
+                    records = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+        assert records[:2] == [{"index": 0, "data": {"a": 1}}, {"index": 1, "data": [2]}]
+        assert records[2]["index"] == 2 and "error" in records[2]
+        assert records[3] == {"index": 3, "data": "ok"}
+    
+    def test_main_archive(self):
+        """Test converting the plists inside a zip archive."""
+        with tempfile.TemporaryDirectory() as root:
+            archive_path = os.path.join(root, 'App.ipa')
+            with zipfile.ZipFile(archive_path, 'w') as archive:
+                archive.writestr('Payload/Info.plist', plistlib.dumps({"id": 1}))
+                archive.writestr('Payload/embedded', plistlib.dumps([2], fmt=plistlib.FMT_BINARY))
+                archive.writestr('Payload/notes.txt', b'not a plist')
+                archive.writestr('Payload/state.plist.gz', gzip.compress(plistlib.dumps([3])))
+            for argv, expected in (
+                    ([], [{"member": "Payload/Info.plist", "data": {"id": 1}},
+                          {"member": "Payload/embedded", "data": [2]},
+                          {"member": "Payload/state.plist.gz", "data": [3]}]),
+                    (['--member', '*/Info.plist', '-p', 'id'],
+                     [{"member": "Payload/Info.plist", "data": 1}])):
+                with patch('sys.argv', ['plist2json', '-j', '1', '--archive'] + argv + [archive_path]):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        assert main() == 0
+                        records = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+                assert records == expected
+    
+    def test_main_unarchive(self):
+        """Test resolving a keyed archive with --unarchive."""
+        archive = {"$archiver": "NSKeyedArchiver", "$version": 100000,
+                   "$top": {"root": plistlib.UID(1)},
+                   "$objects": ["$null",
+                                {"$class": plistlib.UID(3), "NS.objects": [plistlib.UID(2)] * 2},
+                                {"$class": plistlib.UID(4), "name": "shared"},
+                                {"$classname": "NSArray"}, {"$classname": "Item"}]}
+        item = {"$class": "Item", "name": "shared"}
+        for fmt in (plistlib.FMT_BINARY, plistlib.FMT_XML):
+            if fmt is plistlib.FMT_XML:
+                # XML plists hold UIDs as CF$UID dictionaries.
+                archive = json.loads(json.dumps(archive, default=lambda uid: {"CF$UID": uid.data}))
+            with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+                plistlib.dump(archive, f, fmt=fmt)
+                temp_path = f.name
+            try:
+                for argv, expected in (([], {"root": [item, item]}),
+                                       (['-i', '2', '-p', 'root[1].name'], "shared")):
+                    with patch('sys.argv', ['plist2json', '--unarchive'] + argv + [temp_path]):
+                        with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                            assert main() == 0
+                            assert json.loads(mock_stdout.getvalue()) == expected
+            finally:
+                os.unlink(temp_path)
+    
+    def test_main_diff(self):
+        """Test writing the differences between two plists with --diff."""
+        old = {"settings": {"volume": 5, "mute": False}, "items": [1, 2, 3], "legacy": "x"}
+        new = {"items": [1, 2, 4, 3], "settings": {"mute": False, "volume": 7}}
+        paths = []
+        try:
+            for obj, fmt in ((old, plistlib.FMT_BINARY), (new, plistlib.FMT_XML)):
+                with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+                    plistlib.dump(obj, f, fmt=fmt)
+                    paths.append(f.name)
+            patch_ops = [{"op": "remove", "path": "/legacy"},
+                         {"op": "add", "path": "/items/2", "value": 4},
+                         {"op": "replace", "path": "/settings/volume", "value": 7}]
+            for argv, expected in (([], patch_ops),
+                                   (['-p', 'settings'], [{"op": "replace", "path": "/volume",
+                                                          "value": 7}])):
+                with patch('sys.argv', ['plist2json', '--diff'] + argv + paths):
+                    with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                        assert main() == 0
+                        assert json.loads(mock_stdout.getvalue()) == expected
+            with patch('sys.argv', ['plist2json', '--diff', '--ndjson', paths[0], paths[0]]):
+                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                    assert main() == 0
+                    assert mock_stdout.getvalue() == ""
+            with patch('sys.argv', ['plist2json', '--diff', paths[0], 'nonexistent.plist']):
+                with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                    assert main() == 1
+                    assert "nonexistent.plist" in mock_stderr.getvalue()
+            with patch('sys.argv', ['plist2json', '--diff', paths[0]]):
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+                assert exc_info.value.code == 2
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_main_include_exclude(self):
+        """Test keeping and leaving out key-path globs with --include and --exclude."""
+        test_data = {"General": {"Name": "x", "Debug": {"level": 3}},
+                     "Sections": [{"name": "a", "items": [1, 2]}, {"name": "b"}],
+                     "Huge": list(range(100))}
+        cases = (
+            (['--include', 'General', '--include', 'Sections[*].name',
+              '--exclude', 'General.Debug'],
+             {"General": {"Name": "x"}, "Sections": [{"name": "a"}, {"name": "b"}]}),
+            (['--exclude', 'H*', '--exclude', '*.Debug'],
+             {"General": {"Name": "x"}, "Sections": test_data["Sections"]}),
+            (['-p', 'Sections', '--include', '[*].items'], [{"items": [1, 2]}, {}]),
+        )
+        for fmt in (plistlib.FMT_BINARY, plistlib.FMT_XML):
+            with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+                plistlib.dump(test_data, f, fmt=fmt)
+                temp_path = f.name
+            try:
+                for argv, expected in cases:
+                    with patch('sys.argv', ['plist2json'] + argv + [temp_path]):
+                        with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                            assert main() == 0
+                            assert json.loads(mock_stdout.getvalue()) == expected
+            finally:
+                os.unlink(temp_path)
+        with patch('sys.argv', ['plist2json', '--include', 'a[x', 'in.plist']):
+            with patch('sys.stderr', new=io.StringIO()):
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+                assert exc_info.value.code == 2
+    
+    def test_main_compressed_input(self):
+        """Test converting gzip, bzip2 and xz plists from files and stdin."""
+        test_data = {"name": "x", "items": [1, 2, {"deep": True}]}
+        for fmt in (plistlib.FMT_BINARY, plistlib.FMT_XML):
+            for compress in (gzip.compress, bz2.compress, lzma.compress):
+                with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.gz') as f:
+                    f.write(compress(plistlib.dumps(test_data, fmt=fmt)))
+                    temp_path = f.name
+                try:
+                    with patch('sys.argv', ['plist2json', temp_path]):
+                        with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                            assert main() == 0
+                            assert json.loads(mock_stdout.getvalue()) == test_data
+                    with patch('sys.argv', ['plist2json', '-p', 'items[2].deep']):
+                        with open(temp_path, 'rb') as stdin:
+                            with patch('sys.stdin', new=io.TextIOWrapper(stdin)):
+                                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                                    assert main() == 0
+                                    assert json.loads(mock_stdout.getvalue()) is True
+                    assert read_plist(temp_path) == test_data
+                finally:
+                    os.unlink(temp_path)
+    
+    def test_main_compressed_binary_data(self):
+        """Test that data in a compressed binary plist is written as bytes."""
+        content = gzip.compress(plistlib.dumps({"data": b"\x00\x01"}, fmt=plistlib.FMT_BINARY))
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist.gz') as f:
+            f.write(content)
+            temp_path = f.name
+        try:
+            with patch('sys.argv', ['plist2json', '--path', 'data', temp_path]):
+                with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                    assert main() == 0
+                    assert json.loads(mock_stdout.getvalue()) == "<<non-serializable: bytes>>"
+            assert read_plist(temp_path) == {"data": b"\x00\x01"}
+        finally:
+            os.unlink(temp_path)
+    
+    def test_main_compress_output(self):
+        """Test compressing the JSON written to stdout with --compress."""
+        test_data = {"key": "value", "list": list(range(100))}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            temp_path = f.name
+        try:
+            for name, decompress in (('gzip', gzip.decompress), ('xz', lzma.decompress)):
+                for argv, expected in (([temp_path], test_data),
+                                       ([temp_path, temp_path, '-j', '1'], None)):
+                    out = io.BytesIO()
+                    stdout = io.TextIOWrapper(out)
+                    with patch('sys.argv', ['plist2json', '--compress', name] + argv):
+                        with patch('sys.stdout', new=stdout):
+                            assert main() == 0
+                    lines = decompress(out.getvalue()).splitlines()
+                    if expected is not None:
+                        assert json.loads(lines[0]) == expected
+                    else:
+                        assert [json.loads(line)["data"] for line in lines] == [test_data] * 2
+        finally:
+            os.unlink(temp_path)
+        with patch('sys.argv', ['plist2json', '--compress', 'bz2', 'in.plist']):
+            with patch('sys.stderr', new=io.StringIO()):
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+                assert exc_info.value.code == 2
+    
     def test_main_with_special_characters_in_filename(self):
         """Test main with special characters in filename."""
         test_data = {"key": "value"}
@@ -400,6 +957,416 @@ class TestMain:
             os.unlink(temp_path)
 
 
+class TestBatch:
+    """Test cases for converting multiple files."""
+    
+    def _make_files(self, count):
+        paths = []
+        for i in range(count):
+            with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+                fmt = plistlib.FMT_BINARY if i % 2 else plistlib.FMT_XML
+                plistlib.dump({"index": i, "name": f"file {i}"}, f, fmt=fmt)
+                paths.append(f.name)
+        return paths
+    
+    def _run(self, argv, stdin=None):
+        with patch('sys.argv', ['plist2json'] + argv):
+            with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                    if stdin is not None:
+                        with patch('sys.stdin', new=io.StringIO(stdin)):
+                            result = main()
+                    else:
+                        result = main()
+        records = [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+        return result, records, mock_stderr.getvalue()
+    
+    def test_batch_input_order(self):
+        """Test converting many files with results in input order."""
+        paths = self._make_files(6)
+        try:
+            for jobs in ('1', '2'):
+                result, records, _ = self._run(['--jobs', jobs] + paths)
+                assert result == 0
+                assert [r["path"] for r in records] == paths
+                assert [r["data"]["index"] for r in records] == list(range(6))
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_batch_completion_order(self):
+        """Test converting many files with results in completion order."""
+        paths = self._make_files(6)
+        try:
+            result, records, _ = self._run(['-j', '2', '--order', 'completion'] + paths)
+            assert result == 0
+            assert sorted(r["path"] for r in records) == sorted(paths)
+            for record in records:
+                assert record["data"]["index"] == paths.index(record["path"])
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_batch_errors_do_not_abort(self):
+        """Test that per-file errors are reported without aborting the batch."""
+        paths = self._make_files(2)
+        argv = ['-j', '1', paths[0], 'nonexistent.plist', paths[1]]
+        try:
+            result, records, errors = self._run(argv)
+            assert result == 1
+            assert len(records) == 3
+            assert records[1] == {"path": "nonexistent.plist",
+                                  "error": "File 'nonexistent.plist' not found"}
+            assert records[2]["data"]["index"] == 1
+            assert "nonexistent.plist" in errors
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_batch_files_from(self):
+        """Test reading input paths from a file and from stdin."""
+        paths = self._make_files(3)
+        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.txt') as f:
+            f.write('\n'.join(paths[1:]) + '\n\n')
+            list_path = f.name
+        try:
+            result, records, _ = self._run(['-j', '1', '--files-from', list_path, paths[0]])
+            assert result == 0
+            assert [r["path"] for r in records] == [paths[0]] + paths[1:]
+            
+            result, records, _ = self._run(['-j', '1', '--files-from', '-'],
+                                           stdin='\n'.join(paths))
+            assert result == 0
+            assert [r["path"] for r in records] == paths
+        finally:
+            for path in paths + [list_path]:
+                os.unlink(path)
+    
+    def test_batch_files_from_missing(self):
+        """Test a missing --files-from list."""
+        result, records, errors = self._run(['--files-from', 'nonexistent.txt'])
+        assert result == 1
+        assert records == []
+        assert "nonexistent.txt" in errors
+    
+    def test_batch_key_path(self):
+        """Test extracting one key path from every file."""
+        paths = self._make_files(3)
+        try:
+            result, records, _ = self._run(['-j', '1', '-p', 'name'] + paths)
+            assert result == 0
+            assert [r["data"] for r in records] == ["file 0", "file 1", "file 2"]
+            with patch('sys.argv', ['plist2json', '-p', 'a', '-p', 'b'] + paths):
+                with patch('sys.stderr', new=io.StringIO()):
+                    with pytest.raises(SystemExit) as exc_info:
+                        main()
+                    assert exc_info.value.code == 2
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_batch_stats(self):
+        """Test per-file and total statistics for a batch."""
+        paths = self._make_files(3)
+        try:
+            result, records, errors = self._run(['-j', '2', '--stats'] + paths)
+            assert result == 0
+            assert len(records) == 3
+            reports = [json.loads(line) for line in errors.splitlines()]
+            assert [r["path"] for r in reports[:3]] == paths
+            total = reports[3]
+            assert "path" not in total
+            assert total["files"] == 3
+            assert total["bytes_in"] == sum(os.path.getsize(p) for p in paths)
+            assert total["objects"]["key"] == 6
+            assert total["peak_memory"] >= max(r["peak_memory"] for r in reports[:3])
+        finally:
+            for path in paths:
+                os.unlink(path)
+    
+    def test_batch_rejects_indent(self):
+        """Test that --indent cannot be combined with NDJSON output."""
+        with patch('sys.argv', ['plist2json', '-i', '2', 'a.plist', 'b.plist']):
+            with patch('sys.stderr', new=io.StringIO()):
+                with pytest.raises(SystemExit) as exc_info:
+                    main()
+                assert exc_info.value.code == 2
+
+
+class TestRecursive:
+    """Test cases for converting a directory tree."""
+    
+    def _run(self, argv):
+        with patch('sys.argv', ['plist2json'] + argv):
+            with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                result = main()
+        return result, mock_stderr.getvalue()
+    
+    def test_recursive_conversion(self):
+        """Test mirroring a tree of plists as JSON files."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(root, 'dst')
+            os.makedirs(os.path.join(src, 'sub'))
+            with open(os.path.join(src, 'a.plist'), 'wb') as f:
+                plistlib.dump({"name": "a"}, f)
+            with open(os.path.join(src, 'sub', 'b'), 'wb') as f:
+                plistlib.dump({"name": "b"}, f, fmt=plistlib.FMT_BINARY)
+            with open(os.path.join(src, 'sub', 'notes.txt'), 'w') as f:
+                f.write("not a plist")
+            with open(os.path.join(src, 'broken.plist'), 'w') as f:
+                f.write("not a plist either")
+            
+            result, errors = self._run(['-r', src, '-o', dst, '-j', '1', '-i', '2'])
+            assert result == 1
+            assert "broken.plist" in errors
+            with open(os.path.join(dst, 'a.json')) as f:
+                assert json.load(f) == {"name": "a"}
+            with open(os.path.join(dst, 'sub', 'b.json')) as f:
+                content = f.read()
+                assert json.loads(content) == {"name": "b"}
+                assert '\n  "name"' in content
+            assert sorted(os.listdir(os.path.join(dst, 'sub'))) == ['b.json']
+            
+            # Up-to-date outputs are not rewritten.
+            os.remove(os.path.join(src, 'broken.plist'))
+            output = os.path.join(dst, 'a.json')
+            with open(output, 'w') as f:
+                f.write("sentinel")
+            newer = os.stat(os.path.join(src, 'a.plist')).st_mtime + 10
+            os.utime(output, (newer, newer))
+            result, errors = self._run(['-r', src, '-o', dst, '-j', '2'])
+            assert result == 0
+            with open(output) as f:
+                assert f.read() == "sentinel"
+    
+    def test_recursive_shared_output(self):
+        """Test that a file whose output is that of a .plist file is an error."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(root, 'dst')
+            os.makedirs(src)
+            for name in ('a', 'a.plist'):
+                with open(os.path.join(src, name), 'wb') as f:
+                    plistlib.dump({"from": name}, f)
+            
+            for _ in range(2):
+                result, errors = self._run(['-r', src, '-o', dst, '-j', '2'])
+                assert result == 1
+                assert os.path.join(src, 'a') + "'" in errors
+                with open(os.path.join(dst, 'a.json')) as f:
+                    assert json.load(f) == {"from": "a.plist"}
+    
+    def test_recursive_skips_known_non_plists(self):
+        """Test that files found not to be plists are not read again while unchanged."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(root, 'dst')
+            os.makedirs(src)
+            notes = os.path.join(src, 'notes.txt')
+            with open(notes, 'w') as f:
+                f.write("not a plist")
+            with open(os.path.join(src, 'a.plist'), 'wb') as f:
+                plistlib.dump({"name": "a"}, f)
+            
+            with patch('pkg.__main__.looks_like_plist',
+                       side_effect=looks_like_plist) as sniff:
+                assert self._run(['-r', src, '-o', dst, '-j', '1']) == (0, '')
+                assert sniff.call_count == 2
+                record = os.path.join(dst, '.plist2json-skip.json')
+                with open(record) as f:
+                    assert list(json.load(f)) == ['notes.txt']
+                mtime = os.stat(record).st_mtime_ns
+                
+                # An unchanged tree reads nothing and leaves the record alone.
+                sniff.reset_mock()
+                assert self._run(['-r', src, '-o', dst, '-j', '1']) == (0, '')
+                assert not sniff.called
+                assert os.stat(record).st_mtime_ns == mtime
+                
+                # A file that changes is examined again, even with its old mtime.
+                stat = os.stat(notes)
+                with open(notes, 'wb') as f:
+                    plistlib.dump({"name": "notes"}, f, fmt=plistlib.FMT_BINARY)
+                os.utime(notes, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                assert self._run(['-r', src, '-o', dst, '-j', '1']) == (0, '')
+                assert sniff.call_count == 1
+            with open(os.path.join(dst, 'notes.txt.json')) as f:
+                assert json.load(f) == {"name": "notes"}
+            with open(record) as f:
+                assert json.load(f) == {}
+    
+    def test_recursive_compressed(self):
+        """Test compressed plists in a tree and compressed JSON files with --compress."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(root, 'dst')
+            os.makedirs(src)
+            with open(os.path.join(src, 'a.plist.gz'), 'wb') as f:
+                f.write(gzip.compress(plistlib.dumps({"name": "a"})))
+            with open(os.path.join(src, 'b'), 'wb') as f:
+                f.write(lzma.compress(plistlib.dumps({"name": "b"}, fmt=plistlib.FMT_BINARY)))
+            with open(os.path.join(src, 'notes.gz'), 'wb') as f:
+                f.write(gzip.compress(b"not a plist"))
+            
+            result, errors = self._run(['-r', src, '-o', dst, '-j', '1', '--compress', 'gzip'])
+            assert result == 0, errors
+            assert sorted(os.listdir(dst)) == ['.plist2json-skip.json', 'a.json.gz', 'b.json.gz']
+            with gzip.open(os.path.join(dst, 'b.json.gz')) as f:
+                assert json.load(f) == {"name": "b"}
+            with gzip.open(os.path.join(dst, 'a.json.gz')) as f:
+                assert json.load(f) == {"name": "a"}
+    
+    def test_recursive_missing_source(self):
+        """Test a source directory that does not exist."""
+        result, errors = self._run(['-r', 'nonexistent-dir', '-o', 'out'])
+        assert result == 1
+        assert "nonexistent-dir" in errors
+    
+    def test_recursive_requires_out_dir(self):
+        """Test that --recursive needs --out-dir and excludes input files."""
+        for argv in (['-r', 'src'], ['-o', 'dst'], ['-r', 'src', '-o', 'dst', 'a.plist']):
+            with pytest.raises(SystemExit) as exc_info:
+                self._run(argv)
+            assert exc_info.value.code == 2
+    
+    def test_watch(self):
+        """Test converting changed files and removing the outputs of removed ones."""
+        with tempfile.TemporaryDirectory() as root:
+            src = os.path.join(root, 'src')
+            dst = os.path.join(root, 'dst')
+            os.makedirs(os.path.join(src, 'sub'))
+            single = os.path.join(root, 'single.plist')
+            paths = [os.path.join(src, 'a.plist'), os.path.join(src, 'sub', 'b.plist'), single]
+            for i, path in enumerate(paths):
+                with open(path, 'wb') as f:
+                    plistlib.dump({"index": i}, f)
+            # The first output is already up to date.
+            os.makedirs(dst)
+            with open(os.path.join(dst, 'a.json'), 'w') as f:
+                f.write("sentinel")
+            newer = os.stat(paths[0]).st_mtime + 10
+            os.utime(os.path.join(dst, 'a.json'), (newer, newer))
+            
+            def changes(watcher):
+                assert watcher.inputs == [src, single]
+                yield paths, []
+                with open(paths[0], 'wb') as f:
+                    plistlib.dump({"index": 9}, f)
+                yield [paths[0]], [paths[1]]
+                raise KeyboardInterrupt
+            
+            with patch('pkg.__main__.Watcher.changes', changes):
+                result, errors = self._run(['-w', src, single, '-o', dst, '-j', '1'])
+            assert result == 0
+            with open(os.path.join(dst, 'a.json')) as f:
+                assert json.load(f) == {"index": 9}
+            with open(os.path.join(dst, 'single.json')) as f:
+                assert json.load(f) == {"index": 2}
+            assert not os.path.exists(os.path.join(dst, 'sub', 'b.json'))
+            assert errors.count("Converted " + paths[0]) == 1
+            assert f"Converted {paths[1]} -> {os.path.join(dst, 'sub', 'b.json')}" in errors
+            assert "Removed " + os.path.join(dst, 'sub', 'b.json') in errors
+    
+    def test_watch_options(self):
+        """Test that --watch needs --out-dir and inputs, and excludes other modes."""
+        for argv in (['-w', 'a.plist'], ['-w', '-o', 'dst'], ['-w', 'a.plist', '-o', 'dst', '--stream'],
+                     ['-w', 'a.plist', '-o', 'dst', '--debounce', '-1']):
+            with pytest.raises(SystemExit) as exc_info:
+                self._run(argv)
+            assert exc_info.value.code == 2
+
+
+class TestServer:
+    """Test cases for the conversion server and client modes."""
+    
+    def _run(self, argv, stdin=None):
+        with patch('sys.argv', ['plist2json'] + argv):
+            with patch('sys.stdout', new=io.StringIO()) as mock_stdout:
+                with patch('sys.stderr', new=io.StringIO()) as mock_stderr:
+                    if stdin is not None:
+                        with patch('sys.stdin', new=io.TextIOWrapper(
+                                io.BufferedReader(io.BytesIO(stdin)))):
+                            result = main()
+                    else:
+                        result = main()
+        return result, mock_stdout.getvalue(), mock_stderr.getvalue()
+    
+    @pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                        reason="Unix domain sockets not supported")
+    def test_client_uses_running_server(self):
+        """Test that conversions are sent to a running server."""
+        test_data = {"a": [1, 2], "b": "x"}
+        requests = []
+        
+        def handler(header, body):
+            requests.append(header)
+            return convert_request(header, body)
+        
+        with tempfile.TemporaryDirectory() as root:
+            temp_path = os.path.join(root, 'input.plist')
+            with open(temp_path, 'wb') as f:
+                plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            socket_path = os.path.join(root, 'server.sock')
+            server = ConversionServer(socket_path, handler, jobs=1)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            try:
+                assert self._run(['--socket', socket_path, '-i', '2', temp_path]) == (
+                    0, json.dumps(test_data, indent=2) + '\n', '')
+                assert self._run(['--socket', socket_path, '-p', 'b', '-p', 'a[1]'],
+                                 stdin=plistlib.dumps(test_data)) == (0, '"x"\n2\n', '')
+                assert self._run(['--socket', socket_path, '--exclude', 'a[0]'],
+                                 stdin=plistlib.dumps(test_data)) == (
+                    0, '{"a": [2], "b": "x"}\n', '')
+                # Characters straddle the chunks the reply is copied in.
+                large = "\u00e9" * 600000
+                large_path = os.path.join(root, 'large.plist')
+                with open(large_path, 'wb') as f:
+                    plistlib.dump(large, f, fmt=plistlib.FMT_BINARY)
+                cache_dir = os.path.join(root, 'cache')
+                assert self._run(['--socket', socket_path, '--cache-dir', cache_dir,
+                                  '--buffer-size', '4096', large_path]) == (
+                    0, json.dumps(large, ensure_ascii=False) + '\n', '')
+                assert os.listdir(os.path.join(cache_dir, 'objects'))
+                result, output, errors = self._run(
+                    ['--socket', socket_path, os.path.join(root, 'missing.plist')])
+                assert result == 1 and output == ''
+                assert "not found" in errors
+            finally:
+                server.shutdown()
+                thread.join()
+                server.server_close()
+        assert [r.get("path") for r in requests] == [
+            temp_path, None, None, os.path.join(root, 'large.plist'),
+            os.path.join(root, 'missing.plist')]
+        assert requests[2]["exclude"] == [["a", 0]]
+        assert requests[3]["buffer_size"] == 4096
+        assert requests[3]["cache"]["directory"] == os.path.join(root, 'cache')
+    
+    def test_client_without_server_converts_locally(self):
+        """Test that a client falls back to local conversion."""
+        test_data = {"key": "value"}
+        with tempfile.TemporaryDirectory() as root:
+            socket_path = os.path.join(root, 'server.sock')
+            with patch.dict(os.environ, {'PLIST2JSON_SOCKET': socket_path}):
+                assert self._run(['-p', 'key'], stdin=plistlib.dumps(test_data)) == (
+                    0, '"value"\n', '')
+    
+    def test_serve_requires_socket(self):
+        """Test that --serve needs a socket and accepts no inputs."""
+        for argv in (['--serve'], ['--serve', '--socket', 's', 'a.plist'],
+                     ['--serve', '--socket', 's', '--stream'],
+                     ['--serve', '--socket', 's', '--ndjson'],
+                     ['--serve', '--socket', 's', '--unarchive']):
+            with patch('sys.argv', ['plist2json'] + argv):
+                with patch.dict(os.environ, {'PLIST2JSON_SOCKET': ''}):
+                    with patch('sys.stderr', new=io.StringIO()):
+                        with pytest.raises(SystemExit) as exc_info:
+                            main()
+                        assert exc_info.value.code == 2
+
+
 class TestMainAsScript:
     """Test running as script."""
     
@@ -423,6 +1390,27 @@ class TestMainAsScript:
             if os.path.exists(temp_path):
                 os.unlink(temp_path)
     
+    def test_main_with_binary_plist_on_stdin_pipe(self):
+        """Test piping a binary plist into the module."""
+        test_data = {"key": "value", "data": [1, 2.5, "three"]}
+        result = subprocess.run(
+            [sys.executable, '-m', 'pkg'],
+            input=plistlib.dumps(test_data, fmt=plistlib.FMT_BINARY),
+            capture_output=True
+        )
+        assert result.returncode == 0
+        assert json.loads(result.stdout) == test_data
+    
+    def test_main_with_binary_data_on_stdin_pipe(self):
+        """Test that data piped in a binary plist is written as bytes."""
+        result = subprocess.run(
+            [sys.executable, '-m', 'pkg', '--path', 'data'],
+            input=plistlib.dumps({"data": b"\x00\x01"}, fmt=plistlib.FMT_BINARY),
+            capture_output=True
+        )
+        assert result.returncode == 0
+        assert json.loads(result.stdout) == "<<non-serializable: bytes>>"
+    
     def test_main_script_direct_execution(self):
         """Test direct execution of __main__.py script."""
         test_data = {"key": "value"}
@@ -443,6 +1431,34 @@ class TestMainAsScript:
             if os.path.exists(temp_path):
                 os.unlink(temp_path)
     
+    def _imported(self, code, *args):
+        """Run *code* in a fresh interpreter and return the modules it imported."""
+        result = subprocess.run(
+            [sys.executable, '-c', code + '\nimport sys; print(" ".join(sys.modules))']
+            + list(args), capture_output=True, text=True, check=True)
+        return set(result.stdout.split())
+    
+    def test_library_import_is_lazy(self):
+        """Test that the library API does not import the command line."""
+        modules = self._imported('import pkg; from pkg.__main__ import convert')
+        assert 'argparse' not in modules
+        assert 'plistlib' not in modules
+    
+    def test_binary_input_skips_xml_parser(self):
+        """Test that converting a binary plist does not load plistlib or expat."""
+        test_data = {"key": "value", "list": [1, 2.5, True]}
+        with tempfile.NamedTemporaryFile(mode='wb', delete=False, suffix='.plist') as f:
+            plistlib.dump(test_data, f, fmt=plistlib.FMT_BINARY)
+            temp_path = f.name
+        
+        try:
+            modules = self._imported('from pkg.__main__ import main; main()', temp_path)
+            assert 'argparse' in modules
+            assert not {'plistlib', 'pyexpat', 'xml.parsers.expat'} & modules
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+    
     def test_main_name_guard(self):
         """Test the __name__ == '__main__' guard using runpy."""
         test_data = {"key": "value"}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Test suite for the conversion server and its client."""
+
+import errno
+import io
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from pkg.server import ConversionServer, connect, request
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'),
+                                reason="Unix domain sockets not supported")
+
+
+def _echo(header, body):
+    """Reply with the header's name and the body, or fail on request."""
+    if header.get('fail'):
+        return None, "failed as requested"
+    return header.get('name', '').encode('utf-8') + (body or b''), None
+
+
+@pytest.fixture
+def socket_path():
+    with tempfile.TemporaryDirectory() as root:
+        yield os.path.join(root, 'server.sock')
+
+
+def _start(socket_path, jobs=1):
+    server = ConversionServer(socket_path, _echo, jobs=jobs)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    return server, thread
+
+
+def _stop(server, thread):
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+class TestConversionServer:
+    """Test cases for ConversionServer and the client functions."""
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_round_trip(self, socket_path, jobs):
+        """Test requests with a path-style header and with a raw body."""
+        server, thread = _start(socket_path, jobs)
+        try:
+            out = io.BytesIO()
+            assert request(connect(socket_path), {"path": "x", "name": "a"},
+                           out) is None
+            assert request(connect(socket_path), {"name": "b"}, out,
+                           body=b'-body') is None
+            assert out.getvalue() == b'ab-body'
+        finally:
+            _stop(server, thread)
+        assert not os.path.exists(socket_path)
+
+    def test_error_reply(self, socket_path):
+        """Test that a conversion error is returned to the client."""
+        server, thread = _start(socket_path)
+        try:
+            out = io.BytesIO()
+            assert request(connect(socket_path), {"fail": True}, out) == \
+                "failed as requested"
+            assert out.getvalue() == b''
+        finally:
+            _stop(server, thread)
+
+    def test_malformed_request(self, socket_path):
+        """Test that a request without a valid header is rejected."""
+        server, thread = _start(socket_path)
+        try:
+            with connect(socket_path) as sock:
+                sock.sendall(b'[1, 2]\n')
+                sock.shutdown(socket.SHUT_WR)
+                reply = sock.makefile('rb').read()
+            assert reply.startswith(b'{"status": 1, "error": "Malformed request')
+        finally:
+            _stop(server, thread)
+
+    def test_connect_without_server(self, socket_path):
+        """Test that connecting reports a missing server as None."""
+        assert connect(socket_path) is None
+        assert connect(None) is None
+
+    def test_stale_socket_replaced(self, socket_path):
+        """Test that a socket left by a dead server is replaced."""
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        server, thread = _start(socket_path)
+        try:
+            with pytest.raises(OSError) as exc_info:
+                ConversionServer(socket_path, _echo, jobs=1)
+            assert exc_info.value.errno == errno.EADDRINUSE
+            assert request(connect(socket_path), {"name": "ok"},
+                           io.BytesIO()) is None
+        finally:
+            _stop(server, thread)
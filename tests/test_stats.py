@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Test suite for conversion statistics."""
+
+import io
+import json
+
+from pkg.events import iter_object_events
+from pkg.stats import PHASES, Stats
+
+
+class TestStats:
+    """Test cases for Stats."""
+
+    def test_phases_are_exclusive(self):
+        """Test that nested phases are not charged to the enclosing phase."""
+        stats = Stats()
+        stats.start()
+        stats.enter('serialize')
+        stats.enter('write')
+        stats.leave()
+        stats.leave()
+        stats.stop()
+        assert stats.files == 1
+        assert sum(stats.wall[phase] for phase in PHASES) <= stats.wall['total']
+
+    def test_counting(self):
+        """Test counting bytes, objects and default calls."""
+        stats = Stats()
+        source = stats.reader(io.BytesIO(b'abcdef'))
+        assert source.read(4) == b'abcd'
+        assert source.readinto(bytearray(4)) == 2
+        assert stats.reader(source) is source
+        out = stats.writer(io.BytesIO())
+        out.write(b'xyz')
+        assert out.getvalue() == b'xyz'
+        events = list(stats.parsing(iter_object_events(
+            {"a": [1, "s", None, b"d"], "b": {}})))
+        assert events == list(iter_object_events(
+            {"a": [1, "s", None, b"d"], "b": {}}))
+        default = stats.counting(repr)
+        assert default(b'd') == "b'd'"
+        result = stats.as_dict()
+        assert result["bytes_in"] == 6
+        assert result["bytes_out"] == 3
+        assert result["objects"] == {"array": 1, "data": 1, "dict": 2, "integer": 1,
+                                     "key": 2, "null": 1, "string": 1}
+        assert result["default_calls"] == 1
+        json.dumps(result)
+
+    def test_add(self):
+        """Test merging statistics gathered elsewhere."""
+        first, second = Stats(), Stats()
+        first.bytes_in = 10
+        first.objects['string'] = 2
+        first.wall['parse'] = 1.0
+        second.add(first.as_dict())
+        second.add(dict(first.as_dict(), peak_memory=2 ** 50))
+        result = second.as_dict()
+        assert result["bytes_in"] == 20
+        assert result["objects"] == {"string": 4}
+        assert result["wall_seconds"]["parse"] == 2.0
+        assert result["peak_memory"] == 2 ** 50
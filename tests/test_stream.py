@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Test suite for splitting streams of concatenated plists."""
+
+import io
+import plistlib
+import struct
+
+import pytest
+
+from pkg.stream import iter_documents
+
+
+DOCUMENTS = [
+    plistlib.dumps({"index": 0, "nested": plistlib.dumps([0], fmt=plistlib.FMT_BINARY)}),
+    plistlib.dumps({"index": 1, "nested": plistlib.dumps([1], fmt=plistlib.FMT_BINARY)},
+                   fmt=plistlib.FMT_BINARY),
+    plistlib.dumps([2, "<plist>"], fmt=plistlib.FMT_BINARY),
+    plistlib.dumps("three"),
+]
+
+
+class TrickleReader(io.RawIOBase):
+    """Binary stream returning at most *size* bytes per read."""
+
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+
+    def readable(self):
+        return True
+
+    def read1(self, size=-1):
+        chunk, self.data = self.data[:self.size], self.data[self.size:]
+        return chunk
+
+    read = read1
+
+
+def _split(data, framing, size):
+    return list(iter_documents(TrickleReader(data, size), framing, chunk_size=size))
+
+
+class TestIterDocuments:
+    """Test cases for iter_documents."""
+
+    @pytest.mark.parametrize("size", [1, 5, 64, 1 << 20])
+    @pytest.mark.parametrize("separator", [b'', b'\n', b'\0\r\n'])
+    def test_auto(self, size, separator):
+        """Test finding the end of concatenated binary and XML plists."""
+        data = separator + separator.join(DOCUMENTS) + separator
+        expected = [document.rstrip(b'\n') for document in DOCUMENTS]
+        assert _split(data, 'auto', size) == expected
+
+    @pytest.mark.parametrize("size", [1, 64])
+    def test_nul(self, size):
+        """Test splitting NUL-delimited XML plists, skipping empty ones."""
+        documents = [DOCUMENTS[0], DOCUMENTS[3]]
+        data = b'\0' + b'\0\0'.join(documents) + b'\0'
+        assert _split(data, 'nul', size) == documents
+
+    @pytest.mark.parametrize("size", [1, 64])
+    def test_length(self, size):
+        """Test splitting length-prefixed plists."""
+        data = b''.join(struct.pack('>I', len(document)) + document
+                        for document in DOCUMENTS + [b''])
+        assert _split(data, 'length', size) == DOCUMENTS + [b'']
+
+    def test_length_truncated(self):
+        """Test that a stream ending inside a document is an error."""
+        for data in (b'\0\0', b'\0\0\0\5abc'):
+            with pytest.raises(ValueError):
+                list(iter_documents(io.BytesIO(data), 'length'))
+
+    def test_documents_yielded_when_complete(self):
+        """Test that a document is yielded before more input is read."""
+        def chunks():
+            yield DOCUMENTS[1]
+            raise AssertionError("read past a complete document")
+
+        reader = chunks()
+        stream = io.RawIOBase()
+        stream.read = lambda size: next(reader)
+        assert next(iter_documents(stream, 'auto')) == DOCUMENTS[1]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Test suite for watching files for changes."""
+
+import os
+import tempfile
+
+import pytest
+
+from pkg.watch import Watcher
+
+
+def _write(path, content, mtime=None):
+    with open(path, 'wb') as f:
+        f.write(content)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+class TestWatcher:
+    """Test cases for Watcher."""
+
+    @pytest.fixture
+    def tree(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'src', 'out'))
+            yield root
+
+    def _check(self, watcher, now):
+        return watcher.check(watcher.scan(), now)
+
+    def test_changes(self, tree):
+        """Test reporting new, changed and removed files after the debounce delay."""
+        src = os.path.join(tree, 'src')
+        a = os.path.join(src, 'a.plist')
+        single = os.path.join(tree, 'single.plist')
+        _write(a, b'a')
+        _write(single, b's')
+        _write(os.path.join(src, 'out', 'a.json'), b'skipped')
+        watcher = Watcher([src, single], skip=os.path.join(src, 'out'),
+                          debounce=1, inotify=False)
+        assert self._check(watcher, 0) == ([single, a], [])
+        assert self._check(watcher, 0) == ([], [])
+
+        _write(a, b'changed', mtime=1000)
+        b = os.path.join(src, 'b.plist')
+        _write(b, b'b')
+        os.remove(single)
+        # Changes are only reported once stable for the debounce delay.
+        assert self._check(watcher, 10) == ([], [])
+        _write(b, b'bb')
+        assert self._check(watcher, 10.5) == ([], [])
+        assert self._check(watcher, 11) == ([a], [single])
+        assert self._check(watcher, 11.5) == ([b], [])
+        assert self._check(watcher, 20) == ([], [])
+
+    def test_unchanged_content(self, tree):
+        """Test that files rewritten with the same content are not reported."""
+        path = os.path.join(tree, 'src', 'a.plist')
+        _write(path, b'same')
+        watcher = Watcher([path], debounce=0, inotify=False)
+        assert self._check(watcher, 0) == ([path], [])
+        _write(path, b'same', mtime=1000)
+        assert self._check(watcher, 1) == ([], [])
+        assert self._check(watcher, 2) == ([], [])
+
+    def test_missing_input(self, tree):
+        """Test that an input file created later is reported."""
+        path = os.path.join(tree, 'later.plist')
+        watcher = Watcher([path], debounce=0, inotify=False)
+        assert self._check(watcher, 0) == ([], [])
+        _write(path, b'new')
+        assert self._check(watcher, 1) == ([], [])
+        assert self._check(watcher, 2) == ([path], [])
+
+    @pytest.mark.parametrize("inotify", [True, False])
+    def test_wait(self, tree, inotify):
+        """Test that changes() wakes up for changes with inotify or polling."""
+        path = os.path.join(tree, 'src', 'a.plist')
+        _write(path, b'a')
+        with Watcher([os.path.join(tree, 'src')], debounce=0.01,
+                     interval=0.01, inotify=inotify) as watcher:
+            changes = watcher.changes()
+            assert next(changes) == ([path], [])
+            _write(path, b'changed', mtime=1000)
+            assert next(changes) == ([path], [])
+            os.remove(path)
+            assert next(changes) == ([], [path])
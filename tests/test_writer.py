@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Test suite for the incremental JSON writer."""
+
+import datetime
+import io
+import json
+
+import pytest
+
+from pkg.__main__ import serialize_default
+from pkg.events import iter_object_events
+from pkg.writer import iterencode, write_json
+
+
+SAMPLE = {
+    "string": "café",
+    "number": 42,
+    "float": float("inf"),
+    "flags": [True, False, None],
+    "empty_dict": {},
+    "empty_list": [],
+    "nested": {"list": [1, [2, [3]]], "date": datetime.datetime(2023, 1, 1)},
+    "data": b"\x00",
+}
+
+
+def _encode(obj, indent=None):
+    return ''.join(iterencode(iter_object_events(obj), indent=indent,
+                              default=serialize_default))
+
+
+class TestIterencode:
+    """Test cases for iterencode."""
+
+    @pytest.mark.parametrize("indent", [None, 0, 2, "\t"])
+    def test_matches_json_dumps(self, indent):
+        """Test that output is byte-identical to json.dumps."""
+        expected = json.dumps(SAMPLE, indent=indent, default=serialize_default,
+                              ensure_ascii=False)
+        assert _encode(SAMPLE, indent) == expected
+
+    def test_scalar_root(self):
+        """Test encoding a lone scalar."""
+        assert _encode("value") == '"value"'
+
+    def test_non_string_keys(self):
+        """Test that keys are coerced like json.dumps does."""
+        for data in ({1: "a", 2.5: "b", False: "c", None: "d"}, {True: "e"}):
+            assert _encode(data) == json.dumps(data)
+
+    def test_lines(self):
+        """Test newline-delimited output of the items of the root."""
+        array = [1, {"a": [2, {}]}, [], "x"]
+        assert ''.join(iterencode(iter_object_events(array), lines=True)) == \
+            ''.join(json.dumps(item) + '\n' for item in array)
+        entries = {"a": 1, "b": {"c": [3]}, "d": {}}
+        assert ''.join(iterencode(iter_object_events(entries), indent=2,
+                                  lines=True)) == \
+            ''.join(json.dumps({k: v}) + '\n' for k, v in entries.items())
+        for root, expected in (([], ''), ({}, ''), ([[]], '[]\n'), (5, '5\n')):
+            assert ''.join(iterencode(iter_object_events(root), lines=True)) == expected
+
+    def test_lines_streamed(self):
+        """Test that each line is produced before the next item is read."""
+        def events():
+            # A root array whose third element fails to decode.
+            yield from list(iter_object_events([{"first": 1}, 2, 3]))[:-2]
+            raise RuntimeError("truncated")
+
+        output = []
+        with pytest.raises(RuntimeError):
+            for fragment in iterencode(events(), lines=True):
+                output.append(fragment)
+        assert ''.join(output) == '{"first": 1}\n2'
+
+    @pytest.mark.parametrize("indent", [None, 2])
+    def test_shared_containers(self, indent):
+        """Test that a shared container is encoded once and copied on reference."""
+        shared = {"name": "shared", "values": [1, {"x": 2}]}
+        events = [("start_array", None), ("start_dict", "s"),
+                  *list(iter_object_events(shared))[1:],
+                  ("start_dict", None), ("key", "ref"), ("ref", "s"),
+                  ("end_dict", None), ("ref", "s"), ("end_array", None)]
+        expected = json.dumps([shared, {"ref": shared}, shared], indent=indent)
+        assert ''.join(iterencode(events, indent=indent)) == expected
+        assert ''.join(iterencode(events, lines=True)) == \
+            ''.join(json.dumps(item) + '\n' for item in [shared, {"ref": shared}, shared])
+
+    def test_unsupported_key(self):
+        """Test that unsupported key types raise TypeError."""
+        with pytest.raises(TypeError):
+            _encode({(1, 2): "a"})
+
+
+class ChunkRecorder(io.RawIOBase):
+    """Binary stream recording each write call."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+
+class TestWriteJson:
+    """Test cases for write_json."""
+
+    def test_binary_stream_chunks(self):
+        """Test that output is written as buffered UTF-8 chunks."""
+        data = {"items": ["café"] * 100}
+        out = ChunkRecorder()
+        count = write_json(iter_object_events(data), out, indent=2,
+                           buffer_size=64)
+        output = b''.join(out.chunks).decode('utf-8')
+        assert output == json.dumps(data, indent=2, ensure_ascii=False)
+        assert count == len(output)
+        assert 1 < len(out.chunks) < 100
+        assert all(len(chunk) >= 64 for chunk in out.chunks[:-1])
+
+    def test_text_stream(self):
+        """Test writing to a text stream."""
+        out = io.StringIO()
+        write_json(iter_object_events([b"x"]), out, default=serialize_default)
+        assert out.getvalue() == '["<<non-serializable: bytes>>"]'
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Test suite for the incremental XML plist decoder."""
+
+import datetime
+import io
+import plistlib
+
+import pytest
+
+from pkg.events import iter_object_events, key_pruner, path_pruner
+from pkg.xmlplist import is_xml_plist, iter_events
+
+
+SAMPLE = {
+    "string": "value <&> café 🎉",
+    "integer": 42,
+    "negative": -7,
+    "float": 3.5,
+    "true": True,
+    "false": False,
+    "data": b"\x00\x01\x02" * 50,
+    "date": datetime.datetime(2023, 1, 1, 12, 30, 15),
+    "array": [1, "two", [3, {"four": 4}]],
+    "dict": {"nested": {"deeper": "yes"}, "empty": {}},
+    "empty_array": [],
+}
+
+
+def _events(doc, chunk_size=64 * 1024):
+    return list(iter_events(io.BytesIO(doc), chunk_size))
+
+
+class TestIsXmlPlist:
+    """Test cases for is_xml_plist."""
+
+    def test_headers(self):
+        """Test recognition of XML plist headers."""
+        assert is_xml_plist(b'<?xml version="1.0"?>')
+        assert is_xml_plist(b'<plist version="1.0">')
+        assert is_xml_plist(b'\xef\xbb\xbf<?xml version="1.0"?>')
+        assert not is_xml_plist(b'bplist00')
+        assert not is_xml_plist(b'  <?xml')
+
+
+class TestIterEvents:
+    """Test cases for the XML iter_events function."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+    def test_events_match_plistlib(self, chunk_size):
+        """Test that decoding matches plistlib for any chunking."""
+        doc = plistlib.dumps(SAMPLE, sort_keys=False)
+        assert _events(doc, chunk_size) == list(iter_object_events(SAMPLE))
+
+    def test_events_before_end_of_input(self):
+        """Test that events are produced before the input is exhausted."""
+        doc = plistlib.dumps(list(range(1000)))
+        f = io.BytesIO(doc)
+        events = iter_events(f, chunk_size=256)
+        assert next(events) == ("start_array", None)
+        assert f.tell() < len(doc)
+
+    def test_hex_integer(self):
+        """Test hexadecimal integers."""
+        assert _events(b'<plist><integer>0x1F</integer></plist>') == [
+            ("value", 31)]
+
+    def test_partial_date(self):
+        """Test dates with only some fields present."""
+        assert _events(b'<plist><date>2023-06-01T08Z</date></plist>') == [
+            ("value", datetime.datetime(2023, 6, 1, 8))]
+
+    def test_empty_document(self):
+        """Test that a plist without objects decodes to None."""
+        assert _events(b'<plist></plist>') == [("value", None)]
+
+    def test_empty_key_without_value(self):
+        """Test that a dangling empty key is dropped like plistlib does."""
+        doc = b'<plist><dict><key></key></dict></plist>'
+        assert _events(doc) == list(iter_object_events(plistlib.loads(doc)))
+
+    def test_unknown_elements_ignored(self):
+        """Test that unknown elements are ignored."""
+        assert _events(b'<plist><array><foo/><true/></array></plist>') == [
+            ("start_array", None), ("value", True), ("end_array", None)]
+
+    @pytest.mark.parametrize("doc, message", [
+        (b'<plist><array><key>a</key></array></plist>', "unexpected key"),
+        (b'<plist><dict><key>a</key></dict></plist>', "missing value"),
+        (b'<plist><dict><string>a</string></dict></plist>',
+         "unexpected element"),
+        (b'<plist><key>a</key><string>b</string></plist>', "unexpected key"),
+        (b'<plist><string>a</string><string>b</string></plist>',
+         "unexpected element"),
+    ])
+    def test_structure_errors(self, doc, message):
+        """Test that misplaced elements are rejected."""
+        with pytest.raises(ValueError, match=message):
+            _events(doc)
+
+    def test_entity_declaration_rejected(self):
+        """Test that entity declarations are refused."""
+        doc = (b'<?xml version="1.0"?><!DOCTYPE plist [<!ENTITY e "x">]>'
+               b'<plist><string>&e;</string></plist>')
+        with pytest.raises(plistlib.InvalidFileException):
+            _events(doc)
+
+    def test_prune(self):
+        """Test that pruned objects are left out of the stream."""
+        doc = plistlib.dumps(SAMPLE, sort_keys=False)
+        prune = path_pruner(("array", 2))
+        assert list(iter_events(io.BytesIO(doc), prune=prune)) == list(
+            iter_object_events(SAMPLE, prune=prune))
+
+    def test_pruned_objects_not_decoded(self):
+        """Test that invalid content inside a pruned object is skipped."""
+        doc = (b'<plist><dict><key>a</key><array><integer>x</integer>'
+               b'<date>bad</date></array><key>b</key><array><false/>'
+               b'<integer>1</integer></array></dict></plist>')
+        events = iter_events(io.BytesIO(doc), prune=path_pruner(("b", 1)))
+        assert list(events) == [
+            ("start_dict", None), ("key", "b"), ("start_array", None),
+            ("value", 1), ("end_array", None), ("end_dict", None)]
+
+    def test_parsing_resumes_after_pruned_object(self):
+        """Test that objects after a pruned one are decoded, in any chunks."""
+        doc = (b'<plist><array><dict><key>x</key><array><string>skip</string>'
+               b'<dict/></array><key>y</key><string>kept</string></dict>'
+               b'<array/><true/></array></plist>')
+        expected = [("start_array", None), ("start_dict", None), ("key", "y"),
+                    ("value", "kept"), ("end_dict", None), ("value", True),
+                    ("end_array", None)]
+        for chunk_size in (1, 7, 1024):
+            prune = key_pruner([], [("*", "x"), (1,)])
+            events = iter_events(io.BytesIO(doc), chunk_size=chunk_size, prune=prune)
+            assert list(events) == expected